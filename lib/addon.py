@@ -7,29 +7,50 @@ import math
 import json
 import os
 import time
-from urllib.parse import parse_qsl
+from urllib.parse import parse_qsl, urlsplit
 import xbmc
 import xbmcgui
 import xbmcplugin
 import xbmcvfs
 from .globals import G
-from .stalker_cache import StalkerCache
-from .utils import ask_for_input, get_int_value
+from .portal_items import as_item, set_context as set_item_context
+from .stalker_cache import StalkerCache, set_backend, set_memory_cache_enabled
+from .utils import ask_for_input, get_int_value, notify
 from .api import Api
 from .loggers import Logger
-from .tmdb import TmdbClient, TmdbRateLimitError, _CACHE_MISS
+from . import codec, fileio, metrics, profiling, request_stats
+from .metrics import timed
+from .tmdb import TMDB_API_BASE, TmdbClient, TmdbRateLimitError, _CACHE_MISS
 
 
 _tmdb_client_singleton = None
+_tmdb_client_key = None        # (api_key, language, cache_days) of the singleton
+_tmdb_client_checked = False   # revalidated for the current plugin run
+_session_settings_version = None
 _rate_limit_notified = False  # show the rate-limit toast only once per plugin run
 _lang_tag_prefix_re = None
 _lang_tag_suffix_re = None
+_lang_tag_version = None  # G.settings_version the patterns were built for
 _FILTER_ALL = object()  # sentinel: user chose "Alle" in a combination-filter dialog
+_NAV_TRACE_FILE = 'nav_trace.jsonl'
+# Routes that always talk to the portal (vod/series listings only when they
+# are not served from the Stalker cache).  measure_portal is left out on
+# purpose: it times the connect itself.
+_PORTAL_ROUTES = frozenset(('tv', 'tv_listing', 'tv_play', 'play', 'vod_favorites', 'series_favorites',
+                            'tv_favorites', 'season_listing', 'sub_folder', 'vod_search', 'series_search',
+                            'tv_search', 'add_fav', 'remove_fav', 'refresh_all', 'update_new_data', 'revalidate'))
+# Routes that look up TMDB metadata
+_TMDB_ROUTES = frozenset(('vod_listing', 'series_listing', 'season_listing', 'sub_folder', 'vod_search',
+                          'series_search', 'refresh_all', 'update_new_data', 'tmdb_refresh_now'))
+_NAV_TRACE_MAX_BYTES = 5 * 1024 * 1024
 
 
 def _build_lang_tag_pattern():
     """Build and cache the regex patterns for language tag removal."""
-    global _lang_tag_prefix_re, _lang_tag_suffix_re
+    global _lang_tag_prefix_re, _lang_tag_suffix_re, _lang_tag_version
+    if _lang_tag_version == G.settings_version:
+        return
+    _lang_tag_version = G.settings_version
     cfg = G.display_config
     if not cfg.remove_lang_tags or not cfg.lang_tag_keywords:
         _lang_tag_prefix_re = None
@@ -71,18 +92,43 @@ def _show_rate_limit_notification():
         )
 
 
+def _queue_revalidation(cat_type, cat_id=None):
+    """An expired cache list was shown: ask the service to refresh it in the background.
+
+    The service starts ?action=revalidate, which stores the portal data and
+    refreshes the container if it still shows that list.
+    """
+    Logger.debug('Serving stale {} list {}, queueing revalidation', cat_type, cat_id or 'categories')
+    notify(sender=G.addon_config.addon_id, message='revalidate', data={'cat_type': cat_type, 'category_id': cat_id})
+
+
+def _container_shows(cat_type, cat_id=None):
+    """True if the current container is the category list (cat_id None) or video list of cat_type"""
+    query = dict(parse_qsl(urlsplit(xbmc.getInfoLabel('Container.FolderPath')).query))
+    if cat_id is None:
+        return query.get('action') == cat_type
+    return query.get('action') == cat_type + '_listing' and query.get('category_id') == str(cat_id)
+
+
 def _get_tmdb_client():
     """Return a TmdbClient singleton if TMDB is enabled and an API key is set, else None.
 
     Reuses the same instance within one plugin run so the disk cache is only
-    loaded once per page render instead of once per list item.
+    loaded once per page render instead of once per list item.  In warm mode
+    the instance (and its loaded cache) also survives between plugin runs of
+    the same interpreter; it is rebuilt when the TMDB settings change.
     """
-    global _tmdb_client_singleton
+    global _tmdb_client_singleton, _tmdb_client_key, _tmdb_client_checked
     cfg = G.tmdb_config
     if not cfg.enabled or not cfg.api_key:
         return None
-    if _tmdb_client_singleton is None:
+    key = (cfg.api_key, cfg.language, cfg.cache_days)
+    if _tmdb_client_singleton is None or _tmdb_client_key != key:
         _tmdb_client_singleton = TmdbClient(cfg.api_key, cfg.language, cfg.cache_days)
+        _tmdb_client_key = key
+    elif not _tmdb_client_checked:
+        _tmdb_client_singleton.revalidate()
+    _tmdb_client_checked = True
     return _tmdb_client_singleton
 
 
@@ -171,10 +217,10 @@ def _load_filter_ids(filter_file):
     """Load saved category IDs from a filter JSON file. Returns (found, set_of_ids)."""
     try:
         f = xbmcvfs.File(filter_file, 'r')
-        content = f.read()
+        content = bytes(f.readBytes())
         f.close()
         if content:
-            return True, set(json.loads(content))
+            return True, set(codec.loads(content))
     except Exception:
         pass
     return False, set()
@@ -184,10 +230,10 @@ def _save_filter_ids(filter_file, id_list):
     """Persist a list of category ID strings to a filter JSON file."""
     try:
         f = xbmcvfs.File(filter_file, 'w')
-        f.write(json.dumps(id_list))
+        f.write(bytearray(codec.dumps(id_list)))
         f.close()
     except Exception as exc:
-        Logger.debug('Folder filter: error saving {}: {}'.format(filter_file, exc))
+        Logger.debug('Folder filter: error saving {}: {}', filter_file, exc)
 
 
 def _apply_category_filter(categories, filter_file):
@@ -222,12 +268,28 @@ def _apply_category_filter(categories, filter_file):
     return categories
 
 
+def _first_visit(seen, cat_type, video):
+    """True the first time a video turns up in a run over several categories.
+
+    Portals list the same film in several folders ("New", genres, "All"):
+    TMDB lookups and filter results handle it once.  seen collects
+    (cat_type, portal id); videos without an id are always new.
+    """
+    key = (cat_type, str(video.get('id') or ''))
+    if not key[1]:
+        return True
+    if key in seen:
+        return False
+    seen.add(key)
+    return True
+
+
 class StalkerAddon:
     """Stalker Addon"""
     @staticmethod
     def __toggle_favorites(video_id, add, _type):
         """Remove/add favorites and refresh"""
-        Logger.debug('Toggle Favorites video_id={}, add={}, _type={}'.format(video_id, add, _type))
+        Logger.debug('Toggle Favorites video_id={}, add={}, _type={}', video_id, add, _type)
         if add:
             Api.add_favorites(video_id, _type)
         else:
@@ -237,7 +299,7 @@ class StalkerAddon:
     @staticmethod
     def __play_video(params):
         """Play video"""
-        Logger.debug('Play video {}'.format(params))
+        Logger.debug('Play video {}', params)
         stream_url = Api.get_vod_stream_url(params['video_id'], params['series'], params.get('cmd', ''), params.get('use_cmd', '0'))
         play_item = xbmcgui.ListItem(path=stream_url)
         video_info = play_item.getVideoInfoTag()
@@ -256,7 +318,7 @@ class StalkerAddon:
     @staticmethod
     def __play_tv(params):
         """Play TV Channel"""
-        Logger.debug('Play TV {}'.format(params))
+        Logger.debug('Play TV {}', params)
         stream_url = Api.get_tv_stream_url(params)
         play_item = xbmcgui.ListItem(path=stream_url)
         xbmcplugin.setResolvedUrl(G.get_handle(), True, listitem=play_item)
@@ -315,11 +377,13 @@ class StalkerAddon:
             url = G.get_plugin_url({'action': 'vod_filter'})
             xbmcplugin.addDirectoryItem(G.get_handle(), url, list_item, True)
 
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
-        raw_cats = stalker_cache.get_categories('vod')
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        raw_cats = stalker_cache.get_categories('vod', allow_stale=True)
         if raw_cats is None:
             raw_cats = Api.get_vod_categories() or []
             stalker_cache.set_categories('vod', raw_cats)
+        elif stalker_cache.categories_are_stale('vod'):
+            _queue_revalidation('vod')
         categories = _apply_category_filter(raw_cats, G.get_filter_file_path('vod'))
         for category in categories:
             cat_name = _clean_lang_tags(category['title'])
@@ -357,12 +421,14 @@ class StalkerAddon:
             url = G.get_plugin_url({'action': 'series_filter'})
             xbmcplugin.addDirectoryItem(G.get_handle(), url, list_item, True)
 
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
-        raw_cats = stalker_cache.get_categories('series')
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        raw_cats = stalker_cache.get_categories('series', allow_stale=True)
         if raw_cats is None:
             raw = Api.get_series_categories()
             raw_cats = raw if isinstance(raw, list) else []
             stalker_cache.set_categories('series', raw_cats)
+        elif stalker_cache.categories_are_stale('series'):
+            _queue_revalidation('series')
         categories = _apply_category_filter(raw_cats, G.get_filter_file_path('series'))
         for category in categories:
             cat_name = _clean_lang_tags(category['title'])
@@ -379,7 +445,7 @@ class StalkerAddon:
     @staticmethod
     def __list_channels(params):
         """List the TV Channels"""
-        Logger.debug('List Channels {}'.format(params))
+        Logger.debug('List Channels {}', params)
         search_term = params.get('search_term', '')
         page = params['page']
         plugin_category = 'TV - ' + params['category'] if params.get('fav', '0') != '1' else 'TV - ' + params['category'] + ' - FAVORITES'
@@ -389,6 +455,7 @@ class StalkerAddon:
         StalkerAddon.__create_tv_listing(videos, params)
 
     @staticmethod
+    @timed('listitems')
     def __create_tv_listing(videos, params):
         update_listing = params['update_listing']
         item_count = len(videos['data'])
@@ -421,22 +488,31 @@ class StalkerAddon:
     @staticmethod
     def __list_vod(params):
         """List videos for a category"""
-        Logger.debug('List VOD {}'.format(params))
+        Logger.debug('List VOD {}', params)
         search_term = params.get('search_term', '')
         plugin_category = 'VOD - ' + params['category'] if params.get('fav', '0') != '1' else 'VOD - ' + params['category'] + ' - FAVORITES'
         xbmcplugin.setPluginCategory(G.get_handle(), plugin_category)
         xbmcplugin.setContent(G.get_handle(), 'movies')
         # page_size controls how many server pages are loaded at once:
         #   1 = ~20 items, 2 = ~40 items, 5 = ~100 items, 9999 = all at once.
-        # When "all at once" + cache → instant from local cache.
-        # Otherwise → pages are fetched from server.
+        # With the cache enabled the pages come from the local cache (only
+        # the records of the requested pages are read); the server is only
+        # asked for searches, favorites or categories that are not cached.
         videos = None
         load_all = G.addon_config.max_page_limit >= 9999
         use_cache = G.addon_config.cache_enabled
-        if load_all and use_cache and not search_term.strip() and str(params.get('fav', '0')) == '0':
-            cached = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days).get_videos('vod', params['category_id'])
-            if cached is not None:
-                videos = {'data': cached, 'total_items': len(cached), 'max_page_items': len(cached)}
+        if use_cache and not search_term.strip() and str(params.get('fav', '0')) == '0':
+            stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+            # Expired lists are shown as well and refreshed in the background
+            if load_all:
+                cached = stalker_cache.get_videos('vod', params['category_id'], allow_stale=True)
+                if cached is not None:
+                    videos = {'data': cached, 'total_items': len(cached), 'max_page_items': len(cached)}
+            else:
+                videos = stalker_cache.get_videos_page('vod', params['category_id'], params['page'],
+                                                       G.addon_config.max_page_limit, allow_stale=True)
+            if videos is not None and stalker_cache.videos_are_stale('vod', params['category_id']):
+                _queue_revalidation('vod', params['category_id'])
         if videos is None:
             videos = Api.get_videos(params['category_id'], params['page'], search_term, params.get('fav', 0))
         StalkerAddon.__create_video_listing(videos, params)
@@ -444,7 +520,7 @@ class StalkerAddon:
     @staticmethod
     def __list_vod_favorites(params):
         """List Favorites Channels"""
-        Logger.debug('List VOD Favorites {}'.format(params))
+        Logger.debug('List VOD Favorites {}', params)
         xbmcplugin.setPluginCategory(G.get_handle(), 'VOD FAVORITES')
         xbmcplugin.setContent(G.get_handle(), 'movies')
         videos = Api.get_vod_favorites(params['page'])
@@ -461,7 +537,7 @@ class StalkerAddon:
     @staticmethod
     def __list_tv_favorites(params):
         """List Favorites Channels"""
-        Logger.debug('List TV favorites {}'.format(params))
+        Logger.debug('List TV favorites {}', params)
         xbmcplugin.setPluginCategory(G.get_handle(), 'TV FAVORITES')
         xbmcplugin.setContent(G.get_handle(), 'videos')
         videos = Api.get_tv_favorites(params['page'])
@@ -470,27 +546,37 @@ class StalkerAddon:
     @staticmethod
     def __list_series(params):
         """List series"""
-        Logger.debug('List TV favorites {}'.format(params))
+        Logger.debug('List TV favorites {}', params)
         search_term = params.get('search_term', '')
         plugin_category = 'SERIES - ' + params['category'] if params.get('fav', '0') != '1' else 'SERIES - ' + params['category'] + ' - FAVORITES'
         xbmcplugin.setPluginCategory(G.get_handle(), plugin_category)
         xbmcplugin.setContent(G.get_handle(), 'tvshows')
         # page_size controls how many server pages are loaded at once:
         #   1 = ~20 items, 2 = ~40 items, 5 = ~100 items, 9999 = all at once.
-        # When "all at once" + cache → instant from local cache.
-        # Otherwise → pages are fetched from server.
+        # With the cache enabled the pages come from the local cache (only
+        # the records of the requested pages are read); the server is only
+        # asked for searches, favorites or categories that are not cached.
         series = None
         load_all = G.addon_config.max_page_limit >= 9999
         use_cache = G.addon_config.cache_enabled
-        if load_all and use_cache and not search_term.strip() and str(params.get('fav', '0')) == '0':
-            cached = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days).get_videos('series', params['category_id'])
-            if cached is not None:
-                series = {'data': cached, 'total_items': len(cached), 'max_page_items': len(cached)}
+        if use_cache and not search_term.strip() and str(params.get('fav', '0')) == '0':
+            stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+            # Expired lists are shown as well and refreshed in the background
+            if load_all:
+                cached = stalker_cache.get_videos('series', params['category_id'], allow_stale=True)
+                if cached is not None:
+                    series = {'data': cached, 'total_items': len(cached), 'max_page_items': len(cached)}
+            else:
+                series = stalker_cache.get_videos_page('series', params['category_id'], params['page'],
+                                                       G.addon_config.max_page_limit, allow_stale=True)
+            if series is not None and stalker_cache.videos_are_stale('series', params['category_id']):
+                _queue_revalidation('series', params['category_id'])
         if series is None:
             series = Api.get_series(params['category_id'], params['page'], search_term, params.get('fav', 0))
         StalkerAddon.__create_series_listing(series, params)
 
     @staticmethod
+    @timed('listitems')
     def __list_season(params):
         """List season"""
         xbmcplugin.setPluginCategory(G.get_handle(), params['name'])
@@ -561,62 +647,59 @@ class StalkerAddon:
         xbmcplugin.endOfDirectory(G.get_handle(), succeeded=True, updateListing=False, cacheToDisc=False)
 
     @staticmethod
+    @timed('listitems')
     def __create_video_listing(videos, params):
         """Create paginated listing"""
         update_listing = params['update_listing']
         item_count = len(videos['data'])
         directory_items = []
         for video in videos['data']:
-            name = _clean_lang_tags(video['name'])
+            # Cached lists hold PortalItems already; portal responses are converted once
+            video = as_item(video)
+            name = video.title
             label = name if video.get('hd', 1) == 1 else name + ' (SD)'
-            if video.get('fav', 0) == 1:
+            if video.fav == 1:
                 label = label + ' ★'
             list_item = xbmcgui.ListItem(label=label, label2=label)
-            if video.get('fav', 0) == 1:
-                url = G.get_plugin_url({'action': 'remove_fav', 'video_id': video['id'], '_type': 'vod'})
+            if video.fav == 1:
+                url = G.get_plugin_url({'action': 'remove_fav', 'video_id': video.id, '_type': 'vod'})
                 list_item.addContextMenuItems([('Remove from favorites', f'RunPlugin({url}, False)')])
             else:
-                url = G.get_plugin_url({'action': 'add_fav', 'video_id': video['id'], '_type': 'vod'})
+                url = G.get_plugin_url({'action': 'add_fav', 'video_id': video.id, '_type': 'vod'})
                 list_item.addContextMenuItems([('Add to favorites', f'RunPlugin({url}, False)')])
 
             is_folder = False
-            poster_url = None
-            if 'screenshot_uri' in video and isinstance(video['screenshot_uri'], str):
-                if video['screenshot_uri'].startswith('http'):
-                    poster_url = video['screenshot_uri']
-                else:
-                    poster_url = G.portal_config.portal_base_url + video['screenshot_uri']
+            poster_url = video.poster
             video_info = list_item.getVideoInfoTag()
-            if video['series']:
-                url = G.get_plugin_url({'action': 'sub_folder', 'video_id': video['id'], 'start': video['series'][0], 'end': video['series'][-1],
+            if video.series:
+                url = G.get_plugin_url({'action': 'sub_folder', 'video_id': video.id, 'start': video.series[0], 'end': video.series[-1],
                                         'name': name, 'poster_url': poster_url})
                 is_folder = True
                 video_info.setMediaType('video')
             else:
-                url = G.get_plugin_url({'action': 'play', 'video_id': video['id'], 'series': 0, 'title': name, 'cmd': video.get('cmd', '')})
-                time = get_int_value(video, 'time')
-                if time != 0:
-                    video_info.setDuration(time * 60)
+                url = G.get_plugin_url({'action': 'play', 'video_id': video.id, 'series': 0, 'title': name, 'cmd': video.get('cmd', '')})
+                if video.minutes != 0:
+                    video_info.setDuration(video.minutes * 60)
                 video_info.setMediaType('movie')
                 list_item.setProperty('IsPlayable', 'true')
 
             video_info.setTitle(name)
             video_info.setOriginalTitle(name)
             video_info.setSortTitle(name)
-            if 'country' in video:
-                video_info.setCountries([video['country']])
-            video_info.setDirectors([video['director']])
+            if video.country is not None:
+                video_info.setCountries([video.country])
+            video_info.setDirectors([video.director] if video.director else [])
             video_info.setPlot(video.get('description', ''))
             video_info.setPlotOutline(video.get('description', ''))
-            actors = [xbmc.Actor(actor) for actor in video['actors'].split(',') if actor]  # pylint: disable=maybe-no-member
+            actors = [xbmc.Actor(actor) for actor in (video.actors or '').split(',') if actor]  # pylint: disable=maybe-no-member
             video_info.setCast(actors)
-            video_info.setLastPlayed(video['last_played'])
-            video_info.setDateAdded(video['added'])
-            year = get_int_value(video, 'year')
+            video_info.setLastPlayed(video.last_played)
+            video_info.setDateAdded(video.added)
+            year = video.year_no
             if year != 0:
                 video_info.setYear(year)
             # TMDB enrichment: overrides poster, fanart, plot, rating if available
-            if video['series']:
+            if video.series:
                 _apply_tmdb_tv(list_item, video_info, name, year if year != 0 else None, poster_url)
             else:
                 _apply_tmdb_movie(list_item, video_info, name, year if year != 0 else None, poster_url)
@@ -634,47 +717,44 @@ class StalkerAddon:
         xbmcplugin.endOfDirectory(G.get_handle(), succeeded=True, updateListing=update_listing == 'True', cacheToDisc=False)
 
     @staticmethod
+    @timed('listitems')
     def __create_series_listing(series, params):
         """Create paginated listing"""
         update_listing = params['update_listing']
         item_count = len(series['data'])
         directory_items = []
         for video in series['data']:
-            name = _clean_lang_tags(video['name'])
+            video = as_item(video)
+            name = video.title
             label = name if video.get('hd', 1) == 1 else name + ' (SD)'
-            if video.get('fav', 0) == 1:
+            if video.fav == 1:
                 label = label + ' ★'
             list_item = xbmcgui.ListItem(label=label, label2=label)
-            if video.get('fav', 0) == 1:
-                url = G.get_plugin_url({'action': 'remove_fav', 'video_id': video['id'], '_type': 'series'})
+            if video.fav == 1:
+                url = G.get_plugin_url({'action': 'remove_fav', 'video_id': video.id, '_type': 'series'})
                 list_item.addContextMenuItems([('Remove from favorites', f'RunPlugin({url}, False)')])
             else:
-                url = G.get_plugin_url({'action': 'add_fav', 'video_id': video['id'], '_type': 'series'})
+                url = G.get_plugin_url({'action': 'add_fav', 'video_id': video.id, '_type': 'series'})
                 list_item.addContextMenuItems([('Add to favorites', f'RunPlugin({url}, False)')])
 
-            poster_url = None
-            if 'screenshot_uri' in video and isinstance(video['screenshot_uri'], str):
-                if video['screenshot_uri'].startswith('http'):
-                    poster_url = video['screenshot_uri']
-                else:
-                    poster_url = G.portal_config.portal_base_url + video['screenshot_uri']
+            poster_url = video.poster
             video_info = list_item.getVideoInfoTag()
-            url = G.get_plugin_url({'action': 'season_listing', 'video_id': video['id'], 'name': name, 'poster_url': poster_url})
+            url = G.get_plugin_url({'action': 'season_listing', 'video_id': video.id, 'name': name, 'poster_url': poster_url})
             video_info.setMediaType('tvshow')
 
             video_info.setTitle(name)
             video_info.setOriginalTitle(name)
             video_info.setSortTitle(name)
-            if 'country' in video:
-                video_info.setCountries([video['country']])
-            video_info.setDirectors([video['director']])
+            if video.country is not None:
+                video_info.setCountries([video.country])
+            video_info.setDirectors([video.director] if video.director else [])
             video_info.setPlot(video.get('description', ''))
             video_info.setPlotOutline(video.get('description', ''))
-            actors = [xbmc.Actor(actor) for actor in video['actors'].split(',') if actor]  # pylint: disable=maybe-no-member
+            actors = [xbmc.Actor(actor) for actor in (video.actors or '').split(',') if actor]  # pylint: disable=maybe-no-member
             video_info.setCast(actors)
-            video_info.setLastPlayed(video['last_played'])
-            video_info.setDateAdded(video['added'])
-            year = get_int_value(video, 'year')
+            video_info.setLastPlayed(video.last_played)
+            video_info.setDateAdded(video.added)
+            year = video.year_no
             if year != 0:
                 video_info.setYear(year)
             # TMDB enrichment: overrides poster, fanart, plot, rating if available
@@ -723,6 +803,7 @@ class StalkerAddon:
         directory_items.append((url, list_item, True))
 
     @staticmethod
+    @timed('listitems')
     def __list_episodes(params):
         """List episodes for a series"""
         name = params['name']
@@ -798,7 +879,7 @@ class StalkerAddon:
 
     def __search_vod(self, params):
         """Search for videos"""
-        Logger.debug('Search VOD {}'.format(params))
+        Logger.debug('Search VOD {}', params)
 
         # Wenn keine Kategorie angegeben → direkt alle sichtbaren Gruppen durchsuchen
         if not params.get('category'):
@@ -826,12 +907,18 @@ class StalkerAddon:
     def __search_vod_across_categories(self, filtered_categories, search_term, params):
         """Suche über alle sichtbaren VOD-Kategorien und zeige kombinierte Ergebnisse."""
         all_videos = {'data': [], 'total_items': 0, 'max_page_items': 9999}
-        for category in filtered_categories:
-            try:
-                result = Api.get_videos(category['id'], 1, search_term, 0)
-                all_videos['data'].extend(result.get('data', []))
-            except Exception:
-                pass
+        # SQLite cache: one indexed query instead of one portal search per category
+        found = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days).search_videos(
+            'vod', [category['id'] for category in filtered_categories], search_term)
+        if found is not None:
+            all_videos['data'] = found
+        else:
+            for category in filtered_categories:
+                try:
+                    result = Api.get_videos(category['id'], 1, search_term, 0)
+                    all_videos['data'].extend(result.get('data', []))
+                except Exception:
+                    pass
         all_videos['total_items'] = len(all_videos['data'])
         xbmcplugin.setPluginCategory(G.get_handle(), 'VOD - Suche: ' + search_term)
         xbmcplugin.setContent(G.get_handle(), 'movies')
@@ -864,12 +951,17 @@ class StalkerAddon:
     def __search_series_across_categories(self, filtered_categories, search_term, params):
         """Suche über alle sichtbaren Serien-Kategorien und zeige kombinierte Ergebnisse."""
         all_series = {'data': [], 'total_items': 0, 'max_page_items': 9999}
-        for category in filtered_categories:
-            try:
-                result = Api.get_series(category['id'], 1, search_term, 0)
-                all_series['data'].extend(result.get('data', []))
-            except Exception:
-                pass
+        found = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days).search_videos(
+            'series', [category['id'] for category in filtered_categories], search_term)
+        if found is not None:
+            all_series['data'] = found
+        else:
+            for category in filtered_categories:
+                try:
+                    result = Api.get_series(category['id'], 1, search_term, 0)
+                    all_series['data'].extend(result.get('data', []))
+                except Exception:
+                    pass
         all_series['total_items'] = len(all_series['data'])
         xbmcplugin.setPluginCategory(G.get_handle(), 'SERIES - Suche: ' + search_term)
         xbmcplugin.setContent(G.get_handle(), 'tvshows')
@@ -928,8 +1020,14 @@ class StalkerAddon:
         url = G.get_plugin_url({'action': 'vod', 'page': 1, 'update_listing': False})
         xbmcplugin.addDirectoryItem(G.get_handle(), url, list_item, True)
 
-        series_categories = Api.get_series_categories()
-        if isinstance(series_categories, list) and len(series_categories) > 0:
+        # Same cache as the series route: no portal round trip for the main menu
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        series_categories = stalker_cache.get_categories('series', allow_stale=True)
+        if series_categories is None:
+            raw = Api.get_series_categories()
+            series_categories = raw if isinstance(raw, list) else []
+            stalker_cache.set_categories('series', series_categories)
+        if len(series_categories) > 0:
             list_item = xbmcgui.ListItem(label='SERIES')
             url = G.get_plugin_url({'action': 'series', 'page': 1, 'update_listing': False})
             xbmcplugin.addDirectoryItem(G.get_handle(), url, list_item, True)
@@ -948,7 +1046,7 @@ class StalkerAddon:
         """
         # Prevent screensaver from interrupting the refresh (e.g. Nvidia Shield)
         xbmc.executebuiltin('InhibitScreensaver(true)')
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
         progress = None
         if not silent:
             progress = xbmcgui.DialogProgress()
@@ -984,6 +1082,7 @@ class StalkerAddon:
                 return
 
             tmdb = _get_tmdb_client()
+            seen = set()
             for idx, (cat_type, category) in enumerate(work):
                 if not silent and progress.iscanceled():
                     break
@@ -1000,13 +1099,15 @@ class StalkerAddon:
                     continue
 
                 # Save video list to local Stalker cache
-                stalker_cache.set_videos(cat_type, category['id'], result.get('data', []))
+                stalker_cache.set_videos(cat_type, category['id'], result.get('data', []), result.get('max_page_items'))
 
                 if tmdb:
                     rate_limit_hit = False
                     for video in result.get('data', []):
                         if not silent and progress.iscanceled():
                             break
+                        if not _first_visit(seen, cat_type, video):
+                            continue
                         vname = _clean_lang_tags(video['name'])
                         if not silent:
                             progress.update(pct, '[{}/{}] {}: {}'.format(idx + 1, total, cat_name, vname))
@@ -1044,6 +1145,43 @@ class StalkerAddon:
             if not silent and progress:
                 progress.close()
 
+    @staticmethod
+    def __revalidate(params):
+        """Background refresh of one expired category list or video list (started by the service).
+
+        Stores the portal data and refreshes the container if it still shows
+        that list and the data has changed.
+        """
+        cat_type = params.get('cat_type')
+        cat_id = params.get('category_id') or None
+        if cat_type not in ('vod', 'series'):
+            return
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        stale = stalker_cache.videos_are_stale(cat_type, cat_id) if cat_id else stalker_cache.categories_are_stale(cat_type)
+        if not stale:
+            return  # refreshed meanwhile (daily update, other request)
+        before = stalker_cache.get_meta(cat_type, cat_id)
+        original_limit = G.addon_config.max_page_limit
+        G.addon_config.max_page_limit = 9999
+        try:
+            if cat_id:
+                getter = Api.get_videos if cat_type == 'vod' else Api.get_series
+                result = getter(cat_id, 1, '', 0)
+                stalker_cache.set_videos(cat_type, cat_id, result.get('data', []), result.get('max_page_items'))
+            else:
+                raw = Api.get_vod_categories() if cat_type == 'vod' else Api.get_series_categories()
+                stalker_cache.set_categories(cat_type, raw if isinstance(raw, list) else [])
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('Revalidation of {} {} failed: {}', cat_type, cat_id or 'categories', exc)
+            return
+        finally:
+            G.addon_config.max_page_limit = original_limit
+        after = stalker_cache.get_meta(cat_type, cat_id)
+        unchanged = (before is not None and after is not None and before.get('fingerprint') is not None
+                     and before.get('fingerprint') == after.get('fingerprint'))
+        if not unchanged and _container_shows(cat_type, cat_id):
+            xbmc.executebuiltin('Container.Refresh')
+
     @staticmethod
     def __update_new_data(silent=False):
         """Load portal data to cache (smart update).
@@ -1073,7 +1211,7 @@ class StalkerAddon:
 
         # Prevent screensaver from interrupting the update (e.g. Nvidia Shield)
         xbmc.executebuiltin('InhibitScreensaver(true)')
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
         progress = None
         if not silent:
             progress = xbmcgui.DialogProgress()
@@ -1110,6 +1248,7 @@ class StalkerAddon:
 
             tmdb = _get_tmdb_client()
             total_new = 0
+            seen = set()
             for idx, (cat_type, category) in enumerate(work):
                 if not silent and progress.iscanceled():
                     break
@@ -1133,12 +1272,12 @@ class StalkerAddon:
                 new_items = [v for v in server_items if str(v.get('id', '')) not in cached_ids]
                 if not new_items:
                     # Even if no new items, save the video list to refresh the cache timestamp
-                    stalker_cache.set_videos(cat_type, category['id'], cached_items)
+                    stalker_cache.set_videos(cat_type, category['id'], cached_items, result.get('max_page_items'))
                     continue
 
                 # New items first so they appear at the top
                 merged = new_items + cached_items
-                stalker_cache.set_videos(cat_type, category['id'], merged)
+                stalker_cache.set_videos(cat_type, category['id'], merged, result.get('max_page_items'))
                 total_new += len(new_items)
 
                 if tmdb:
@@ -1146,6 +1285,8 @@ class StalkerAddon:
                     for video in new_items:
                         if not silent and progress.iscanceled():
                             break
+                        if not _first_visit(seen, cat_type, video):
+                            continue
                         vname = _clean_lang_tags(video['name'])
                         if not silent:
                             progress.update(pct, '[{}/{}] {}: {}'.format(idx + 1, total, cat_name, vname))
@@ -1266,7 +1407,7 @@ class StalkerAddon:
             )
             return
 
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
         vod_cats = _apply_category_filter(
             stalker_cache.get_categories('vod') or [],
             G.get_filter_file_path('vod')
@@ -1291,6 +1432,7 @@ class StalkerAddon:
         progress = xbmcgui.DialogProgress()
         progress.create('TMDB-Metadaten laden', 'Starte...')
         try:
+            seen = set()
             for idx, (cat_type, category) in enumerate(work):
                 if progress.iscanceled():
                     break
@@ -1302,12 +1444,14 @@ class StalkerAddon:
                 for video in videos:
                     if progress.iscanceled():
                         break
-                    vname = _clean_lang_tags(video['name'])
+                    if not _first_visit(seen, cat_type, video):
+                        continue
+                    video = as_item(video)
+                    vname = video.title
                     progress.update(pct, '[{}/{}] {}: {}'.format(idx + 1, total, cat_name, vname))
-                    year = get_int_value(video, 'year')
-                    year = year if year != 0 else None
+                    year = video.year_no or None
                     try:
-                        if cat_type == 'series' or video.get('series'):
+                        if cat_type == 'series' or video.series:
                             tmdb.get_tv_info(vname, year)
                         else:
                             tmdb.get_movie_info(vname, year)
@@ -1363,16 +1507,13 @@ class StalkerAddon:
     @staticmethod
     def __stalker_cache_info():
         """Show Stalker portal cache statistics: number of files, total size, age."""
-        cache_dir = G.addon_config.token_path
+        cache_dir = G.addon_config.cache_path
         if not cache_dir:
             xbmcgui.Dialog().ok('Portal-Cache Info', 'Kein Cache-Verzeichnis konfiguriert.')
             return
 
-        import glob as globmod
-        pattern = os.path.join(cache_dir, 'stalker_*.json')
-        cache_files = globmod.glob(pattern)
-
-        if not cache_files:
+        stats = StalkerCache(cache_dir, cache_days=G.addon_config.stalker_cache_days).info()
+        if not stats['files']:
             xbmcgui.Dialog().ok(
                 'Portal-Cache Info',
                 'Kein Portal-Cache vorhanden.[CR]'
@@ -1380,37 +1521,11 @@ class StalkerAddon:
             )
             return
 
-        total_size = 0
-        oldest_ts = None
-        newest_ts = None
-        cat_count = 0
-        video_count = 0
-
-        for fp in cache_files:
-            try:
-                stat = xbmcvfs.Stat(fp)
-                total_size += stat.st_size()
-            except Exception:
-                pass
-
-            try:
-                with xbmcvfs.File(fp, 'r') as fh:
-                    content = fh.read()
-                if content:
-                    data = json.loads(content)
-                    ts = data.get('ts', 0)
-                    if ts > 0:
-                        if oldest_ts is None or ts < oldest_ts:
-                            oldest_ts = ts
-                        if newest_ts is None or ts > newest_ts:
-                            newest_ts = ts
-                    fname = os.path.basename(fp)
-                    if fname.startswith('stalker_cats_'):
-                        cat_count += len(data.get('data', []))
-                    elif fname.startswith('stalker_videos_'):
-                        video_count += len(data.get('data', []))
-            except Exception:
-                pass
+        total_size = stats['bytes']
+        oldest_ts = stats['oldest']
+        newest_ts = stats['newest']
+        cat_count = stats['categories']
+        video_count = stats['videos']
 
         now = time.time()
         if total_size < 1024 * 1024:
@@ -1437,25 +1552,22 @@ class StalkerAddon:
             'Cache-Dateien: {}[CR]'
             'Neuester Eintrag: {}[CR]'
             'Ältester Eintrag: {}[CR]'
-            'Cache-Größe: {}'.format(
+            'Cache-Größe: {}{}'.format(
                 cat_count,
                 video_count,
-                len(cache_files),
+                stats['files'],
                 newest_str,
                 oldest_str,
                 size_str,
+                StalkerAddon.__request_summary('portal'),
             )
         )
 
     @staticmethod
     def __stalker_clear_cache():
         """Delete all local Stalker portal cache files."""
-        import glob as globmod
-        cache_dir = G.addon_config.token_path
-        pattern = os.path.join(cache_dir, 'stalker_*.json')
-        cache_files = globmod.glob(pattern)
-
-        if not cache_files:
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        if not stalker_cache.list_count():
             xbmcgui.Dialog().ok('Portal-Cache', 'Kein Cache vorhanden – nichts zu löschen.')
             return
 
@@ -1468,21 +1580,43 @@ class StalkerAddon:
         if not confirmed:
             return
 
-        deleted = 0
-        for fp in cache_files:
-            try:
-                if xbmcvfs.delete(fp):
-                    deleted += 1
-            except Exception:
-                pass
+        deleted = stalker_cache.clear()
 
         xbmcgui.Dialog().ok(
             'Portal-Cache gelöscht',
-            '{} Cache-Datei(en) gelöscht.[CR]'
+            '{} Cache-Liste(n) gelöscht.[CR]'
             'Beim nächsten Öffnen eines Ordners werden die Daten '
             'neu vom Server geladen.'.format(deleted)
         )
 
+    # ------------------------------------------------------------------
+    # Diagnostics
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def __show_perf_stats():
+        """Show p50/p95 duration per action and the average split into phases."""
+        records = metrics.load(G.addon_config.token_path)
+        if not records:
+            xbmcgui.Dialog().ok(
+                'Leistungsstatistik',
+                'Noch keine Messwerte vorhanden.[CR]'
+                'Die Zeitmessung muss unter "Diagnose" aktiviert sein.'
+            )
+            return
+        phase_labels = {'portal': 'Portal', 'tmdb': 'TMDB', 'cache': 'Cache',
+                        'listitems': 'Liste', 'other': 'Sonstiges'}
+        summary = metrics.summarize(records)
+        lines = ['{} Aufrufe seit {}'.format(
+            len(records), time.strftime('%d.%m.%Y %H:%M', time.localtime(records[0].get('ts', 0)))), '']
+        for route, row in sorted(summary.items(), key=lambda kv: -kv[1]['p95']):
+            lines.append('[B]{}[/B]  {}x  p50 {:.0f} ms  p95 {:.0f} ms'.format(
+                route, row['count'], row['p50'], row['p95']))
+            phases = ['{} {:.0f}'.format(phase_labels[name], row['phases'][name])
+                      for name in metrics.PHASES if row['phases'].get(name, 0) >= 0.5]
+            lines.append('    Ø ms: ' + ', '.join(phases))
+        xbmcgui.Dialog().textviewer('Leistungsstatistik', '\n'.join(lines))
+
     # ------------------------------------------------------------------
     # TMDB Filter (Genre / Year / Rating)
     # ------------------------------------------------------------------
@@ -1608,7 +1742,7 @@ class StalkerAddon:
         videos_with_tmdb is a list of (stalker_video, tmdb_info) tuples.
         """
         tmdb = _get_tmdb_client()
-        stalker_cache = StalkerCache(G.addon_config.token_path, cache_days=G.addon_config.stalker_cache_days)
+        stalker_cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
         raw_cats = stalker_cache.get_categories(cat_type) or []
         filter_file = G.get_filter_file_path(cat_type)
         categories = _apply_category_filter(raw_cats, filter_file)
@@ -1618,15 +1752,15 @@ class StalkerAddon:
         all_ratings = set()
         videos_with_tmdb = []
 
-        for category in categories:
-            videos = stalker_cache.get_videos(cat_type, category['id'])
-            if not videos:
-                continue
+        seen = set()
+        for _, videos in stalker_cache.iter_videos(cat_type, [category['id'] for category in categories]):
             for video in videos:
-                name = _clean_lang_tags(video['name'])
-                year = get_int_value(video, 'year')
-                year = year if year != 0 else None
-                is_series = cat_type == 'series' or video.get('series')
+                if not _first_visit(seen, cat_type, video):
+                    continue
+                video = as_item(video)
+                name = video.title
+                year = video.year_no or None
+                is_series = cat_type == 'series' or video.series
                 if is_series:
                     info = tmdb.get_cached_tv_info(name, year)
                 else:
@@ -1767,7 +1901,6 @@ class StalkerAddon:
     @staticmethod
     def __show_tmdb_cache_info():
         """Show TMDB cache statistics: entry count, age, expiry, file size."""
-        import json
         cache_path = os.path.join(G.addon_config.token_path, 'tmdb_cache.json')
         cache_days = G.tmdb_config.cache_days
 
@@ -1780,9 +1913,8 @@ class StalkerAddon:
             return
 
         try:
-            with xbmcvfs.File(cache_path, 'r') as fh:
-                content = fh.read()
-            cache = json.loads(content) if content else {}
+            content = fileio.read(cache_path)
+            cache = codec.loads(content) if content else {}
         except Exception:
             xbmcgui.Dialog().ok('TMDB-Cache Info', 'Cache-Datei konnte nicht gelesen werden.')
             return
@@ -1826,16 +1958,23 @@ class StalkerAddon:
             'Neuester Eintrag: {}[CR]'
             'Ältester Eintrag: {}[CR]'
             'Läuft ab in: {} (Einstellung: {} Tage)[CR]'
-            'Cache-Größe: {}'.format(
+            'Cache-Größe: {}{}'.format(
                 len(film_entries),
                 newest_str,
                 oldest_str,
                 expiry_str,
                 cache_days,
                 size_str,
+                StalkerAddon.__request_summary('tmdb'),
             )
         )
 
+    @staticmethod
+    def __request_summary(target):
+        """Request totals per action for the cache info dialogs ('' if none recorded)."""
+        lines = request_stats.summary_lines(G.addon_config.token_path, target)
+        return '[CR][CR]' + '[CR]'.join(lines) if lines else ''
+
     def router(self, param_string):
         """Route calls"""
         params = dict(parse_qsl(param_string))
@@ -1880,6 +2019,8 @@ class StalkerAddon:
                 self.__refresh_all_data(silent=params.get('silent') == '1')
             elif params['action'] == 'update_new_data':
                 self.__update_new_data(silent=params.get('silent') == '1')
+            elif params['action'] == 'revalidate':
+                self.__revalidate(params)
             elif params['action'] == 'manage_folders':
                 self.__manage_folder_selection(params)
             elif params['action'] == 'stalker_cache_info':
@@ -1892,6 +2033,11 @@ class StalkerAddon:
                 self.__tmdb_refresh_now()
             elif params['action'] == 'tmdb_clear_cache':
                 self.__tmdb_clear_cache()
+            elif params['action'] == 'perf_stats':
+                self.__show_perf_stats()
+            elif params['action'] == 'measure_portal':
+                from .portal_probe import run_probe
+                run_probe()
             elif params['action'] == 'vod_filter':
                 self.__vod_filter(params)
             elif params['action'] == 'series_filter':
@@ -1904,12 +2050,70 @@ class StalkerAddon:
 
 def run(argv):
     """Run"""
-    global _tmdb_client_singleton, _rate_limit_notified
+    global _tmdb_client_singleton, _tmdb_client_checked, _rate_limit_notified, _session_settings_version
     # Reset per-run state so that setting changes take effect immediately
     # without requiring a Kodi restart.
-    _tmdb_client_singleton = None
+    _tmdb_client_checked = False
     _rate_limit_notified = False
+    Logger.refresh()
     G.init_globals()
     _build_lang_tag_pattern()
+    set_item_context(G.settings_version, _clean_lang_tags, G.portal_config.portal_base_url)
+    warm = G.addon_config.warm_cache
+    set_memory_cache_enabled(warm)
+    set_backend(G.addon_config.cache_backend)
+    codec.set_binary(G.addon_config.cache_codec == 1)
+    codec.set_compression(G.addon_config.cache_compression)
+    if not warm:
+        _tmdb_client_singleton = None
+    if _session_settings_version != G.settings_version:
+        # Portal address or credentials may have changed: start with fresh connections
+        request_stats.close_session()
+        _session_settings_version = G.settings_version
     stalker_addon = StalkerAddon()
-    stalker_addon.router(argv[2][1:])
+    query, profile_flag = profiling.split_flag(argv[2][1:])
+    params = dict(parse_qsl(query))
+    route = params.get('action', 'main_menu')
+    _prewarm_connections(route, params)
+    metrics.begin(route)
+    request_stats.set_action(route)
+    started = time.time()
+    try:
+        profiling.run_profiled(profiling.resolve_mode(profile_flag, G.addon_config.profile_mode),
+                               G.addon_config.token_path, route, stalker_addon.router, query)
+    finally:
+        duration_ms = metrics.end(G.addon_config.token_path if G.addon_config.perf_metrics else None)
+        request_stats.flush(G.addon_config.token_path)
+        if not warm:
+            request_stats.close_session()
+        if G.addon_config.nav_trace:
+            _write_nav_trace(argv[2], started, duration_ms)
+
+
+def _prewarm_connections(route, params):
+    """Start connecting to the portal / TMDB while the route is still being set up"""
+    cfg = G.addon_config
+    from_cache = (cfg.cache_enabled and not params.get('search_term', '').strip()
+                  and str(params.get('fav', '0')) == '0')
+    needs_portal = route in _PORTAL_ROUTES or (route in ('vod_listing', 'series_listing') and not from_cache)
+    if needs_portal:
+        request_stats.prewarm(G.portal_config.portal_url)
+    # Only where requests is loaded anyway or TMDB is the point of the route:
+    # listings from cache mostly find their metadata in the TMDB cache
+    tmdb = G.tmdb_config
+    if (tmdb.enabled and tmdb.api_key and route in _TMDB_ROUTES
+            and ((needs_portal and tmdb.load_mode == 0) or route == 'tmdb_refresh_now')):
+        request_stats.prewarm(TMDB_API_BASE)
+
+
+def _write_nav_trace(query, started, duration_ms):
+    """Append one plugin call to nav_trace.jsonl (opt-in, replayed by tools/replay.py)"""
+    path = os.path.join(G.addon_config.token_path, _NAV_TRACE_FILE)
+    try:
+        # Keep one previous generation instead of growing without limit
+        if os.path.exists(path) and os.path.getsize(path) > _NAV_TRACE_MAX_BYTES:
+            os.replace(path, path + '.1')
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps({'ts': round(started, 3), 'url': query, 'ms': round(duration_ms, 1)}) + '\n')
+    except Exception as exc:
+        Logger.warn('Navigation trace write failed: {}'.format(exc))
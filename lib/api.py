@@ -6,10 +6,11 @@ from __future__ import absolute_import, division, unicode_literals
 import json
 import math
 import time
-import requests
 from .globals import G
 from .auth import Auth
 from .loggers import Logger
+from .metrics import timed
+from .request_stats import traced_get
 from .utils import get_int_value
 
 
@@ -17,34 +18,41 @@ class Api:
     """API calls"""
 
     @staticmethod
-    def __call_stalker_portal(params, return_response_body=True):
+    @timed('portal')
+    def __call_stalker_portal(params, return_response_body=True, auth=None):
         """Method to call portal"""
-        response = Api.__call_stalker_portal_return_response(params)
+        response = Api.__call_stalker_portal_return_response(params, auth)
         if return_response_body:
             return response.json()
         return None
 
     @staticmethod
-    def __call_stalker_portal_return_response(params):
-        """Method to call portal"""
+    @timed('portal')
+    def __call_stalker_portal_return_response(params, auth=None):
+        """Method to call portal (auth: Auth shared by the threads of one listing)"""
+        import requests  # pylint: disable=import-outside-toplevel
         retries = 0
         url = G.portal_config.portal_url
         mac_cookie = G.portal_config.mac_cookie
         referrer = G.portal_config.server_address
-        auth = Auth()
+        auth = auth or Auth()
+        state = None
         while True:
-            token = auth.get_token(retries > 0)
-            Logger.debug("Calling Stalker portal {} with params {}".format(url, json.dumps(params)))
+            # state: the token this request is sent with; a rejected token is
+            # only renewed if no other thread has renewed it meanwhile
+            token, state = auth.get_token_state(retries > 0, state)
+            if Logger.debug_enabled():
+                Logger.debug('Calling Stalker portal {} with params {}', url, json.dumps(params))
             try:
-                response = requests.get(url=url,
-                                        headers={'Cookie': mac_cookie,
-                                                 'SN': G.portal_config.serial_number,
-                                                 'Authorization': 'Bearer ' + token,
-                                                 'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': referrer,
-                                                 'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
-                                        params=params,
-                                        timeout=30
-                                        )
+                response = traced_get('portal', retries > 0, url=url,
+                                      headers={'Cookie': mac_cookie,
+                                               'SN': G.portal_config.serial_number,
+                                               'Authorization': 'Bearer ' + token,
+                                               'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': referrer,
+                                               'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
+                                      params=params,
+                                      timeout=30
+                                      )
             except requests.exceptions.RequestException as exc:
                 if retries >= G.addon_config.max_retries:
                     Logger.error('Portal nicht erreichbar nach {} Versuchen: {}'.format(retries + 1, exc))
@@ -57,7 +65,7 @@ class Api:
             if response.text.find('Authorization failed') == -1 or retries == G.addon_config.max_retries:
                 break
             if retries > 1:
-                auth.clear_cache()
+                auth.clear_cache(state)
             retries += 1
         return response
 
@@ -169,21 +177,45 @@ class Api:
         return Api.get_listing(params, page)
 
     @staticmethod
+    @timed('portal')
     def get_listing(params, page):
         """Generic method to get listing"""
-        params.update({'p': str(page)})
-        response = Api.__call_stalker_portal(params)['js']
+        response = Api.get_page(params, page)
         videos = response['data']
         total_items = response['total_items']
         max_page_items = response['max_page_items']
         total_pages = int(math.ceil(float(total_items) / float(max_page_items)))
-        for page_no in range(int(page) + 1, min(int(page) + G.addon_config.max_page_limit, total_pages + 1)):
-            params.update({'p': str(page_no)})
-            time.sleep(0.1)
-            response = Api.__call_stalker_portal(params)['js']
-            videos += response['data']
+        page_numbers = list(range(int(page) + 1, min(int(page) + G.addon_config.max_page_limit, total_pages + 1)))
+        videos += Api.__fetch_pages(params, page_numbers)
         return {'max_page_items': max_page_items, 'total_items': total_items, 'data': videos}
 
+    @staticmethod
+    def get_page(params, page, auth=None):
+        """Fetch one page of a listing (the 'js' part of the response)"""
+        return Api.__call_stalker_portal(dict(params, p=str(page)), auth=auth)['js']
+
+    @staticmethod
+    def __fetch_pages(params, page_numbers):
+        """Fetch further pages with the configured pacing and concurrency, in page order"""
+        pacing = G.addon_config.request_pacing_ms / 1000.0
+        workers = min(G.addon_config.fetch_concurrency, len(page_numbers))
+        # One token for all pages: the first thread rejected with it renews it,
+        # the others continue with the renewed token
+        auth = Auth()
+
+        def fetch(page_no):
+            if pacing > 0:
+                time.sleep(pacing)
+            return Api.get_page(params, page_no, auth)['data']
+
+        if workers <= 1:
+            pages = [fetch(page_no) for page_no in page_numbers]
+        else:
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                pages = list(pool.map(fetch, page_numbers))
+        return [video for page_videos in pages for video in page_videos]
+
     @staticmethod
     def get_vod_stream_url(video_id, series, cmd, use_cmd):
         """Get VOD stream url"""
@@ -1,13 +1,18 @@
 """Module for auth"""
 from __future__ import absolute_import, division, unicode_literals
 import os
-import json
 import dataclasses
-import requests
+import threading
 import xbmcvfs
 import xbmcgui
+from . import codec
 from .globals import G
 from .loggers import Logger
+from .request_stats import traced_get
+from .utils import get_file_stamp
+
+# token.json as last read or written by this interpreter: (path, stamp, dict)
+_token_memo = None
 
 
 @dataclasses.dataclass
@@ -17,13 +22,17 @@ class Token:
 
 
 class Auth:
-    """Auth API"""
+    """Auth API (one instance may be shared by the threads of a paged fetch)"""
 
     __TOKEN_FILE = 'token.json'
 
     def __init__(self):
         self.__token_path = os.path.join(G.addon_config.token_path, self.__TOKEN_FILE)
         self.__token = Token()
+        self.__lock = threading.RLock()
+        # Counts renewals (refresh, new handshake, cleared token): threads
+        # sharing this Auth only renew a token nobody has renewed since
+        self.__renewals = 0
         self.__load_cache()
         self.__url = G.portal_config.portal_url
         self.__mac_cookie = G.portal_config.mac_cookie
@@ -31,85 +40,115 @@ class Auth:
 
     def get_token(self, refresh_token):
         """Get Token"""
-        Logger.debug('Token path {}'.format(self.__token_path))
+        return self.get_token_state(refresh_token)[0]
+
+    def get_token_state(self, refresh_token, used=None):
+        """(token, state) - used: the state a rejected request was sent with.
+
+        The token is only refreshed if it has not been renewed since that
+        request; otherwise the renewed token is returned as it is.
+        """
+        with self.__lock:
+            refresh_token = refresh_token and (used is None or used == self.__renewals)
+            return self.__get_token(refresh_token), self.__renewals
+
+    def __get_token(self, refresh_token):
+        """get_token() while holding the lock"""
+        Logger.debug('Token path {}', self.__token_path)
         if self.__token.value:
             if refresh_token:
                 self.__refresh_token()
+                self.__renewals += 1
             return self.__token.value
         self.clear_cache()
-        Logger.debug('Getting token from {}'.format(self.__url))
-        response = requests.get(url=self.__url,
-                                headers={'Cookie': self.__mac_cookie, 'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
-                                         'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
-                                params={'type': 'stb', 'action': 'handshake'},
-                                timeout=30
-                                )
+        Logger.debug('Getting token from {}', self.__url)
+        response = traced_get('portal', url=self.__url,
+                              headers={'Cookie': self.__mac_cookie, 'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
+                                       'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
+                              params={'type': 'stb', 'action': 'handshake'},
+                              timeout=30
+                              )
         if response.status_code != 200 or response.text.find('Authorization failed') != -1:
             Logger.error('Error getting token, statusCode={}'.format(response.status_code))
-            Logger.debug('Token Response {}'.format(response.text))
+            if Logger.debug_enabled():
+                Logger.debug('Token Response {}', response.text)
             xbmcgui.Dialog().ok(G.addon_config.name, "Error getting token")
             raise Exception
         self.__token.value = response.json()['js']['token']
         self.__refresh_token()
+        self.__renewals += 1
         self.__save_cache()
         return self.__token.value
 
-    def clear_cache(self):
-        """Clear token from cache"""
-        self.__token = Token()
-        if xbmcvfs.exists(self.__token_path):
-            xbmcvfs.delete(self.__token_path)
+    def clear_cache(self, used=None):
+        """Clear token from cache (used: only if not renewed since that get_token_state())"""
+        with self.__lock:
+            if used is not None and used != self.__renewals:
+                return
+            self.__renewals += 1
+            self.__token = Token()
+            if xbmcvfs.exists(self.__token_path):
+                xbmcvfs.delete(self.__token_path)
 
     def __refresh_token(self):
         """Refresh token"""
         Logger.debug('Refreshing token')
-        requests.get(url=self.__url,
-                     headers={'Cookie': self.__mac_cookie, 'SN': G.portal_config.serial_number, 'Authorization': 'Bearer ' + self.__token.value,
-                              'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
-                              'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
-                     params={
-                         'type': 'stb',
-                         'action': 'get_profile',
-                         'hd': '1',
-                         'auth_second_step': '0',
-                         'num_banks': '1',
-                         'stb_type': 'MAG250',
-                         'image_version': '216',
-                         'hw_version': '1.7-BD-00',
-                         'not_valid_token': '0',
-                         'device_id': G.portal_config.device_id,
-                         'device_id2': G.portal_config.device_id_2,
-                         'signature': G.portal_config.signature,
-                         'sn': G.portal_config.serial_number,
-                         'ver': 'ImageDescription:%200.2.18-r23-pub-254;%20ImageDate:%20Wed%20Aug%2029%2010:49:26'
-                                '%20EEST%202018;%20PORTAL%20version:%205.1.1;%20API%20Version:%20JS%20API'
-                                '%20version:%20328;%20STB%20API%20version:%20134;%20Player%20Engine%20version'
-                                ':%200x566'
-                     },
-                     timeout=30
-                     )
-        requests.get(url=self.__url,
-                     headers={'Cookie': self.__mac_cookie, 'SN': G.portal_config.serial_number, 'Authorization': 'Bearer ' + self.__token.value,
-                              'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
-                              'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
-                     params={
-                         'type': 'watchdog', 'action': 'get_events',
-                         'init': '0', 'cur_play_type': '1', 'event_active_id': '0'
-                     },
-                     timeout=30
-                     )
+        traced_get('portal', url=self.__url,
+                   headers={'Cookie': self.__mac_cookie, 'SN': G.portal_config.serial_number, 'Authorization': 'Bearer ' + self.__token.value,
+                            'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
+                            'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
+                   params={
+                       'type': 'stb',
+                       'action': 'get_profile',
+                       'hd': '1',
+                       'auth_second_step': '0',
+                       'num_banks': '1',
+                       'stb_type': 'MAG250',
+                       'image_version': '216',
+                       'hw_version': '1.7-BD-00',
+                       'not_valid_token': '0',
+                       'device_id': G.portal_config.device_id,
+                       'device_id2': G.portal_config.device_id_2,
+                       'signature': G.portal_config.signature,
+                       'sn': G.portal_config.serial_number,
+                       'ver': 'ImageDescription:%200.2.18-r23-pub-254;%20ImageDate:%20Wed%20Aug%2029%2010:49:26'
+                              '%20EEST%202018;%20PORTAL%20version:%205.1.1;%20API%20Version:%20JS%20API'
+                              '%20version:%20328;%20STB%20API%20version:%20134;%20Player%20Engine%20version'
+                              ':%200x566'
+                   },
+                   timeout=30
+                   )
+        traced_get('portal', url=self.__url,
+                   headers={'Cookie': self.__mac_cookie, 'SN': G.portal_config.serial_number, 'Authorization': 'Bearer ' + self.__token.value,
+                            'X-User-Agent': 'Model: MAG250; Link: WiFi', 'Referrer': self.__referrer,
+                            'User-Agent': 'Mozilla/5.0 (QtEmbedded; U; Linux; C) AppleWebKit/533.3 (KHTML, like Gecko) MAG200 stbapp ver: 2 rev: 250 Safari/533.3'},
+                   params={
+                       'type': 'watchdog', 'action': 'get_events',
+                       'init': '0', 'cur_play_type': '1', 'event_active_id': '0'
+                   },
+                   timeout=30
+                   )
 
     def __load_cache(self):
         """ Load tokens from cache """
+        global _token_memo
+        stamp = get_file_stamp(self.__token_path) if G.addon_config.warm_cache else None
+        if stamp is not None and _token_memo is not None and _token_memo[:2] == (self.__token_path, stamp):
+            self.__token.__dict__ = dict(_token_memo[2])
+            return
         Logger.debug('Loading token from cache')
         try:
             with xbmcvfs.File(self.__token_path, 'r') as f:
-                self.__token.__dict__ = json.loads(f.read())
+                self.__token.__dict__ = codec.loads(bytes(f.readBytes()))
+            if stamp is not None:
+                _token_memo = (self.__token_path, stamp, dict(self.__token.__dict__))
         except (IOError, TypeError, ValueError):
             Logger.warn('We could not use the cache since it is invalid or non-existent.')
 
     def __save_cache(self):
         """ Store tokens in cache """
+        global _token_memo
         Logger.debug('Saving token to cache')
         with xbmcvfs.File(self.__token_path, 'w') as f:
-            json.dump(self.__token.__dict__, f, indent=2)
+            f.write(bytearray(codec.dumps(self.__token.__dict__)))
+        _token_memo = (self.__token_path, get_file_stamp(self.__token_path), dict(self.__token.__dict__))
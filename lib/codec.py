@@ -0,0 +1,209 @@
+"""
+Encoding of the cache files (Stalker cache, TMDB cache, token, folder filters).
+
+JSON stays the on-disk format by default.  Large payloads are written and
+parsed with orjson when that module is installed (about five times faster
+than the standard library for writing); importing it takes some 6 ms, so
+small files (token, folder filters) always use the stdlib json module.
+
+With the expert setting "Cache file format: Binary" (cache_codec=1) large
+payloads - the TMDB cache and the Stalker video lists - are stored as
+MessagePack instead, if the msgpack module is installed.  Binary data
+starts with MAGIC, a byte sequence that never starts valid JSON, so
+loads() reads both formats and switching the setting needs no migration;
+a binary file read without msgpack installed fails like any other broken
+cache file and is fetched again.
+
+python -m tools.benchmark --codecs compares the codecs on a generated
+catalog.  Parse times of a 10k list on a desktop CPU:
+
+  Stalker records   json 18 ms   orjson 12 ms   msgpack  8 ms
+  TMDB cache        json 26 ms   orjson 18 ms   msgpack 23 ms
+
+msgpack only wins for the array-shaped Stalker records and is not part of
+Kodi, so it stays opt-in.
+
+The expert setting "Compress cache files" (cache_compression) stores the
+same payloads zlib-compressed (level 1; LZ4 would be faster but is not
+available to Kodi add-ons).  encode() output then starts with ZMAGIC;
+Stalker video lists are compressed in blocks of BLOCK_RECORDS records so a
+listing page only inflates the blocks it shows (dump_blocks/load_blocks).
+On a generated 10k catalog:
+
+  Stalker records   4.2 MB -> 0.55 MB   compress 18 ms   inflate 8 ms
+  TMDB cache        2.7 MB -> 0.41 MB   compress 12 ms   inflate 6 ms
+
+which pays off where reading the file is slower than some 80 MB/s (SD
+cards, eMMC of streaming sticks, network profile folders).
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import json
+import zlib
+
+from .loggers import Logger
+
+MAGIC = b'\xc1SB'  # 0xc1 is never used by MessagePack nor valid in UTF-8
+ZMAGIC = b'\xc1SZ'  # zlib-compressed encode() output
+ZLIB_LEVEL = 1     # level 6 is another 20 % smaller but compresses 2.5 times slower
+BLOCK_RECORDS = 256
+# Below this size parsing with orjson does not make up for importing it
+_FAST_MIN_BYTES = 1024 * 1024
+_FAST_MIN_RECORDS = 1000
+_binary = False
+_compress = False
+_msgpack = None
+_orjson = None
+
+
+def set_binary(enabled):
+    """Store large payloads as MessagePack (setting cache_codec=1); falls back to JSON without msgpack"""
+    global _binary
+    _binary = bool(enabled) and _get_msgpack() is not None
+
+
+def binary_enabled():
+    """True if encode() and the Stalker video lists write MessagePack"""
+    return _binary
+
+
+def set_compression(enabled):
+    """zlib-compress large payloads (setting cache_compression)"""
+    global _compress
+    _compress = bool(enabled)
+
+
+def compression_enabled():
+    """True if encode() and the Stalker video lists write compressed data"""
+    return _compress
+
+
+def _get_msgpack():
+    """The msgpack module, None if it is not installed"""
+    global _msgpack
+    if _msgpack is None:
+        try:
+            import msgpack  # pylint: disable=import-outside-toplevel
+            _msgpack = msgpack
+        except ImportError:
+            Logger.warn('Binary cache format needs the msgpack module, using JSON')
+            _msgpack = False
+    return _msgpack or None
+
+
+def _get_orjson():
+    """The orjson module, None if it is not installed"""
+    global _orjson
+    if _orjson is None:
+        try:
+            import orjson  # pylint: disable=import-outside-toplevel
+            _orjson = orjson
+        except ImportError:
+            _orjson = False
+    return _orjson or None
+
+
+def dumps(obj, large=False):
+    """JSON bytes (compact); large=True: big payload, worth using orjson for"""
+    fast = _get_orjson() if large else None
+    if fast is not None:
+        try:
+            return fast.dumps(obj)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bit: the stdlib handles them
+    return json.dumps(obj, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encode(obj):
+    """Bytes of a large payload: MessagePack with MAGIC if enabled, else JSON; compressed if enabled"""
+    if _binary:
+        data = MAGIC + _msgpack.packb(obj, use_bin_type=True)
+    else:
+        data = dumps(obj, large=True)
+    if _compress:
+        return ZMAGIC + zlib.compress(data, ZLIB_LEVEL)
+    return data
+
+
+def loads(data):
+    """Object of dumps() or encode() data (bytes or str)"""
+    if isinstance(data, (bytes, bytearray)) and data[:len(ZMAGIC)] == ZMAGIC:
+        data = zlib.decompress(data[len(ZMAGIC):])
+    if isinstance(data, (bytes, bytearray)) and data[:len(MAGIC)] == MAGIC:
+        msgpack = _get_msgpack()
+        if msgpack is None:
+            raise ValueError('MessagePack data but msgpack is not installed')
+        return msgpack.unpackb(data[len(MAGIC):], raw=False)
+    fast = _get_orjson() if len(data) >= _FAST_MIN_BYTES else None
+    if fast is not None:
+        return fast.loads(data)
+    return json.loads(data)
+
+
+# ------------------------------------------------------------------
+# Record streams: a list whose items can be read on their own (.idx)
+# ------------------------------------------------------------------
+
+def record_codec():
+    """Codec name new record streams are written with ('json' or 'msgpack')"""
+    return 'msgpack' if _binary else 'json'
+
+
+def dump_records(records, codec='json'):
+    """(payload, offset of the first record, bytes after each record, encoded records)
+
+    json:    [r0,r1,...]  a JSON array
+    msgpack: array header followed by the records, one MessagePack array
+    """
+    if codec == 'msgpack':
+        encoded = [_msgpack.packb(record, use_bin_type=True) for record in records]
+        head = _array_header(len(encoded))
+        return head + b''.join(encoded), len(head), 0, encoded
+    large = len(records) >= _FAST_MIN_RECORDS
+    encoded = [dumps(record, large) for record in records]
+    return b'[' + b','.join(encoded) + b']', 1, 1, encoded
+
+
+def load_records(data, codec='json', count=None):
+    """Records of a dump_records() payload, or of count consecutive records cut out of one"""
+    if codec == 'msgpack':
+        msgpack = _get_msgpack()
+        if msgpack is None:
+            raise ValueError('MessagePack data but msgpack is not installed')
+        if count is not None:
+            data = _array_header(count) + data
+        return msgpack.unpackb(data, raw=False)
+    if count is not None:
+        data = b'[' + data + b']'
+    return loads(data)
+
+
+def dump_blocks(encoded, codec='json', block_records=BLOCK_RECORDS):
+    """(payload, size of every block) of dump_records() records compressed block by block
+
+    Each block is a zlib stream of block_records records (the last one may
+    be shorter), without the array brackets or header of dump_records().
+    """
+    separator = b'' if codec == 'msgpack' else b','
+    blocks = [zlib.compress(separator.join(encoded[pos:pos + block_records]), ZLIB_LEVEL)
+              for pos in range(0, len(encoded), block_records)]
+    return b''.join(blocks), [len(block) for block in blocks]
+
+
+def load_blocks(data, codec='json', count=0):
+    """The count records of consecutive dump_blocks() blocks (all of a payload or a run of them)"""
+    chunks = []
+    while data:
+        inflater = zlib.decompressobj()
+        chunks.append(inflater.decompress(data))
+        data = inflater.unused_data
+    return load_records((b'' if codec == 'msgpack' else b',').join(chunks), codec, count)
+
+
+def _array_header(count):
+    """MessagePack array header for count items"""
+    if count < 16:
+        return bytes((0x90 | count,))
+    if count < 0x10000:
+        return b'\xdc' + count.to_bytes(2, 'big')
+    return b'\xdd' + count.to_bytes(4, 'big')
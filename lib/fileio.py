@@ -0,0 +1,92 @@
+"""
+File access for the large cache files (Stalker video lists, TMDB cache).
+
+xbmcvfs.File goes through Kodi's VFS layer: reads are unbuffered and the
+content is copied once more into a bytearray.  On Android boxes (Shield,
+Fire TV) with the profile on slow eMMC or an SD card this shows with
+multi-MB cache files.  The profile folder is a plain local directory on
+every platform (translatePath), so such paths are read and written with
+buffered native file I/O; paths Kodi has to resolve itself (special://,
+smb:// ...) keep going through xbmcvfs.
+
+Writes to local paths go to a temporary file in the same folder that then
+replaces the target (os.replace): a reader - the service and a plugin call
+run at the same time - never sees a half-written file, and an interrupted
+write leaves the previous file in place.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import threading
+
+import xbmcvfs
+
+# Native reads/writes of this process (tools.benchmark adds them to the xbmcvfs calls)
+calls = {'read': 0, 'write': 0}
+TEMP_SUFFIX = '.tmp'
+
+
+def is_local(path):
+    """True for paths of the local file system (no Kodi VFS URL)"""
+    return '://' not in path
+
+
+class _VfsReader:
+    """xbmcvfs.File with the read()/seek() of a binary file object"""
+
+    def __init__(self, path):
+        if not xbmcvfs.exists(path):
+            raise FileNotFoundError(path)
+        self._fh = xbmcvfs.File(path, 'r')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._fh.close()
+
+    def read(self, size=-1):
+        """size bytes (-1: up to the end)"""
+        return bytes(self._fh.readBytes(size if size > 0 else 0)) if size else b''
+
+    def seek(self, offset):
+        """Move to offset from the start of the file"""
+        self._fh.seek(offset, 0)
+
+
+def open_read(path):
+    """Binary file object (read, seek, context manager) of path; raises OSError if it does not exist"""
+    if is_local(path):
+        calls['read'] += 1
+        return open(path, 'rb')  # pylint: disable=consider-using-with
+    return _VfsReader(path)
+
+
+def read(path, size=-1):
+    """Content of path (the first size bytes), None if the file does not exist"""
+    try:
+        with open_read(path) as fh:
+            return fh.read(size)
+    except FileNotFoundError:
+        return None
+
+
+def write(path, data):
+    """Replace the content of path with data (bytes), atomically for local paths"""
+    if not is_local(path):
+        with xbmcvfs.File(path, 'w') as fh:
+            if not fh.write(bytearray(data)):
+                raise IOError('write to {} failed'.format(path))
+        return
+    calls['write'] += 1
+    temp = '{}.{}-{}{}'.format(path, os.getpid(), threading.get_ident(), TEMP_SUFFIX)
+    try:
+        with open(temp, 'wb') as fh:
+            fh.write(data)
+        os.replace(temp, path)
+    except BaseException:
+        try:
+            os.remove(temp)
+        except OSError:
+            pass
+        raise
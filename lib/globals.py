@@ -1,13 +1,22 @@
 """Module to initializes global setting for the plugin"""
 
 from __future__ import absolute_import, division, unicode_literals
+import html
 import os
+import re
 import sys
 from urllib.parse import urlencode, urlsplit
 import dataclasses
 import xbmcaddon
 import xbmcvfs
 from .loggers import Logger
+from .stalker_cache import activate_portal
+from .utils import get_file_stamp
+
+# Kodi's user settings file in the add-on profile (version 2 format)
+SETTINGS_FILE = 'settings.xml'
+_SETTING_RE = re.compile(r'<setting\b([^>]*?)(?:/>|>(.*?)</setting>)', re.DOTALL)
+_SETTING_ID_RE = re.compile(r'\bid="([^"]*)"')
 
 
 @dataclasses.dataclass
@@ -33,10 +42,20 @@ class AddOnConfig:
     handle: str = None
     addon_data_path: str = None
     max_page_limit: int = 2
+    fetch_concurrency: int = 1      # parallel page requests per listing
+    request_pacing_ms: int = 100    # pause before each further page request
     max_retries: int = 3
     token_path: str = None
+    cache_path: str = None          # Stalker cache and folder filters of the active portal
     cache_enabled: bool = True
+    warm_cache: bool = True         # keep parsed caches in memory between calls
     stalker_cache_days: int = 1
+    cache_backend: int = 0          # 0=JSON files, 1=SQLite database
+    cache_codec: int = 0            # 0=JSON, 1=MessagePack (needs msgpack)
+    cache_compression: bool = False  # zlib-compressed video lists and TMDB cache
+    nav_trace: bool = False
+    perf_metrics: bool = False
+    profile_mode: int = 0        # 0=off, 1=cProfile, 2=tracemalloc, 3=both
 
 
 @dataclasses.dataclass
@@ -75,8 +94,13 @@ class GlobalVariables:
 
     def __init__(self):
         """Init class"""
-        self.__addon = xbmcaddon.Addon()
+        self.__addon = None
         self.__is_addd_on_first_run = None
+        self.__settings = {}
+        self.__settings_stamp = None
+        # Bumped whenever the settings were re-read; caches derived from
+        # settings (compiled patterns, clients) compare against it
+        self.settings_version = 0
         self.addon_config = AddOnConfig()
         self.portal_config = PortalConfig()
         self.tmdb_config = TmdbConfig()
@@ -87,9 +111,14 @@ class GlobalVariables:
         """Init global settings"""
         self.__is_addd_on_first_run = self.__is_addd_on_first_run is None
         self.addon_config.url = sys.argv[0]
+        self.addon_config.handle = int(sys.argv[1])
+        # A fresh Addon instance is only created when needed: getSetting of
+        # an old instance may return stale values after a settings change
+        self.__addon = None
 
         # Static addon info: only needs to be set once per process lifetime
         if self.__is_addd_on_first_run:
+            self.__addon = xbmcaddon.Addon()
             Logger.debug("First run, loading static addon info")
             self.addon_config.addon_id = self.__addon.getAddonInfo('id')
             self.addon_config.name = self.__addon.getAddonInfo('name')
@@ -99,82 +128,134 @@ class GlobalVariables:
                 xbmcvfs.mkdirs(token_path)
             self.addon_config.token_path = token_path
 
-        # Settings and handle must be refreshed on every call.
         # Kodi can reuse the same Python process across multiple navigations,
-        # so reading settings only once causes stale values after the user
-        # changes a setting without restarting Kodi.
-        self.__addon = xbmcaddon.Addon()
-        self.addon_config.handle = int(sys.argv[1])
+        # so settings must be re-read after the user changed them.  The user
+        # settings file is rewritten on every change: as long as it is
+        # unchanged the parsed config below is still valid.  Before the
+        # first settings change there is no file: (0, 0) stands for that.
+        stamp = get_file_stamp(os.path.join(self.addon_config.token_path, SETTINGS_FILE)) or (0, 0)
+        if stamp == self.__settings_stamp:
+            return
+        self.__settings_stamp = stamp
+        self.__settings = self.__read_settings_file() if stamp != (0, 0) else {}
+        self.settings_version += 1
+        Logger.debug('Settings loaded ({} values from {})', len(self.__settings), SETTINGS_FILE)
 
         # Init loading/cache settings
         # page_size: 1 = ~20 items, 2 = ~40 items (default), 5 = ~100 items, 9999 = all
         try:
-            page_size = int(self.__addon.getSetting('page_size') or '2')
+            page_size = int(self.__get_setting('page_size') or '2')
             self.addon_config.max_page_limit = page_size if page_size > 0 else 2
         except (ValueError, TypeError):
             self.addon_config.max_page_limit = 2
+        # Page fetching: set by the "measure portal" probe, defaults = old behaviour
+        try:
+            self.addon_config.fetch_concurrency = max(1, int(self.__get_setting('fetch_concurrency') or '1'))
+        except (ValueError, TypeError):
+            self.addon_config.fetch_concurrency = 1
+        try:
+            self.addon_config.request_pacing_ms = max(0, int(self.__get_setting('request_pacing_ms') or '100'))
+        except (ValueError, TypeError):
+            self.addon_config.request_pacing_ms = 100
         # cache_enabled defaults to true; only false when explicitly set to 'false'
-        self.addon_config.cache_enabled = self.__addon.getSetting('cache_enabled') != 'false'
+        self.addon_config.cache_enabled = self.__get_setting('cache_enabled') != 'false'
+        self.addon_config.warm_cache = self.__get_setting('warm_cache') != 'false'
         # stalker_cache_days: 0 = never delete, default 30 (1 month)
         # Old options (1, 3, 7 days) are migrated to the new default (30 days).
         try:
-            stalker_days = int(self.__addon.getSetting('stalker_cache_days') or '30')
+            stalker_days = int(self.__get_setting('stalker_cache_days') or '30')
             if stalker_days > 0 and stalker_days < 30:
                 stalker_days = 30
             self.addon_config.stalker_cache_days = stalker_days if stalker_days >= 0 else 30
         except (ValueError, TypeError):
             self.addon_config.stalker_cache_days = 30
+        self.addon_config.cache_backend = 1 if self.__get_setting('cache_backend') == '1' else 0
+        self.addon_config.cache_codec = 1 if self.__get_setting('cache_codec') == '1' else 0
+        self.addon_config.cache_compression = self.__get_setting('cache_compression') == 'true'
+        # Diagnostics: opt-in navigation trace (nav_trace.jsonl in the profile folder)
+        self.addon_config.nav_trace = self.__get_setting('nav_trace') == 'true'
+        # Diagnostics: opt-in per-action timing (metrics.jsonl in the profile folder)
+        self.addon_config.perf_metrics = self.__get_setting('perf_metrics') == 'true'
+        try:
+            self.addon_config.profile_mode = int(self.__get_setting('profile_mode') or '0')
+        except (ValueError, TypeError):
+            self.addon_config.profile_mode = 0
 
         # Init Portal settings
-        self.portal_config.mac_cookie = 'mac=' + self.__addon.getSetting('mac_address')
-        self.portal_config.device_id = self.__addon.getSetting('device_id')
-        self.portal_config.device_id_2 = self.__addon.getSetting('device_id_2')
-        self.portal_config.signature = self.__addon.getSetting('signature')
-        self.portal_config.serial_number = self.__addon.getSetting('serial_number')
-        self.portal_config.alternative_context_path = self.__addon.getSetting('alternative_context_path') == 'true'
+        self.portal_config.mac_cookie = 'mac=' + self.__get_setting('mac_address')
+        self.portal_config.device_id = self.__get_setting('device_id')
+        self.portal_config.device_id_2 = self.__get_setting('device_id_2')
+        self.portal_config.signature = self.__get_setting('signature')
+        self.portal_config.serial_number = self.__get_setting('serial_number')
+        self.portal_config.alternative_context_path = self.__get_setting('alternative_context_path') == 'true'
         self.__set_portal_addresses()
+        self.__set_cache_path()
 
         # Init TMDB settings
-        self.tmdb_config.enabled = self.__addon.getSetting('tmdb_enabled') == 'true'
-        self.tmdb_config.api_key = self.__addon.getSetting('tmdb_api_key')
-        self.tmdb_config.language = self.__addon.getSetting('tmdb_language') or 'de-DE'
+        self.tmdb_config.enabled = self.__get_setting('tmdb_enabled') == 'true'
+        self.tmdb_config.api_key = self.__get_setting('tmdb_api_key')
+        self.tmdb_config.language = self.__get_setting('tmdb_language') or 'de-DE'
         try:
-            cache_days = int(self.__addon.getSetting('tmdb_cache_days') or '30')
+            cache_days = int(self.__get_setting('tmdb_cache_days') or '30')
             # 0 = never delete (spinner option); negative values → clamp to 1
             self.tmdb_config.cache_days = cache_days if cache_days >= 0 else 1
         except (ValueError, TypeError):
             self.tmdb_config.cache_days = 30
         # load_mode: 0=always load (live), 1=cache only, 2=off in listings
         try:
-            self.tmdb_config.load_mode = int(self.__addon.getSetting('tmdb_load_mode') or '0')
+            self.tmdb_config.load_mode = int(self.__get_setting('tmdb_load_mode') or '0')
         except (ValueError, TypeError):
             self.tmdb_config.load_mode = 0
-        self.tmdb_config.enrich_series = self.__addon.getSetting('tmdb_enrich_series') == 'true'
+        self.tmdb_config.enrich_series = self.__get_setting('tmdb_enrich_series') == 'true'
         # Default true: only false when explicitly set to 'false'
-        self.tmdb_config.use_poster  = self.__addon.getSetting('tmdb_use_poster')  != 'false'
-        self.tmdb_config.use_fanart  = self.__addon.getSetting('tmdb_use_fanart')  != 'false'
-        self.tmdb_config.use_plot    = self.__addon.getSetting('tmdb_use_plot')    != 'false'
-        self.tmdb_config.use_rating  = self.__addon.getSetting('tmdb_use_rating')  != 'false'
-        self.tmdb_config.use_genres  = self.__addon.getSetting('tmdb_use_genres')  != 'false'
+        self.tmdb_config.use_poster  = self.__get_setting('tmdb_use_poster')  != 'false'
+        self.tmdb_config.use_fanart  = self.__get_setting('tmdb_use_fanart')  != 'false'
+        self.tmdb_config.use_plot    = self.__get_setting('tmdb_use_plot')    != 'false'
+        self.tmdb_config.use_rating  = self.__get_setting('tmdb_use_rating')  != 'false'
+        self.tmdb_config.use_genres  = self.__get_setting('tmdb_use_genres')  != 'false'
 
         # Init Folder Filter settings
         # folder_filter_mode: 0=show all, 1=keyword filter, 2=manual selection
         try:
-            filter_mode = int(self.__addon.getSetting('folder_filter_mode') or '0')
+            filter_mode = int(self.__get_setting('folder_filter_mode') or '0')
         except (ValueError, TypeError):
             filter_mode = 0
         self.filter_config.use_keywords = (filter_mode == 1)
         self.filter_config.use_manual = (filter_mode == 2)
-        kw_raw = self.__addon.getSetting('folder_filter_keywords') or ''
+        kw_raw = self.__get_setting('folder_filter_keywords') or ''
         self.filter_config.keywords = [k.strip().lower() for k in kw_raw.split(',') if k.strip()]
 
         # Display settings – language tag removal
-        self.display_config.remove_lang_tags = self.__addon.getSetting('remove_lang_tags') != 'false'
-        lang_kw_raw = self.__addon.getSetting('remove_lang_keywords')
+        self.display_config.remove_lang_tags = self.__get_setting('remove_lang_tags') != 'false'
+        lang_kw_raw = self.__get_setting('remove_lang_keywords')
         if not lang_kw_raw:
             lang_kw_raw = 'de, en, nl, fr, it, es, pl, tr, ru, pt, ar, multi, deutsch, german'
         self.display_config.lang_tag_keywords = [k.strip().lower() for k in lang_kw_raw.split(',') if k.strip()]
 
+    def __read_settings_file(self):
+        """All values of the user settings file in one read ({} if unreadable)"""
+        try:
+            with open(os.path.join(self.addon_config.token_path, SETTINGS_FILE), 'r', encoding='utf-8') as fh:
+                content = fh.read()
+        except (OSError, UnicodeDecodeError) as exc:
+            Logger.warn('Settings file not readable, using getSetting: {}'.format(exc))
+            return {}
+        values = {}
+        for match in _SETTING_RE.finditer(content):
+            setting_id = _SETTING_ID_RE.search(match.group(1))
+            if setting_id:
+                values[setting_id.group(1)] = html.unescape(match.group(2) or '')
+        return values
+
+    def __get_setting(self, key):
+        """Value from the settings file; Kodi's getSetting for ids it does not contain"""
+        value = self.__settings.get(key)
+        if value is None:
+            if self.__addon is None:
+                self.__addon = xbmcaddon.Addon()
+            value = self.__addon.getSetting(key)
+        return value
+
     def get_handle(self):
         """Get addon handle"""
         return self.addon_config.handle
@@ -185,7 +266,7 @@ class GlobalVariables:
 
     def get_filter_file_path(self, cat_type):
         """Get path for folder filter selection file (cat_type: vod, series, tv)"""
-        return os.path.join(self.addon_config.token_path, 'folder_filter_{}.json'.format(cat_type))
+        return os.path.join(self.addon_config.cache_path, 'folder_filter_{}.json'.format(cat_type))
 
     def get_plugin_url(self, params):
         """Get plugin url"""
@@ -198,10 +279,23 @@ class GlobalVariables:
 
     def __set_portal_addresses(self):
         """Set portal urls"""
-        self.portal_config.server_address = self.__addon.getSetting('server_address')
+        self.portal_config.server_address = self.__get_setting('server_address')
         self.portal_config.portal_base_url = self.__get_portal_base_url()
         self.portal_config.portal_url = self.get_portal_url()
 
+    def __set_cache_path(self):
+        """Cache folder of the configured portal (stalker_cache.activate_portal)"""
+        profile = self.addon_config.token_path
+        server = self.__get_setting('server_address')
+        mac = self.__get_setting('mac_address')
+        self.addon_config.cache_path = profile
+        if not server or not mac:
+            return  # not configured yet
+        try:
+            self.addon_config.cache_path = activate_portal(profile, server, mac)[0]
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('Portal cache folder not available, using the profile folder: {}'.format(exc))
+
     def get_portal_url(self):
         """Get portal url"""
         context_path = '/portal.php' if self.portal_config.alternative_context_path else '/server/load.php'
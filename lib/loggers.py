@@ -3,32 +3,57 @@ from __future__ import absolute_import, division, unicode_literals
 import xbmc
 import xbmcaddon
 
-__addon__ = xbmcaddon.Addon()
+# Add-on identity never changes within a process: look it up once
+_ADDON_ID = xbmcaddon.Addon().getAddonInfo('id')
+# Kodi only writes LOGDEBUG lines with debug logging on; None = not yet checked
+_debug_enabled = None
 
 
 class Logger:
-    """Logger class"""
+    """Logger class
+
+    Messages may be passed as a format string plus arguments,
+    ``Logger.debug('List VOD {}', params)``; debug messages are then only
+    formatted when Kodi debug logging is enabled.
+    """
+    @staticmethod
+    def refresh():
+        """Re-check whether Kodi debug logging is on (once per plugin call)"""
+        global _debug_enabled
+        _debug_enabled = xbmc.getCondVisibility('System.GetBool(debug.showloginfo)')
+
+    @staticmethod
+    def debug_enabled():
+        """True if debug messages end up in the Kodi log"""
+        if _debug_enabled is None:
+            Logger.refresh()
+        return _debug_enabled
+
     @staticmethod
-    def log(message, level=xbmc.LOGDEBUG):
+    def log(message, *args, level=xbmc.LOGDEBUG):
         """Generic log method defaults to debug"""
-        xbmc.log('{0}: {1}'.format(__addon__.getAddonInfo('id'), message), level)
+        if args:
+            message = message.format(*args)
+        xbmc.log('{0}: {1}'.format(_ADDON_ID, message), level)
 
     @staticmethod
-    def info(message):
+    def info(message, *args):
         """Info log method"""
-        Logger.log(message, xbmc.LOGINFO)
+        Logger.log(message, *args, level=xbmc.LOGINFO)
 
     @staticmethod
-    def error(message):
+    def error(message, *args):
         """Error log method"""
-        Logger.log(message, xbmc.LOGERROR)
+        Logger.log(message, *args, level=xbmc.LOGERROR)
 
     @staticmethod
-    def warn(message):
+    def warn(message, *args):
         """Warn log method"""
-        Logger.log(message, xbmc.LOGWARNING)
+        Logger.log(message, *args, level=xbmc.LOGWARNING)
 
     @staticmethod
-    def debug(message):
-        """Debug log method"""
-        Logger.log(message, xbmc.LOGDEBUG)
+    def debug(message, *args):
+        """Debug log method; skipped entirely when Kodi debug logging is off"""
+        if not Logger.debug_enabled():
+            return
+        Logger.log(message, *args, level=xbmc.LOGDEBUG)
@@ -0,0 +1,179 @@
+"""
+Lightweight timing spans for plugin invocations.
+
+run() opens one invocation per routed action; the code paths mark their
+phases with ``span('portal')`` or the ``@timed('cache')`` decorator.  Phase
+times are exclusive: a cache read inside a listing counts as ``cache``, not
+as ``listitems``; whatever is not covered by a span is reported as
+``other``.  Spans outside an invocation (service, worker threads) are
+no-ops.
+
+With the diagnostics setting perf_metrics (off by default) one JSON line
+per invocation is appended to metrics.jsonl in the profile folder:  {"ts": ..., "route": "vod_listing", "ms": 812.4,
+          "phases": {"portal": 640.1, "cache": 12.0, "listitems": 150.2, "other": 10.1}}
+The file is cut back to the newest entries when it grows too large.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import functools
+import json
+import math
+import os
+import threading
+import time
+
+from . import fileio
+from .loggers import Logger
+
+METRICS_FILE = 'metrics.jsonl'
+_MAX_BYTES = 512 * 1024
+_KEEP_LINES = 1000
+
+# Phases shown in the statistics dialog, in this order
+PHASES = ('portal', 'tmdb', 'cache', 'listitems', 'other')
+
+_current = None
+
+
+class _Invocation:
+    """Span bookkeeping of one routed action"""
+    __slots__ = ('route', 'thread', 'started', 'wall_start', 'stack', 'phases', 'covered')
+
+    def __init__(self, route):
+        self.route = route
+        self.thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.wall_start = time.time()
+        self.stack = []
+        self.phases = {}
+        self.covered = 0.0
+
+
+class _Span:
+    """Context manager measuring one phase (exclusive of nested spans)"""
+    __slots__ = ('name', 'start', 'children', 'invocation')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = 0.0
+        self.children = 0.0
+        self.invocation = None
+
+    def __enter__(self):
+        invocation = _current
+        if invocation is not None and invocation.thread == threading.get_ident():
+            self.invocation = invocation
+            self.children = 0.0
+            invocation.stack.append(self)
+            self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        invocation = self.invocation
+        if invocation is None:
+            return False
+        elapsed = time.perf_counter() - self.start
+        self.invocation = None
+        invocation.stack.pop()
+        invocation.phases[self.name] = invocation.phases.get(self.name, 0.0) + elapsed - self.children
+        if invocation.stack:
+            invocation.stack[-1].children += elapsed
+        else:
+            invocation.covered += elapsed
+        return False
+
+
+def span(name):
+    """Measure a block as phase ``name``: ``with span('portal'): ...``"""
+    return _Span(name)
+
+
+def timed(name):
+    """Decorator: measure every call of the function as phase ``name``"""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def begin(route):
+    """Start measuring a routed action"""
+    global _current
+    _current = _Invocation(route)
+
+
+def end(profile_dir=None):
+    """Finish the current invocation; append it to metrics.jsonl if profile_dir is given.
+
+    Returns the total duration in milliseconds.
+    """
+    global _current
+    invocation = _current
+    _current = None
+    if invocation is None:
+        return 0.0
+    total = time.perf_counter() - invocation.started
+    if profile_dir:
+        phases = {name: round(secs * 1000.0, 1) for name, secs in invocation.phases.items()}
+        phases['other'] = round(max(0.0, total - invocation.covered) * 1000.0, 1)
+        _append(profile_dir, {'ts': round(invocation.wall_start, 3), 'route': invocation.route,
+                              'ms': round(total * 1000.0, 1), 'phases': phases})
+    return total * 1000.0
+
+
+def _append(profile_dir, record):
+    """Append one record, keeping the file below _MAX_BYTES.
+
+    The cut-back file replaces the old one atomically (fileio.write); the
+    append itself is a single O_APPEND write of one line.
+    """
+    path = os.path.join(profile_dir, METRICS_FILE)
+    try:
+        if os.path.exists(path) and os.path.getsize(path) > _MAX_BYTES:
+            lines = (fileio.read(path) or b'').splitlines(True)[-_KEEP_LINES:]
+            fileio.write(path, b''.join(lines))
+        with open(path, 'a', encoding='utf-8') as fh:
+            fh.write(json.dumps(record) + '\n')
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('Metrics write failed: {}'.format(exc))
+
+
+def load(profile_dir):
+    """Return all records of metrics.jsonl (oldest first)"""
+    path = os.path.join(profile_dir, METRICS_FILE)
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path, 'r', encoding='utf-8') as fh:
+        for line in fh:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def _percentile(sorted_values, pct):
+    """Nearest-rank percentile"""
+    rank = max(0, math.ceil(pct / 100.0 * len(sorted_values)) - 1)
+    return sorted_values[min(len(sorted_values) - 1, rank)]
+
+
+def summarize(records):
+    """Per route: count, p50/p95 total ms and the average ms per phase"""
+    by_route = {}
+    for record in records:
+        by_route.setdefault(record.get('route', '?'), []).append(record)
+    summary = {}
+    for route, rows in by_route.items():
+        times = sorted(r.get('ms', 0.0) for r in rows)
+        phases = {}
+        for row in rows:
+            for name, value in row.get('phases', {}).items():
+                phases[name] = phases.get(name, 0.0) + value
+        summary[route] = {'count': len(rows), 'p50': _percentile(times, 50), 'p95': _percentile(times, 95),
+                          'phases': {name: value / len(rows) for name, value in phases.items()}}
+    return summary
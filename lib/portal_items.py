@@ -0,0 +1,232 @@
+"""
+Compact storage form of portal VOD/series items.
+
+get_ordered_list returns some 60 fields per item; the add-on reads 15 of
+them (listings, filters, search, playback).  The Stalker cache stores each
+item as an array of those FIELDS in fixed order instead of the portal dict:
+
+  ["100015", "Title", 1, 0, "/stalker_portal/screenshots/15.jpg", [[1, 24]], "ffmpeg ...",
+   "95", 3, 7, "Plot ...", "A, B", 2, "2024-03-16 12:00:00", "2019"]
+
+- fields the portal did not send are null as well; a record with such
+  fields ends with a bitmask of their positions, so unpack() leaves them
+  out again while a null sent by the portal reads back as None
+- episode lists ("series") are stored as [first, last] ranges
+- values of INTERNED fields (country, director ...) repeat across a list:
+  they are stored once in a string table and referenced by position
+
+description and actors are long but stay: the listings show them as plot
+and cast.  The portal's genre fields (genres_str ...) are not kept at all:
+listings and the genre filter take genres from TMDB.
+
+pack_list()/unpack_list() convert a whole list; the table is written next
+to the records (stalker_cache: second line of the file).  unpack() passes
+dicts through unchanged, so lists cached by older versions still read.
+
+Unpacked items are PortalItem records (__slots__: under half the size of
+the dict) that are built once per loaded list and kept in the in-memory
+cache.  Next to the fields they hold what every listing needs:
+year_no and minutes as int, and title (language tags removed) and poster
+(absolute screenshot URL), which follow set_context().  They read like the
+portal dict as well, so code that also handles portal responses works
+with both; as_item() turns such a dict into a record.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+FIELDS = ('id', 'name', 'hd', 'fav', 'screenshot_uri', 'series', 'cmd', 'time', 'country', 'director',
+          'description', 'actors', 'last_played', 'added', 'year')
+INTERNED = frozenset(('country', 'director', 'last_played'))
+_SERIES = FIELDS.index('series')
+_INTERNED_POS = tuple(pos for pos, field in enumerate(FIELDS) if field in INTERNED)
+_FIELD_SET = frozenset(FIELDS)
+_BITS = tuple(1 << pos for pos in range(len(FIELDS)))
+# Fields a record was built without; shared by all records of a mask
+_NO_FIELDS = frozenset()
+_unset_of_mask = {0: _NO_FIELDS}
+# Lookup result of a field that is not set (a portal null is None)
+_UNSET = object()
+
+# (settings version, title cleaner, portal base URL) that title and poster are derived with
+_context = (None, None, '')
+
+
+def set_context(version, clean_title, base_url):
+    """Title cleaner and portal base URL for PortalItem.title / .poster (set on every plugin call)"""
+    global _context
+    context = (version, clean_title, base_url or '')
+    if context != _context:
+        _context = context  # records derive title and poster again on next access
+
+
+def _unset_fields(mask):
+    """Field names of a bitmask of unset positions"""
+    fields = _unset_of_mask.get(mask)
+    if fields is None:
+        fields = _unset_of_mask[mask] = frozenset(field for field, bit in zip(FIELDS, _BITS) if mask & bit)
+    return fields
+
+
+def _int(value):
+    """get_int_value() for one value: 0 unless numeric"""
+    if value is None:
+        return 0
+    value = str(value)
+    return int(value) if value.isnumeric() else 0
+
+
+class PortalItem:
+    """One video or series of a cached list.
+
+    Fields the portal did not send are None as attributes; item access
+    (item['x'], get, in) tells them from a null of the portal like the
+    portal dict does.
+    """
+    __slots__ = FIELDS + ('year_no', 'minutes', '_unset', '_context', '_title', '_poster')
+
+    # pylint: disable=redefined-builtin,too-many-arguments,too-many-instance-attributes
+    def __init__(self, id, name, hd, fav, screenshot_uri, series, cmd, time, country, director, description,
+                 actors, last_played, added, year, unset=_NO_FIELDS):
+        self.id = id
+        self.name = name
+        self.hd = hd
+        self.fav = fav
+        self.screenshot_uri = screenshot_uri
+        self.series = series
+        self.cmd = cmd
+        self.time = time
+        self.country = country
+        self.director = director
+        self.description = description
+        self.actors = actors
+        self.last_played = last_played
+        self.added = added
+        self.year = year
+        self.year_no = _int(year)
+        self.minutes = _int(time)
+        self._unset = unset
+        self._context = None
+        self._title = None
+        self._poster = None
+
+    @property
+    def title(self):
+        """Name without language tags"""
+        if self._context is not _context:
+            self._derive()
+        return self._title
+
+    @property
+    def poster(self):
+        """Absolute screenshot URL, None without a screenshot"""
+        if self._context is not _context:
+            self._derive()
+        return self._poster
+
+    def _derive(self):
+        _, clean_title, base_url = self._context = _context
+        self._title = clean_title(self.name) if clean_title else self.name
+        uri = self.screenshot_uri
+        if isinstance(uri, str):
+            self._poster = uri if uri.startswith('http') else base_url + uri
+        else:
+            self._poster = None
+
+    # Read access like the portal dict
+    def _lookup(self, key):
+        if key not in _FIELD_SET or key in self._unset:
+            return _UNSET
+        return getattr(self, key)
+
+    def __getitem__(self, key):
+        value = self._lookup(key)
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        return self._lookup(key) is not _UNSET
+
+    def get(self, key, default=None):
+        """dict.get()"""
+        value = self._lookup(key)
+        return default if value is _UNSET else value
+
+    def to_dict(self):
+        """Portal-shaped dict of the fields that are set"""
+        return {field: getattr(self, field) for field in FIELDS if field not in self._unset}
+
+
+def _missing(video):
+    """Fields a portal dict does not have"""
+    return _FIELD_SET.difference(video) or _NO_FIELDS
+
+
+def as_item(video):
+    """PortalItem of a portal dict (records are returned as they are)"""
+    if isinstance(video, PortalItem):
+        return video
+    return PortalItem(*[video.get(field) for field in FIELDS], unset=_missing(video))
+
+
+def episode_ranges(episodes):
+    """[1, 2, 3, 5] -> [[1, 3], [5, 5]]; lists that are not all integers are kept as they are"""
+    if not episodes or not all(isinstance(num, int) and not isinstance(num, bool) for num in episodes):
+        return episodes
+    ranges = []
+    for num in episodes:
+        if ranges and num == ranges[-1][1] + 1:
+            ranges[-1][1] = num
+        else:
+            ranges.append([num, num])
+    return ranges
+
+
+def expand_ranges(value):
+    """Inverse of episode_ranges()"""
+    if not isinstance(value, list) or not value or not isinstance(value[0], list):
+        return value
+    return [num for first, last in value for num in range(first, last + 1)]
+
+
+def pack(item, strings=None):
+    """One portal item as a FIELDS array; strings ({value: position}) collects the interned values"""
+    record = [item.get(field) for field in FIELDS]
+    unset = item._unset if isinstance(item, PortalItem) else _missing(item)  # pylint: disable=protected-access
+    if unset:
+        record.append(sum(bit for field, bit in zip(FIELDS, _BITS) if field in unset))
+    if isinstance(record[_SERIES], list):
+        record[_SERIES] = episode_ranges(record[_SERIES])
+    if strings is not None:
+        for pos in _INTERNED_POS:
+            value = record[pos]
+            if value is not None and not isinstance(value, (list, dict)):
+                record[pos] = strings.setdefault(value, len(strings))
+    return record
+
+
+def unpack(record, table=()):
+    """PortalItem of a packed record (dicts of older versions are returned as they are).
+
+    The record list itself is reused: pass freshly parsed records only.
+    """
+    if isinstance(record, dict):
+        return record
+    unset = _unset_fields(record.pop()) if len(record) > len(FIELDS) else _NO_FIELDS
+    if table:
+        for pos in _INTERNED_POS:
+            if isinstance(record[pos], int):
+                record[pos] = table[record[pos]]
+    record[_SERIES] = expand_ranges(record[_SERIES])
+    return PortalItem(*record, unset=unset)
+
+
+def pack_list(items):
+    """(records, string table) of a list of portal items"""
+    strings = {}
+    records = [pack(item, strings) for item in items]
+    return records, list(strings)
+
+
+def unpack_list(records, table=()):
+    """PortalItems of packed records"""
+    return [unpack(record, table) for record in records]
@@ -0,0 +1,164 @@
+"""
+Portal speed probe ("Portal-Geschwindigkeit messen").
+
+Times the handshake, get_categories and get_ordered_list of the configured
+portal, reads its real max_page_items and fetches a batch of pages at
+concurrency 1, 2, 4 and 8 until the portal starts failing.  From that it
+recommends page_size (max_page_limit), fetch_concurrency and
+request_pacing_ms, which the user can apply with one click.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import math
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import xbmcaddon
+import xbmcgui
+
+from .api import Api
+from .auth import Auth
+from .loggers import Logger
+
+CONCURRENCY_LEVELS = (1, 2, 4, 8)
+PAGES_PER_LEVEL = 8
+# Higher concurrency must beat the previous level by this factor to be worth it
+MIN_SPEEDUP = 1.15
+# page_size options of the settings list with the longest acceptable full load (s)
+PAGE_SIZE_BUDGET = ((9999, 8.0), (5, 2.0), (2, 1.0))
+
+
+def _timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def _fetch_batch(params, pages, concurrency):
+    """Fetch pages concurrently; returns (seconds, ok_pages, errors)"""
+    def fetch(page_no):
+        try:
+            return bool(Api.get_page(params, page_no).get('data'))
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('Portal probe page {} failed: {}', page_no, exc)
+            return False
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(fetch, pages))
+    return time.perf_counter() - start, sum(results), results.count(False)
+
+
+def measure(progress=None):
+    """Run the probe; returns a result dict (see recommend())"""
+    result = {'levels': []}
+
+    def step(pct, text):
+        if progress:
+            progress.update(pct, text)
+            return not progress.iscanceled()
+        return True
+
+    step(5, 'Anmeldung (Handshake)...')
+    auth = Auth()
+    auth.clear_cache()
+    result['handshake_s'], _ = _timed(auth.get_token, False)
+
+    step(15, 'Kategorien laden...')
+    result['categories_s'], categories = _timed(Api.get_vod_categories)
+    categories = [c for c in categories or [] if str(c.get('id')) != '*']
+    if not categories:
+        return result
+
+    # Largest category of the first few gives the most pages to test with
+    params = None
+    first_page = None
+    for category in categories[:5]:
+        if not step(25, 'Seitengröße ermitteln: {}'.format(category.get('title', ''))):
+            return result
+        candidate = {'type': 'vod', 'action': 'get_ordered_list', 'category': category['id'],
+                     'sortby': 'added', 'fav': 0}
+        seconds, page = _timed(Api.get_page, candidate, 1)
+        if first_page is None or int(page['total_items']) > int(first_page['total_items']):
+            params, first_page, result['ordered_list_s'] = candidate, page, seconds
+    result['max_page_items'] = int(first_page['max_page_items'])
+    result['total_items'] = int(first_page['total_items'])
+    total_pages = int(math.ceil(float(result['total_items']) / max(1, result['max_page_items'])))
+    pages = list(range(2, min(total_pages, PAGES_PER_LEVEL + 1) + 1)) or [1]
+
+    for idx, concurrency in enumerate(CONCURRENCY_LEVELS):
+        if not step(35 + idx * 15, 'Parallele Anfragen: {}'.format(concurrency)):
+            break
+        seconds, ok_pages, errors = _fetch_batch(params, pages, concurrency)
+        result['levels'].append({'concurrency': concurrency, 'seconds': seconds,
+                                 'pages_per_s': ok_pages / seconds if seconds > 0 else 0.0, 'errors': errors})
+        if errors:
+            break  # the portal starts failing: no need to push further
+    return result
+
+
+def recommend(result):
+    """Derive page_size, fetch_concurrency and request_pacing_ms from a probe result"""
+    levels = [lvl for lvl in result.get('levels', []) if not lvl['errors']]
+    failed = any(lvl['errors'] for lvl in result.get('levels', []))
+    if not levels:
+        # Even sequential requests fail: slow down, one at a time
+        return {'page_size': 1, 'fetch_concurrency': 1, 'request_pacing_ms': 300}
+    best = levels[0]
+    for level in levels[1:]:
+        if level['pages_per_s'] >= best['pages_per_s'] * MIN_SPEEDUP:
+            best = level
+    pages_per_s = max(best['pages_per_s'], 0.01)
+    total_pages = math.ceil(result.get('total_items', 0) / float(max(1, result.get('max_page_items', 1))))
+    page_size = 1
+    for option, budget in PAGE_SIZE_BUDGET:
+        if min(option, max(total_pages, 1)) / pages_per_s <= budget:
+            page_size = option
+            break
+    # Staying below the failing level is the main protection; keep a small
+    # pause as margin for portals that limit the request rate as well
+    return {'page_size': page_size, 'fetch_concurrency': best['concurrency'],
+            'request_pacing_ms': 50 if failed else 0}
+
+
+def report(result, advice):
+    """Dialog text"""
+    lines = ['Handshake: {:.0f} ms'.format(result.get('handshake_s', 0) * 1000.0),
+             'Kategorien: {:.0f} ms'.format(result.get('categories_s', 0) * 1000.0)]
+    if 'max_page_items' in result:
+        lines.append('Seite laden: {:.0f} ms ({} Einträge pro Seite, größte Kategorie {} Einträge)'.format(
+            result.get('ordered_list_s', 0) * 1000.0, result['max_page_items'], result['total_items']))
+    for level in result.get('levels', []):
+        lines.append('{} parallel: {:.1f} Seiten/s{}'.format(
+            level['concurrency'], level['pages_per_s'],
+            ', {} Fehler'.format(level['errors']) if level['errors'] else ''))
+    lines.append('')
+    lines.append('Empfehlung:')
+    lines.append('  Seiten pro Aufruf: {}'.format('alle' if advice['page_size'] == 9999 else advice['page_size']))
+    lines.append('  Parallele Anfragen: {}'.format(advice['fetch_concurrency']))
+    lines.append('  Pause zwischen Anfragen: {} ms'.format(advice['request_pacing_ms']))
+    return '\n'.join(lines)
+
+
+def run_probe():
+    """Settings action: measure, show the result and apply it on request"""
+    progress = xbmcgui.DialogProgress()
+    progress.create('Portal-Geschwindigkeit', 'Messung läuft...')
+    try:
+        result = measure(progress)
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.error('Portal probe failed: {}', exc)
+        progress.close()
+        xbmcgui.Dialog().ok('Portal-Geschwindigkeit', 'Messung fehlgeschlagen:[CR]{}'.format(exc))
+        return
+    progress.close()
+    if not result.get('levels'):
+        xbmcgui.Dialog().ok('Portal-Geschwindigkeit', 'Messung abgebrochen oder keine Kategorien gefunden.')
+        return
+    advice = recommend(result)
+    xbmcgui.Dialog().textviewer('Portal-Geschwindigkeit', report(result, advice))
+    if xbmcgui.Dialog().yesno('Portal-Geschwindigkeit', 'Empfohlene Einstellungen übernehmen?'):
+        addon = xbmcaddon.Addon()
+        addon.setSetting('page_size', str(advice['page_size']))
+        addon.setSetting('fetch_concurrency', str(advice['fetch_concurrency']))
+        addon.setSetting('request_pacing_ms', str(advice['request_pacing_ms']))
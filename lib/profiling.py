@@ -0,0 +1,115 @@
+"""
+Opt-in CPU (cProfile) and memory (tracemalloc) capture per plugin call.
+
+Enabled by the expert setting "Profiling" (profile_mode: 0 off, 1 CPU,
+2 memory, 3 both) or for a single call by adding ``_profile=cpu|mem|all``
+to the plugin URL, e.g.
+  RunPlugin(plugin://plugin.video.stalkervod.tmdb/?action=vod&_profile=all)
+
+Every captured call writes to <profile>/profiles/:
+  <time>_<route>.prof  cProfile data (snakeviz, pstats, gprof2dot ...)
+  <time>_<route>.txt   top functions by cumulative time and top allocations
+The folder is kept below MAX_FILES files and MAX_BYTES bytes (oldest first),
+so it can be zipped and sent as is.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import io
+import os
+import re
+import time
+
+from .loggers import Logger
+
+PROFILE_DIR = 'profiles'
+MAX_FILES = 20
+MAX_BYTES = 20 * 1024 * 1024
+URL_FLAG = '_profile'
+_MODES = {'cpu': (True, False), 'mem': (False, True), 'all': (True, True)}
+_SETTING_MODES = {1: 'cpu', 2: 'mem', 3: 'all'}
+_FLAG_RE = re.compile(r'(^|&)' + URL_FLAG + r'=([^&]*)')
+
+
+def split_flag(query):
+    """Remove _profile=... from a plugin query string; returns (query, flag or None)"""
+    match = _FLAG_RE.search(query)
+    if not match:
+        return query, None
+    stripped = (query[:match.start()] + query[match.end():]).lstrip('&')
+    return stripped, match.group(2)
+
+
+def resolve_mode(flag, setting_mode):
+    """'cpu' / 'mem' / 'all' or None; the URL flag wins over the setting"""
+    if flag in _MODES:
+        return flag
+    return _SETTING_MODES.get(setting_mode)
+
+
+def run_profiled(mode, profile_dir, route, func, *args):
+    """Call func(*args), capturing a CPU profile and/or allocations if mode is set"""
+    if not mode or not profile_dir:
+        return func(*args)
+    # pylint: disable=import-outside-toplevel
+    import cProfile
+    import tracemalloc
+    cpu, mem = _MODES[mode]
+    profiler = cProfile.Profile() if cpu else None
+    if mem:
+        tracemalloc.start(15)
+    started = time.time()
+    if profiler:
+        profiler.enable()
+    try:
+        return func(*args)
+    finally:
+        if profiler:
+            profiler.disable()
+        snapshot = peak = None
+        if mem:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        _write(profile_dir, route, started, time.time() - started, profiler, snapshot, peak)
+
+
+def _write(profile_dir, route, started, seconds, profiler, snapshot, peak):
+    """Write .prof/.txt and apply the retention policy"""
+    import pstats  # pylint: disable=import-outside-toplevel
+    out_dir = os.path.join(profile_dir, PROFILE_DIR)
+    base = os.path.join(out_dir, '{}_{}'.format(time.strftime('%Y%m%d-%H%M%S', time.localtime(started)),
+                                                re.sub(r'[^\w-]', '_', route)))
+    try:
+        os.makedirs(out_dir, exist_ok=True)
+        report = io.StringIO()
+        report.write('Route: {}\nDauer: {:.1f} ms\n'.format(route, seconds * 1000.0))
+        if profiler:
+            profiler.dump_stats(base + '.prof')
+            report.write('\n=== CPU: top 40 nach kumulierter Zeit ===\n')
+            pstats.Stats(profiler, stream=report).sort_stats('cumulative').print_stats(40)
+        if snapshot:
+            report.write('\n=== Speicher: Spitze {:.1f} MB, top 30 Allokationen ===\n'.format(peak / (1024.0 * 1024.0)))
+            for stat in snapshot.statistics('lineno')[:30]:
+                report.write('{}\n'.format(stat))
+        with open(base + '.txt', 'w', encoding='utf-8') as fh:
+            fh.write(report.getvalue())
+        Logger.info('Profil geschrieben: {}.*'.format(base))
+        _enforce_retention(out_dir)
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('Profile write failed: {}'.format(exc))
+
+
+def _enforce_retention(out_dir):
+    """Delete the oldest files until MAX_FILES / MAX_BYTES hold"""
+    files = []
+    for name in os.listdir(out_dir):
+        path = os.path.join(out_dir, name)
+        if os.path.isfile(path):
+            stat = os.stat(path)
+            files.append((stat.st_mtime, stat.st_size, path))
+    files.sort(reverse=True)
+    total = 0
+    for index, (_, size, path) in enumerate(files):
+        total += size
+        if index >= MAX_FILES or total > MAX_BYTES:
+            os.remove(path)
@@ -0,0 +1,226 @@
+"""
+Outbound request accounting per user action.
+
+Portal and TMDB requests go through ``traced_get`` which records status,
+bytes, latency and whether the request was a retry under the action that
+is currently being routed (vod_listing, refresh_all, tmdb_refresh_now ...).
+run() flushes the totals into request_stats.json in the profile folder:
+
+  {"since": <ts>, "portal": {"vod_listing": {"requests": 12, "bytes": ..., "ms": ...,
+                                             "max_ms": ..., "retries": 0, "errors": 0,
+                                             "status": {"200": 12}}, ...},
+                  "tmdb": {...}}
+
+The cache info dialogs show the actions that cause the most requests.
+
+All requests share one requests.Session, so a reused interpreter keeps its
+connections (and TLS sessions) to the portal and TMDB open between calls.
+``prewarm(url)`` opens such a connection (DNS, TCP, TLS) in a background
+thread while run() is still reading settings and caches; the first request
+to that host waits for it instead of connecting on its own.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import json
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+from . import fileio
+from .loggers import Logger
+
+STATS_FILE = 'request_stats.json'
+TARGETS = ('portal', 'tmdb')
+
+_lock = threading.Lock()
+_action = 'other'
+_pending = {}
+_session = None
+_prewarm_threads = {}  # 'scheme://host:port' -> connecting thread
+_PREWARM_TIMEOUT = 5   # seconds for the background connect / for waiting on it
+
+
+def set_action(action):
+    """Tag all following requests with this action"""
+    global _action
+    _action = action or 'other'
+
+
+def traced_get(target, retry=False, **kwargs):
+    """requests.get that records the request under the current action"""
+    # requests (urllib3, ssl, idna ...) is the most expensive import of the
+    # add-on: only calls that really go to the network load it
+    import requests  # pylint: disable=import-outside-toplevel
+    _await_prewarm(kwargs.get('url'))
+    session = _get_session()
+    start = time.perf_counter()
+    try:
+        response = session.get(**kwargs)
+    except requests.exceptions.RequestException:
+        _record(target, time.perf_counter() - start, 0, 'error', retry)
+        raise
+    _record(target, time.perf_counter() - start, len(response.content or b''), response.status_code, retry)
+    return response
+
+
+def _get_session():
+    """The shared session, created on first use"""
+    global _session
+    with _lock:
+        if _session is None:
+            # pylint: disable=import-outside-toplevel
+            import requests
+            from http.cookiejar import DefaultCookiePolicy
+            session = requests.Session()
+            # Every call sends its own Cookie header (mac=...): never replay server cookies
+            session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+            _session = session
+        return _session
+
+
+def close_session():
+    """Close pooled connections (portal settings changed, warm mode off)"""
+    global _session
+    with _lock:
+        session, _session = _session, None
+        _prewarm_threads.clear()
+    if session is not None:
+        session.close()
+
+
+def _origin(url):
+    parts = urlsplit(url or '')
+    return '{}://{}'.format(parts.scheme, parts.netloc) if parts.scheme and parts.netloc else None
+
+
+def prewarm(url):
+    """Start connecting to the host of url in the background (no request is sent)"""
+    origin = _origin(url)
+    if origin is None:
+        return
+    with _lock:
+        running = _prewarm_threads.get(origin)
+        if running is not None and running.is_alive():
+            return
+        thread = threading.Thread(target=_connect, args=(url,), name='prewarm ' + origin)
+        thread.daemon = True
+        _prewarm_threads[origin] = thread
+    thread.start()
+
+
+def _connect(url):
+    """Put one connected (idle) connection for url into the session's pool"""
+    # pylint: disable=import-outside-toplevel,protected-access
+    import requests
+    try:
+        adapter = _get_session().get_adapter(url)
+        if hasattr(adapter, 'get_connection_with_tls_context'):
+            # requests >= 2.32: same pool (TLS settings) as the real request
+            pool = adapter.get_connection_with_tls_context(requests.Request('GET', url).prepare(), True)
+        else:
+            pool = adapter.get_connection(url)
+        # urllib3 has no public way to open a pooled connection in advance
+        conn = pool._get_conn()
+        try:
+            if getattr(conn, 'sock', None) is None:  # new, or dropped by the server
+                conn.timeout = _PREWARM_TIMEOUT
+                conn.connect()
+        except Exception:  # pylint: disable=broad-except
+            conn.close()
+            raise
+        finally:
+            pool._put_conn(conn)
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.debug('Connection pre-warm for {} failed: {}', url, exc)
+
+
+def _await_prewarm(url):
+    """Let the first request to a host use the connection being opened for it"""
+    origin = _origin(url)
+    with _lock:
+        thread = _prewarm_threads.pop(origin, None) if origin else None
+    if thread is not None and thread is not threading.current_thread():
+        thread.join(_PREWARM_TIMEOUT)
+
+
+def _record(target, seconds, nbytes, status, retry):
+    millis = seconds * 1000.0
+    with _lock:
+        entry = _pending.setdefault(target, {}).setdefault(_action, _empty())
+        entry['requests'] += 1
+        entry['bytes'] += nbytes
+        entry['ms'] += millis
+        entry['max_ms'] = max(entry['max_ms'], millis)
+        entry['retries'] += 1 if retry else 0
+        entry['errors'] += 0 if status == 200 else 1
+        entry['status'][str(status)] = entry['status'].get(str(status), 0) + 1
+
+
+def _empty():
+    return {'requests': 0, 'bytes': 0, 'ms': 0.0, 'max_ms': 0.0, 'retries': 0, 'errors': 0, 'status': {}}
+
+
+def _merge(into, entry):
+    for key in ('requests', 'bytes', 'ms', 'retries', 'errors'):
+        into[key] = into.get(key, 0) + entry[key]
+    into['max_ms'] = max(into.get('max_ms', 0.0), entry['max_ms'])
+    status = into.setdefault('status', {})
+    for code, count in entry['status'].items():
+        status[code] = status.get(code, 0) + count
+
+
+def load(profile_dir):
+    """Return the persisted totals ({} if none)"""
+    try:
+        data = fileio.read(os.path.join(profile_dir, STATS_FILE))
+        if data:
+            return json.loads(data)
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('Request stats read failed: {}'.format(exc))
+    return {}
+
+
+def flush(profile_dir):
+    """Add the requests of this invocation to request_stats.json"""
+    global _pending
+    with _lock:
+        pending, _pending = _pending, {}
+    if not pending or not profile_dir:
+        return
+    stats = load(profile_dir)
+    stats.setdefault('since', time.time())
+    for target, actions in pending.items():
+        per_action = stats.setdefault(target, {})
+        for action, entry in actions.items():
+            _merge(per_action.setdefault(action, {}), entry)
+    try:
+        # Replaced atomically: another plugin call may read it at the same time
+        fileio.write(os.path.join(profile_dir, STATS_FILE), json.dumps(stats).encode('utf-8'))
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('Request stats write failed: {}'.format(exc))
+
+
+def summary_lines(profile_dir, target, limit=4):
+    """Dialog lines: total and the actions with the most requests for one target"""
+    stats = load(profile_dir)
+    actions = stats.get(target) or {}
+    if not actions:
+        return []
+    total_requests = sum(e.get('requests', 0) for e in actions.values())
+    total_bytes = sum(e.get('bytes', 0) for e in actions.values())
+    lines = ['Anfragen seit {}: {} ({:.1f} MB)'.format(
+        time.strftime('%d.%m.%Y', time.localtime(stats.get('since', time.time()))),
+        total_requests, total_bytes / (1024.0 * 1024.0))]
+    ranked = sorted(actions.items(), key=lambda kv: -kv[1].get('requests', 0))[:limit]
+    for action, entry in ranked:
+        requests_count = entry.get('requests', 0) or 1
+        line = '  {}: {} Anfr., {:.1f} MB, Ø {:.0f} ms'.format(
+            action, entry.get('requests', 0), entry.get('bytes', 0) / (1024.0 * 1024.0),
+            entry.get('ms', 0.0) / requests_count)
+        if entry.get('retries'):
+            line += ', {} Wiederh.'.format(entry['retries'])
+        if entry.get('errors'):
+            line += ', {} Fehler'.format(entry['errors'])
+        lines.append(line)
+    return lines
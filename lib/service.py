@@ -6,8 +6,8 @@ from __future__ import absolute_import, division, unicode_literals
 import json
 import os
 import threading
+import time
 from urllib.parse import urlsplit, parse_qsl, urlencode
-import requests
 import xbmc
 import xbmcaddon
 import xbmcvfs
@@ -15,6 +15,10 @@ from xbmc import Monitor, Player, getInfoLabel
 from .loggers import Logger
 from .utils import get_int_value, get_next_info_and_send_signal
 
+ADDON_ID = 'plugin.video.stalkervod.tmdb'
+# The same list is revalidated at most once in this many seconds
+REVALIDATE_MIN_INTERVAL = 300
+
 
 class BackgroundService(Monitor):
     """ Background service code """
@@ -22,6 +26,8 @@ class BackgroundService(Monitor):
     def __init__(self):
         Monitor.__init__(self)
         self._player = PlayerMonitor()
+        self._revalidated = {}  # (cat_type, category_id) -> time of the last queued refresh
+        self._portal = None  # key of the portal this service saw configured last
 
     def run(self):
         """ Background loop for maintenance tasks """
@@ -38,11 +44,18 @@ class BackgroundService(Monitor):
             # Stop when abort requested
             if self.waitForAbort(10):
                 break
+            # Pick up a toggled Kodi debug log setting
+            Logger.refresh()
 
         Logger.debug('Service stopped')
 
     def _check_portal_changed(self):
-        """Detect portal switch and auto-clear the Stalker cache if needed."""
+        """Detect a portal switch: the Stalker cache of the new portal becomes active.
+
+        The previous portal is the one this service saw last (at start: the
+        one active when Kodi was closed), not the active cache folder: a
+        plugin call may already have switched that folder.
+        """
         addon = xbmcaddon.Addon()
         server = addon.getSetting('server_address')
         mac = addon.getSetting('mac_address')
@@ -50,14 +63,17 @@ class BackgroundService(Monitor):
             return  # Not configured yet
 
         profile = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
-        from .stalker_cache import StalkerCache
-        changed = StalkerCache.check_portal_changed(profile, server, mac)
-        if changed:
+        from .stalker_cache import activate_portal, active_portal, portal_key
+        previous = self._portal or active_portal(profile)
+        activate_portal(profile, server, mac)
+        self._portal = portal_key(server, mac)
+        if previous is not None and previous != self._portal:
             import xbmcgui
             xbmcgui.Dialog().ok(
                 'Portal gewechselt',
                 'Die Portal-Adresse oder MAC-Adresse hat sich geändert.[CR][CR]'
-                'Der Portal-Cache wurde automatisch gelöscht.[CR]'
+                'Portal-Cache und Ordnerfilter werden pro Portal gespeichert: '
+                'beim Zurückwechseln sind sie sofort wieder da.[CR]'
                 'TMDB-Daten bleiben erhalten und werden für das '
                 'neue Portal wiederverwendet.'
             )
@@ -85,14 +101,36 @@ class BackgroundService(Monitor):
             return  # Never delete – no automatic refresh
 
         profile = xbmcvfs.translatePath(addon.getAddonInfo('profile'))
-        from .stalker_cache import StalkerCache
-        cache = StalkerCache(profile, cache_days=cache_days)
+        from .stalker_cache import StalkerCache, portal_cache_dir, set_backend
+        set_backend(1 if addon.getSetting('cache_backend') == '1' else 0)
+        cache = StalkerCache(portal_cache_dir(profile, server, mac), cache_days=cache_days)
         if cache.categories_are_stale('vod'):
             Logger.debug('Stalker cache stale – triggering silent background refresh')
             xbmc.executebuiltin(
                 'RunPlugin(plugin://plugin.video.stalkervod.tmdb/?action=update_new_data&silent=1)'
             )
 
+    def onNotification(self, sender, method, data):  # pylint: disable=invalid-name
+        """The plugin showed an expired cache list: refresh it in the background."""
+        if sender != ADDON_ID or not method.endswith('revalidate'):
+            return
+        try:
+            payload = json.loads(data)
+        except (ValueError, TypeError):
+            return
+        if not isinstance(payload, dict):
+            return
+        key = (payload.get('cat_type'), payload.get('category_id'))
+        now = time.time()
+        if key[0] not in ('vod', 'series') or now - self._revalidated.get(key, 0) < REVALIDATE_MIN_INTERVAL:
+            return
+        self._revalidated[key] = now
+        query = {'action': 'revalidate', 'cat_type': key[0]}
+        if key[1]:
+            query['category_id'] = key[1]
+        Logger.debug('Revalidating {} {}', key[0], key[1] or 'categories')
+        xbmc.executebuiltin('RunPlugin(plugin://{}/?{})'.format(ADDON_ID, urlencode(query)))
+
     def onSettingsChanged(self):  # pylint: disable=invalid-name
         """React to setting changes.
         Action buttons (refresh, update, TMDB, folder filter) are now real
@@ -168,7 +206,7 @@ class PlayerMonitor(Player):
         if not self.__av_started:
             params = dict(parse_qsl(urlsplit(self.__path).query))
             if 'cmd' in params and params.get('use_cmd', '0') == '0':
-                Logger.debug('Stalker Player: [onPlayBackStopped] playback failed? retrying with cmd {}'.format(self.__path + "&use_cmd=1"))
+                Logger.debug('Stalker Player: [onPlayBackStopped] playback failed? retrying with cmd {}', self.__path + "&use_cmd=1")
                 xbmc.executebuiltin("Dialog.Close(all, true)")
                 func_str = f'PlayMedia({self.__path + "&use_cmd=1"})'
                 xbmc.executebuiltin(func_str)
@@ -181,7 +219,7 @@ class PlayerMonitor(Player):
     def __start_keepalive(self):
         """Start periodic watchdog keepalive pings to the Stalker portal."""
         self.__stop_keepalive()
-        Logger.debug('Keepalive: starting (interval={}s)'.format(self.KEEPALIVE_INTERVAL))
+        Logger.debug('Keepalive: starting (interval={}s)', self.KEEPALIVE_INTERVAL)
         self.__keepalive_tick()
 
     def __stop_keepalive(self):
@@ -204,6 +242,7 @@ class PlayerMonitor(Player):
 
     def __send_watchdog_ping(self):
         """Send a single watchdog keepalive ping to the Stalker portal."""
+        import requests  # pylint: disable=import-outside-toplevel
         try:
             addon = xbmcaddon.Addon()
             server_address = addon.getSetting('server_address')
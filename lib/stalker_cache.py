@@ -1,26 +1,158 @@
 """
 Local disk cache for Stalker API category and video lists.
 
-One JSON file per entry:
+One file per list:
   stalker_cats_vod.json           – list of VOD categories
   stalker_cats_series.json        – list of Series categories
   stalker_videos_vod_<id>.json    – all videos for one VOD category
   stalker_videos_series_<id>.json – all videos for one Series category
-
-Each file format: {"ts": <unix timestamp>, "data": [...]}
+  stalker_videos_<type>_<id>.idx  – offsets for paged reads of that list
+
+Every file starts with a one-line JSON header:
+  {"ts": <unix timestamp>, "count": <items>, "fingerprint": "<crc32>", "page_items": <n>, ...}
+so freshness checks and the cache info only read the first bytes of a
+file; the payload is parsed when the list is actually used.  page_items
+is the portal's page size, so cached pages line up with the page numbers
+of the portal.
+
+Category files hold the portal's JSON array after the header.  Video
+lists ("format": "packed") keep only the fields the add-on uses (see
+portal_items):
+  line 2   the string table of repeated values, a JSON array
+  then     the records, one array per item: a JSON array, or a
+           MessagePack array with "codec": "msgpack" (binary cache format
+           of codec)
+With cache compression on ("compression": "zlib", "block_records": <n>,
+"bytes": <uncompressed size>) the records are instead stored as zlib
+blocks of block_records records each.
+
+Every video list file holds full records, so a film listed in several
+categories is stored once per category: each file stays readable on its
+own and a listing page needs no second lookup.  Only the SQLite backend
+stores each item once and the categories as id lists (see stalker_db).
+
+The .idx sidecar is an array of unsigned 64-bit integers: the size of the
+list file it belongs to (a mismatch means it is outdated), then the offset
+of every record - of every block when compressed - and the end offset.
+get_videos_page reads and parses just the records or blocks of one page
+with it.
+
+The files are read and written through fileio (native buffered I/O,
+atomic replacement on local paths).  Files of older versions
+({"ts": ..., "data": [...]} on one line) are still read.
 Cache expiry: CACHE_EXPIRY_HOURS (default 24 h).
+
+Expired lists are still returned when the caller passes allow_stale=True
+(stale-while-revalidate): listings show them at once and ask the service
+to refresh the list in the background (see addon._queue_revalidation).
+
+Parsed files are kept in memory between plugin calls of the same
+interpreter (reuselanguageinvoker) and only parsed again when their
+(mtime, size) stamp changes.  The lists returned are shared: treat them
+as read-only.
+
+With the setting "Cache-Speicher: SQLite" (cache_backend=1) the same data
+lives in stalker_cache.db instead (see stalker_db); StalkerCache keeps the
+API and picks the backend set by set_backend().
+
+Every portal identity (server + MAC) has its own cache folder,
+portals/<key>/ in the profile, holding these files, stalker_cache.db and
+the folder filters (portal_cache_dir).  Switching to another portal only
+switches folders, so switching back finds the old cache again.
+portals.json records when each portal was last used (refreshed by every
+process using it, at most once per PORTAL_TOUCH_SECONDS); the least
+recently used ones are deleted beyond PORTAL_CACHE_MAX_BYTES /
+PORTAL_CACHE_MAX_COUNT (see activate_portal).  The TMDB cache stays in the profile folder: it is
+title-based and shared by all portals.
 """
 from __future__ import absolute_import, division, unicode_literals
 
 import json
 import os
+import re
 import time
+import zlib
+from array import array
+from collections import OrderedDict
 
 import xbmcvfs
 
 from .loggers import Logger
+from .metrics import timed
+from . import codec, fileio, portal_items
+from .utils import get_file_stamp
 
 CACHE_EXPIRY_HOURS = 24
+# The header line is far shorter; files without a newline in the first
+# bytes are of the old single-line format, whose ts also comes first
+_HEADER_BYTES = 256
+# Page size of lists stored without the portal's max_page_items
+DEFAULT_PAGE_ITEMS = 20
+_OLD_TS_RE = re.compile(r'^\{"ts": ([-+0-9.eE]+)')
+
+# In-memory copies of parsed cache files: path -> (stamp, raw dict), least
+# recently used first.  Bounded by the JSON size of the files (about a third
+# of the memory the parsed lists take) so a 100k catalog does not stay
+# resident on low-memory boxes.
+_MEMO_MAX_BYTES = 32 * 1024 * 1024
+_memo = OrderedDict()
+_memo_enabled = True
+BACKENDS = ('json', 'sqlite')
+_backend = 'json'
+
+# Per-portal cache folders (see activate_portal)
+PORTALS_DIR = 'portals'
+PORTALS_FILE = 'portals.json'
+PORTAL_CACHE_MAX_BYTES = 256 * 1024 * 1024
+PORTAL_CACHE_MAX_COUNT = 5
+# The active portal is recorded as used (and the budget enforced) at most this often per process
+PORTAL_TOUCH_SECONDS = 3600
+_LEGACY_PORTAL_FILE = 'last_portal.json'
+_PORTAL_FILES = ('stalker_*.json', 'stalker_*.idx', 'stalker_cache.db*', 'folder_filter_*.json')
+_portal_touched = (None, None, 0)  # (profile, portal key, time) of the last activate_portal() of this process
+
+
+def set_memory_cache_enabled(enabled):
+    """Switch the in-memory copies on or off (setting "Keep caches in memory")"""
+    global _memo_enabled
+    _memo_enabled = enabled
+    if not enabled:
+        _memo.clear()
+
+
+def set_backend(backend):
+    """Select the storage of new StalkerCache objects (setting cache_backend: 0 JSON, 1 SQLite)"""
+    global _backend
+    _backend = BACKENDS[backend] if backend in (0, 1) else 'json'
+
+
+def _open_db(cache_dir):
+    """The SQLite database of cache_dir, None (JSON files) if it cannot be opened"""
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        from .stalker_db import get_db  # pylint: disable=import-outside-toplevel
+        return get_db(cache_dir)
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('StalkerCache: SQLite not available, using JSON files: {}'.format(exc))
+        return None
+
+
+def _remember(path, stamp, raw, nbytes=None):
+    """Keep a parsed file, dropping the least recently used ones above the budget.
+
+    nbytes: uncompressed size of the file (default: its size on disk).
+    """
+    _memo.pop(path, None)
+    if stamp is None:
+        return
+    nbytes = stamp[1] if nbytes is None else nbytes
+    if nbytes > _MEMO_MAX_BYTES:
+        return
+    _memo[path] = (stamp, raw, nbytes)
+    total = sum(entry[2] for entry in _memo.values())
+    while total > _MEMO_MAX_BYTES:
+        _, (_, _, old_bytes) = _memo.popitem(last=False)
+        total -= old_bytes
 
 
 class StalkerCache:
@@ -35,153 +167,617 @@ class StalkerCache:
             self._expiry_hours = cache_days * 24
         else:
             self._expiry_hours = CACHE_EXPIRY_HOURS
+        self._db = _open_db(cache_dir) if _backend == 'sqlite' and cache_dir else None
 
     # ------------------------------------------------------------------
     # Categories
     # ------------------------------------------------------------------
 
-    def get_categories(self, cat_type):
-        """Return cached category list or None if missing/stale."""
-        return self._read(_cats_path(self._dir, cat_type))
+    def get_categories(self, cat_type, allow_stale=False):
+        """Return cached category list or None if missing/stale (allow_stale: only if missing)."""
+        if self._db is not None:
+            return self._read_db(cat_type, None, allow_stale)
+        return self._read(_cats_path(self._dir, cat_type), allow_stale)
 
     def set_categories(self, cat_type, categories):
         """Persist category list to disk."""
+        if self._db is not None:
+            self._write_db(cat_type, None, categories)
+            return
         self._write(_cats_path(self._dir, cat_type), categories)
 
     def categories_are_stale(self, cat_type):
         """True if cache file is missing or older than CACHE_EXPIRY_HOURS."""
+        if self._db is not None:
+            try:
+                return self._expired(self._db.list_ts(cat_type))
+            except Exception as exc:  # pylint: disable=broad-except
+                Logger.warn('StalkerCache db error: {}'.format(exc))
+                return True
         return self._is_stale(_cats_path(self._dir, cat_type))
 
     # ------------------------------------------------------------------
     # Videos per category
     # ------------------------------------------------------------------
 
-    def get_videos(self, cat_type, cat_id):
-        """Return cached video list for a category, or None if missing/stale."""
-        return self._read(_videos_path(self._dir, cat_type, cat_id))
+    def get_videos(self, cat_type, cat_id, allow_stale=False):
+        """Return cached video list for a category, or None if missing/stale (allow_stale: only if missing)."""
+        if self._db is not None:
+            return self._read_db(cat_type, cat_id, allow_stale)
+        return self._read(_videos_path(self._dir, cat_type, cat_id), allow_stale)
+
+    def videos_are_stale(self, cat_type, cat_id):
+        """True if the video list of a category is missing or expired (header only)."""
+        meta = self.get_meta(cat_type, cat_id)
+        return self._expired(meta['ts'] if meta else None)
+
+    def set_videos(self, cat_type, cat_id, videos, page_items=None):
+        """Persist video list for a category to disk.
 
-    def set_videos(self, cat_type, cat_id, videos):
-        """Persist video list for a category to disk."""
-        self._write(_videos_path(self._dir, cat_type, cat_id), videos)
+        page_items: max_page_items of the portal listing the videos came from.
+        """
+        if self._db is not None:
+            self._write_db(cat_type, cat_id, videos, page_items)
+            return
+        self._write(_videos_path(self._dir, cat_type, cat_id), videos, page_items, packed=True)
+
+    def get_videos_page(self, cat_type, cat_id, page, pages=1, allow_stale=False):
+        """Portal pages page .. page+pages-1 of a cached video list, or None if missing/stale.
+
+        Shaped like Api.get_listing(): {'data', 'total_items', 'max_page_items'}.
+        Only the requested records are read and parsed.
+        """
+        if self._db is not None:
+            return self._read_db_page(cat_type, cat_id, page, pages, allow_stale)
+        path = _videos_path(self._dir, cat_type, cat_id)
+        meta = self._read_meta(path)
+        if meta is None or (not allow_stale and self._expired(meta['ts'])):
+            return None
+        page_items = meta['page_items'] or DEFAULT_PAGE_ITEMS
+        start = (max(int(page), 1) - 1) * page_items
+        stop = start + page_items * max(int(pages), 1)
+        data = None
+        total = meta['count']
+        entry = _memo.get(path) if _memo_enabled else None
+        if entry is None or entry[0] != get_file_stamp(path):
+            data = self._read_slice(path, start, stop) if total is not None else None
+        if data is None:
+            raw = self._read_raw(path)
+            if raw is None:
+                return None
+            data = raw.get('data') or []
+            total = len(data)
+            data = data[start:stop]
+        return {'data': data, 'total_items': total, 'max_page_items': page_items}
+
+    def get_meta(self, cat_type, cat_id=None):
+        """{'ts', 'count', 'fingerprint', 'page_items'} of a cached category list (cat_id
+        None) or video list without reading the payload; None if missing.
+
+        count, fingerprint and page_items are None for files of older versions.
+        """
+        if self._db is not None:
+            try:
+                return self._db.read_meta(cat_type, '' if cat_id is None else cat_id)
+            except Exception as exc:  # pylint: disable=broad-except
+                Logger.warn('StalkerCache db error: {}'.format(exc))
+                return None
+        if cat_id is None:
+            return self._read_meta(_cats_path(self._dir, cat_type))
+        return self._read_meta(_videos_path(self._dir, cat_type, cat_id))
 
     # ------------------------------------------------------------------
-    # Portal identity tracking
+    # Several categories at once
     # ------------------------------------------------------------------
 
-    @staticmethod
-    def check_portal_changed(cache_dir, server, mac):
-        """Check if the portal (server+MAC) has changed since the last run.
+    def iter_videos(self, cat_type, cat_ids):
+        """Yield (cat_id, videos) of every category in cat_ids that has a fresh cached list."""
+        cat_ids = [str(cat_id) for cat_id in cat_ids]
+        if self._db is None:
+            for cat_id in cat_ids:
+                videos = self.get_videos(cat_type, cat_id)
+                if videos:
+                    yield cat_id, videos
+            return
+        try:
+            times = self._db.list_times(cat_type, cat_ids)
+            fresh = [cat_id for cat_id in cat_ids if cat_id in times and not self._expired(times[cat_id])]
+            # One indexed range scan per category; in-memory copies are reused
+            for cat_id in fresh:
+                videos = self._read_db(cat_type, cat_id)
+                if videos:
+                    yield cat_id, videos
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache db error: {}'.format(exc))
 
-        Compares the current server/mac with the stored values in
-        ``last_portal.json``.  If different, the Stalker cache files are
-        deleted (they are portal-specific and useless for a different
-        portal).  The TMDB cache is intentionally kept – it is
-        title-based and reusable across portals.
+    def search_videos(self, cat_type, cat_ids, term):
+        """Videos of cat_ids whose name contains term, or None if this needs the portal.
 
-        Returns True if a portal change was detected (and cache cleared).
+        Only the SQLite backend answers (indexed, one query); and only when
+        every category has a fresh cached list.
         """
+        if self._db is None:
+            return None
+        cat_ids = [str(cat_id) for cat_id in cat_ids]
+        try:
+            times = self._db.list_times(cat_type, cat_ids)
+            if any(cat_id not in times or self._expired(times[cat_id]) for cat_id in cat_ids):
+                return None
+            return self._db.search(cat_type, cat_ids, term)
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache db error: {}'.format(exc))
+            return None
+
+    def list_count(self):
+        """Number of cached lists (files or database lists)."""
+        if self._db is not None:
+            try:
+                return self._db.list_count()
+            except Exception as exc:  # pylint: disable=broad-except
+                Logger.warn('StalkerCache db error: {}'.format(exc))
+                return 0
         import glob as globmod
-        portal_file = os.path.join(cache_dir, 'last_portal.json')
-        current = {'server': server, 'mac': mac}
+        return len(globmod.glob(os.path.join(self._dir, 'stalker_*.json')))
 
-        # Read previous portal identity
-        previous = None
-        try:
-            if xbmcvfs.exists(portal_file):
-                with xbmcvfs.File(portal_file, 'r') as fh:
-                    content = fh.read()
-                    if content:
-                        previous = json.loads(content)
-        except Exception:
-            previous = None
-
-        # First run or file missing → just store current and return
-        if previous is None:
+    def clear(self):
+        """Delete all cached lists of the current backend; returns how many were removed."""
+        removed = self.list_count()
+        _memo.clear()
+        if self._db is not None:
+            try:
+                self._db.clear()
+            except Exception as exc:  # pylint: disable=broad-except
+                Logger.warn('StalkerCache db clear error: {}'.format(exc))
+                return 0
+            return removed
+        import glob as globmod
+        removed = 0
+        for fp in globmod.glob(os.path.join(self._dir, 'stalker_*.json')):
             try:
-                with xbmcvfs.File(portal_file, 'w') as fh:
-                    fh.write(json.dumps(current))
+                if xbmcvfs.delete(fp):
+                    removed += 1
+                _delete_index(fp)
             except Exception:
                 pass
-            return False
-
-        # Compare
-        if previous.get('server') == server and previous.get('mac') == mac:
-            return False  # same portal, nothing to do
-
-        # Portal changed → delete all stalker_*.json files
-        Logger.info('Portal changed: {} → {}. Clearing Stalker cache.'.format(
-            previous.get('server', '?'), server))
-        pattern = os.path.join(cache_dir, 'stalker_*.json')
-        for fp in globmod.glob(pattern):
+        # Temporary files of interrupted writes
+        for fp in globmod.glob(os.path.join(self._dir, 'stalker_*' + fileio.TEMP_SUFFIX)):
             try:
                 xbmcvfs.delete(fp)
             except Exception:
                 pass
-        # Also delete folder filter selections (portal-specific)
-        for ft in ('vod', 'series', 'tv'):
-            ff = os.path.join(cache_dir, 'folder_filter_{}.json'.format(ft))
+        return removed
+
+    def info(self):
+        """Statistics for the cache info dialog.
+
+        {'files', 'bytes', 'oldest', 'newest', 'categories', 'videos'};
+        files is 0 if nothing is cached.
+        """
+        if self._db is not None:
+            try:
+                stats = self._db.info()
+            except Exception as exc:  # pylint: disable=broad-except
+                Logger.warn('StalkerCache db error: {}'.format(exc))
+                return {'files': 0, 'bytes': 0, 'oldest': None, 'newest': None, 'categories': 0, 'videos': 0}
+            return {'files': 1 if stats['lists'] else 0, 'bytes': stats['bytes'], 'oldest': stats['oldest'],
+                    'newest': stats['newest'], 'categories': stats['categories'], 'videos': stats['videos']}
+        import glob as globmod
+        stats = {'files': 0, 'bytes': 0, 'oldest': None, 'newest': None, 'categories': 0, 'videos': 0}
+        for fp in globmod.glob(os.path.join(self._dir, 'stalker_*.json')):
+            stats['files'] += 1
             try:
-                if xbmcvfs.exists(ff):
-                    xbmcvfs.delete(ff)
+                stats['bytes'] += xbmcvfs.Stat(fp).st_size()
             except Exception:
                 pass
-
-        # Save new portal identity
-        try:
-            with xbmcvfs.File(portal_file, 'w') as fh:
-                fh.write(json.dumps(current))
-        except Exception:
-            pass
-
-        return True
+            meta = self._read_meta(fp)
+            if meta is None:
+                continue
+            ts = meta['ts']
+            if ts > 0:
+                if stats['oldest'] is None or ts < stats['oldest']:
+                    stats['oldest'] = ts
+                if stats['newest'] is None or ts > stats['newest']:
+                    stats['newest'] = ts
+            count = meta['count']
+            if count is None:
+                # Written by an older version: count needs the payload
+                count = len((self._read_raw(fp) or {}).get('data') or [])
+            fname = os.path.basename(fp)
+            if fname.startswith('stalker_cats_'):
+                stats['categories'] += count
+            elif fname.startswith('stalker_videos_'):
+                stats['videos'] += count
+        return stats
 
     # ------------------------------------------------------------------
     # Internal helpers
     # ------------------------------------------------------------------
 
     def _is_stale(self, path):
-        """True if the cache file is missing or expired."""
-        if self._expiry_hours == 0:
-            # Never expire – only stale if file is missing
-            return not xbmcvfs.exists(path)
-        if not xbmcvfs.exists(path):
-            return True
-        raw = self._read_raw(path)
-        if raw is None:
+        """True if the cache file is missing or expired (reads the header only)."""
+        meta = self._read_meta(path)
+        return self._expired(meta['ts'] if meta else None)
+
+    def _expired(self, ts):
+        """True if a list stored at ts (None = missing) is too old."""
+        if ts is None:
             return True
-        age_h = (time.time() - raw.get('ts', 0)) / 3600.0
-        return age_h >= self._expiry_hours
+        if self._expiry_hours == 0:
+            return False
+        return (time.time() - ts) / 3600.0 >= self._expiry_hours
+
+    @timed('cache')
+    def _read_db(self, cat_type, cat_id, allow_stale=False):
+        """Category list (cat_id None) or video list from SQLite, None if missing/stale."""
+        key = (self._db.path, cat_type, None if cat_id is None else str(cat_id))
+        try:
+            version = self._db.version() if _memo_enabled else None
+            entry = _memo.get(key) if _memo_enabled else None
+            if entry is not None and entry[0][0] == version:
+                _memo.move_to_end(key)
+                raw = entry[1]
+            else:
+                stored = self._db.read_categories(cat_type) if cat_id is None else self._db.read_videos(cat_type, cat_id)
+                if stored is None:
+                    return None
+                raw = {'ts': stored[0], 'data': stored[1]}
+                if _memo_enabled:
+                    _remember(key, (version, stored[2]), raw)
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache db read error {} {}: {}'.format(cat_type, cat_id, exc))
+            return None
+        return None if not allow_stale and self._expired(raw['ts']) else raw['data']
 
-    def _read(self, path):
+    @timed('cache')
+    def _read_db_page(self, cat_type, cat_id, page, pages, allow_stale=False):
+        """get_videos_page() for SQLite: one range query on the items primary key."""
+        key = (self._db.path, cat_type, str(cat_id))
+        try:
+            meta = self._db.read_meta(cat_type, cat_id)
+            if meta is None or (not allow_stale and self._expired(meta['ts'])):
+                return None
+            page_items = meta['page_items'] or DEFAULT_PAGE_ITEMS
+            start = (max(int(page), 1) - 1) * page_items
+            stop = start + page_items * max(int(pages), 1)
+            entry = _memo.get(key) if _memo_enabled else None
+            if entry is not None and entry[0][0] == self._db.version():
+                data = entry[1]['data']
+                return {'data': data[start:stop], 'total_items': len(data), 'max_page_items': page_items}
+            total = meta['count']
+            if total is None:
+                total = self._db.count_videos(cat_type, cat_id)
+            return {'data': self._db.read_videos_range(cat_type, cat_id, start, stop), 'total_items': total,
+                    'max_page_items': page_items}
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache db read error {} {}: {}'.format(cat_type, cat_id, exc))
+            return None
+
+    @timed('cache')
+    def _write_db(self, cat_type, cat_id, data, page_items=None):
+        """Store a category list (cat_id None) or video list in SQLite."""
+        key = (self._db.path, cat_type, None if cat_id is None else str(cat_id))
+        try:
+            if cat_id is None:
+                ts, nbytes = self._db.write_categories(cat_type, data)
+            else:
+                ts, nbytes = self._db.write_videos(cat_type, cat_id, data, page_items)
+        except Exception as exc:  # pylint: disable=broad-except
+            _memo.pop(key, None)
+            Logger.warn('StalkerCache db write error {} {}: {}'.format(cat_type, cat_id, exc))
+            return
+        if cat_id is not None:
+            # The items rows are shared with the other lists of cat_type: their
+            # copies may now be outdated (own commits leave data_version as it is)
+            for other in [k for k in _memo if isinstance(k, tuple) and k[:2] == key[:2] and k[2] is not None]:
+                del _memo[other]
+        if _memo_enabled:
+            if cat_id is not None:
+                data = portal_items.unpack_list([portal_items.pack(video) for video in data])  # as read back
+            # Own commits do not change data_version: this list's entry stays valid
+            _remember(key, (self._db.version(), nbytes), {'ts': ts, 'data': data})
+
+    def _read(self, path, allow_stale=False):
         """Return the data list from a cache file, or None if missing/stale."""
+        if not allow_stale and self._expiry_hours > 0 and self._is_stale(path):
+            return None  # the payload is not parsed at all
         raw = self._read_raw(path)
-        if raw is None:
+        if raw is None or (not allow_stale and self._expired(raw.get('ts', 0))):
             return None
-        if self._expiry_hours > 0:
-            age_h = (time.time() - raw.get('ts', 0)) / 3600.0
-            if age_h >= self._expiry_hours:
-                return None
         return raw.get('data')
 
+    def _read_meta(self, path):
+        """Header of a cache file ({'ts', 'count', 'fingerprint'}), None if missing."""
+        entry = _memo.get(path) if _memo_enabled else None
+        if entry is not None and entry[0] == get_file_stamp(path):
+            raw = entry[1]
+            return {'ts': raw.get('ts', 0), 'count': len(raw.get('data') or []),
+                    'fingerprint': raw.get('fingerprint'), 'page_items': raw.get('page_items')}
+        try:
+            head = fileio.read(path, _HEADER_BYTES)
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache header read error {}: {}'.format(path, exc))
+            return None
+        if head is None:
+            return None
+        head = head.decode('utf-8', errors='replace')
+        line, newline, _ = head.partition('\n')
+        if newline:
+            try:
+                header = json.loads(line)
+                return {'ts': header.get('ts', 0), 'count': header.get('count'),
+                        'fingerprint': header.get('fingerprint'), 'page_items': header.get('page_items')}
+            except ValueError:
+                return None
+        match = _OLD_TS_RE.match(head)
+        if match is None:
+            return None
+        return {'ts': float(match.group(1)), 'count': None, 'fingerprint': None, 'page_items': None}
+
+    @timed('cache')
+    def _read_slice(self, path, start, stop):
+        """Records start..stop-1 of a video list via its .idx offsets, None without a valid index."""
+        stamp = get_file_stamp(path)
+        try:
+            index = array('Q')
+            index.frombytes(fileio.read(_index_path(path)))
+        except Exception:  # pylint: disable=broad-except
+            return None
+        # index = [size of the data file, offset of record (block) 0 .. n-1, end offset]
+        if stamp is None or len(index) < 2 or index[0] != stamp[1]:
+            return None
+        try:
+            with fileio.open_read(path) as fh:
+                # header line, string table line (packed lists) and the start of the payload
+                lines = fh.read(index[1]).split(b'\n', 2)
+                header = json.loads(lines[0])
+                codec_name = header.get('codec', 'json')
+                if header.get('compression') == 'zlib':
+                    records = _read_blocks(fh, index, header, start, stop)
+                else:
+                    stop = min(stop, len(index) - 2)
+                    if start >= stop:
+                        return []
+                    separator = 0 if codec_name == 'msgpack' else 1  # no ',' between MessagePack records
+                    fh.seek(index[1 + start])
+                    chunk = fh.read(index[1 + stop] - separator - index[1 + start])
+                    records = codec.load_records(chunk, codec_name, stop - start)
+            table = codec.loads(lines[1]) if header.get('format') == 'packed' else ()
+            return portal_items.unpack_list(records, table)
+        except Exception as exc:  # pylint: disable=broad-except
+            Logger.warn('StalkerCache page read error {}: {}'.format(path, exc))
+            return None
+
+    @timed('cache')
     def _read_raw(self, path):
-        """Read JSON from path without expiry check. Returns dict or None."""
+        """Read header and payload from path without expiry check. Returns dict or None."""
+        stamp = None
+        if _memo_enabled:
+            stamp = get_file_stamp(path)
+            entry = _memo.get(path)
+            if entry is not None and stamp is not None and entry[0] == stamp:
+                _memo.move_to_end(path)
+                return entry[1]
         try:
-            if xbmcvfs.exists(path):
-                with xbmcvfs.File(path, 'r') as fh:
-                    content = fh.read()
-                    if content:
-                        return json.loads(content)
+            content = fileio.read(path)
+            if content:
+                nbytes = None
+                head, newline, payload = content.partition(b'\n')
+                if newline:
+                    raw = json.loads(head)
+                    if raw.get('format') == 'packed':
+                        table, _, payload = payload.partition(b'\n')
+                        codec_name = raw.get('codec', 'json')
+                        if raw.get('compression') == 'zlib':
+                            records = codec.load_blocks(payload, codec_name, raw['count'])
+                            nbytes = raw.get('bytes')
+                        else:
+                            records = codec.load_records(payload, codec_name)
+                        raw['data'] = portal_items.unpack_list(records, codec.loads(table))
+                    else:
+                        raw['data'] = codec.loads(payload)
+                else:
+                    raw = codec.loads(content)  # older single-line format
+                if _memo_enabled:
+                    _remember(path, stamp, raw, nbytes)
+                return raw
         except Exception as exc:  # pylint: disable=broad-except
             Logger.warn('StalkerCache read error {}: {}'.format(path, exc))
         return None
 
-    def _write(self, path, data):
-        """Write data list as JSON to path with current timestamp."""
+    @timed('cache')
+    def _write(self, path, data, page_items=None, packed=False):
+        """Write header line and data list as JSON to path with current timestamp.
+
+        packed=True (video lists) stores portal_items records and writes the
+        record offsets for paged reads (.idx).
+        """
+        table = b''
+        codec_name = codec.record_codec() if packed else 'json'
+        if packed:
+            data, strings = portal_items.pack_list(data)
+            table = codec.dumps(strings) + b'\n'
+            payload, first, separator, records = codec.dump_records(data, codec_name)
+            # The fingerprint is taken over the JSON form of the records whatever
+            # codec and compression store them: switching these settings keeps it
+            content = payload if codec_name == 'json' else codec.dump_records(data)[0]
+            data = portal_items.unpack_list(data, strings)  # what a read returns
+        else:
+            payload, first, separator, records = codec.dump_records(data)
+            content = payload
+        header = {'ts': time.time(), 'count': len(data), 'fingerprint': _fingerprint(table + content)}
+        if page_items:
+            header['page_items'] = int(page_items)
+        if packed:
+            header['format'] = 'packed'
+        if codec_name != 'json':
+            header['codec'] = codec_name
+        if packed:
+            steps = [len(record) + separator for record in records]
+            if codec.compression_enabled():
+                header.update(compression='zlib', block_records=codec.BLOCK_RECORDS, bytes=len(payload))
+                payload, steps = codec.dump_blocks(records, codec_name)
+                first = 0
+        head = json.dumps(header).encode('utf-8') + b'\n' + table
         try:
-            with xbmcvfs.File(path, 'w') as fh:
-                fh.write(json.dumps({'ts': time.time(), 'data': data}))
+            fileio.write(path, head + payload)
+            if packed:
+                offsets = array('Q', [len(head) + len(payload), len(head) + first])
+                for step in steps:
+                    offsets.append(offsets[-1] + step)
+                fileio.write(_index_path(path), offsets.tobytes())
         except Exception as exc:  # pylint: disable=broad-except
+            _memo.pop(path, None)
             Logger.warn('StalkerCache write error {}: {}'.format(path, exc))
+            return
+        if _memo_enabled:
+            nbytes = header.get('bytes')
+            header['data'] = data
+            _remember(path, get_file_stamp(path), header, nbytes)
+
+
+# ------------------------------------------------------------------
+# Per-portal cache folders
+# ------------------------------------------------------------------
+
+def portal_key(server, mac):
+    """Folder name of a portal identity (server address and MAC, normalised)"""
+    identity = '{}|{}'.format((server or '').strip().rstrip('/').lower(), (mac or '').strip().upper())
+    return '{:08x}'.format(zlib.crc32(identity.encode('utf-8')))
+
+
+def portal_cache_dir(profile, server, mac):
+    """Cache folder of a portal (created by activate_portal)"""
+    return os.path.join(profile, PORTALS_DIR, portal_key(server, mac))
+
+
+def active_portal(profile):
+    """Key of the portal activated last (by any process), None if there is none yet"""
+    return _read_portals(profile).get('active')
+
+
+def _read_portals(profile):
+    """Content of portals.json ({} if missing or broken)"""
+    try:
+        index = codec.loads(fileio.read(os.path.join(profile, PORTALS_FILE)) or b'{}')
+    except ValueError:
+        return {}
+    return index if isinstance(index, dict) else {}
+
+
+def activate_portal(profile, server, mac):
+    """Make server+MAC the active portal: (its cache folder, True if another portal was active).
+
+    Creates the folder, moves the cache files of older versions (profile
+    folder, portal in last_portal.json) into the folder of their portal,
+    records the portal as used and deletes the least recently used portal
+    folders beyond the budget.  Activating the same portal again within
+    PORTAL_TOUCH_SECONDS only returns its folder.
+    """
+    global _portal_touched
+    path = portal_cache_dir(profile, server, mac)
+    key = portal_key(server, mac)
+    now = time.time()
+    if _portal_touched[:2] == (profile, key) and now - _portal_touched[2] < PORTAL_TOUCH_SECONDS \
+            and os.path.isdir(path):
+        return path, False
+    index_path = os.path.join(profile, PORTALS_FILE)
+    index = _read_portals(profile)
+    portals = index.setdefault('portals', {})
+    previous = index.get('active')
+    if previous is None:
+        previous = _migrate_legacy_files(profile, server, mac, portals)
+    os.makedirs(path, exist_ok=True)
+    portals[key] = {'server': server, 'used': now}
+    index['active'] = key
+    _evict_portals(profile, portals, key)
+    _portal_touched = (profile, key, now)
+    try:
+        fileio.write(index_path, codec.dumps(index))
+    except Exception as exc:  # pylint: disable=broad-except
+        Logger.warn('StalkerCache: {} not written: {}'.format(PORTALS_FILE, exc))
+    if previous is not None and previous != key:
+        Logger.info('Portal changed: now {} (cache folder {})'.format(server, key))
+        return path, True
+    return path, False
+
+
+def _migrate_legacy_files(profile, server, mac, portals):
+    """Move cache files of older versions into their portal folder; key of that portal, None without any"""
+    import glob as globmod
+    legacy = os.path.join(profile, _LEGACY_PORTAL_FILE)
+    try:
+        identity = codec.loads(fileio.read(legacy) or b'null')
+    except ValueError:
+        identity = None
+    files = [fp for pattern in _PORTAL_FILES for fp in globmod.glob(os.path.join(profile, pattern))]
+    if identity is None and not files:
+        return None
+    if isinstance(identity, dict):
+        server, mac = identity.get('server'), identity.get('mac')
+    target = portal_cache_dir(profile, server, mac)
+    os.makedirs(target, exist_ok=True)
+    for fp in files:
+        try:
+            os.replace(fp, os.path.join(target, os.path.basename(fp)))
+        except OSError as exc:  # e.g. stalker_cache.db opened by a running plugin call (Windows)
+            Logger.warn('StalkerCache: {} not moved: {}'.format(fp, exc))
+    if xbmcvfs.exists(legacy):
+        xbmcvfs.delete(legacy)
+    Logger.info('StalkerCache: {} cache files moved to {}'.format(len(files), target))
+    key = portal_key(server, mac)
+    portals[key] = {'server': server, 'used': time.time()}
+    return key
+
+
+def _folder_bytes(path):
+    """Total size of the files in a folder"""
+    try:
+        return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+    except OSError:
+        return 0
+
+
+def _evict_portals(profile, portals, active):
+    """Delete the least recently used portal folders beyond the size and count budget (never active)"""
+    import shutil
+    root = os.path.join(profile, PORTALS_DIR)
+    for name in os.listdir(root):
+        if name not in portals and os.path.isdir(os.path.join(root, name)):
+            portals[name] = {'used': 0}  # folder without entry: evicted first
+    sizes = {key: _folder_bytes(os.path.join(root, key)) for key in portals}
+    total = sum(sizes.values())
+    for key in sorted(portals, key=lambda k: portals[k].get('used', 0)):
+        if key == active or (total <= PORTAL_CACHE_MAX_BYTES and len(portals) <= PORTAL_CACHE_MAX_COUNT):
+            continue
+        folder = os.path.join(root, key)
+        if os.path.exists(os.path.join(folder, 'stalker_cache.db')):
+            from .stalker_db import close_db  # pylint: disable=import-outside-toplevel
+            close_db(folder)
+        shutil.rmtree(folder, ignore_errors=True)
+        if os.path.isdir(folder):
+            continue  # files still in use: try again next time
+        Logger.info('StalkerCache: cache of portal {} removed ({} KB)'.format(
+            portals[key].get('server', key), sizes[key] // 1024))
+        total -= sizes[key]
+        del portals[key]
+
+
+def _read_blocks(fh, index, header, start, stop):
+    """Records start..stop-1 of a compressed list: inflates only the blocks holding them"""
+    size, count = header['block_records'], header['count']
+    stop = min(stop, count)
+    if start >= stop:
+        return []
+    first, last = start // size, (stop - 1) // size + 1
+    fh.seek(index[1 + first])
+    chunk = fh.read(index[1 + last] - index[1 + first])
+    records = codec.load_blocks(chunk, header.get('codec', 'json'), min(count, last * size) - first * size)
+    return records[start - first * size:stop - first * size]
+
+
+def _fingerprint(payload):
+    """Short checksum of a serialized list: equal lists give equal fingerprints"""
+    return '{:08x}'.format(zlib.crc32(payload))
 
 
 # ------------------------------------------------------------------
@@ -194,3 +790,13 @@ def _cats_path(cache_dir, cat_type):
 
 def _videos_path(cache_dir, cat_type, cat_id):
     return os.path.join(cache_dir, 'stalker_videos_{}_{}.json'.format(cat_type, cat_id))
+
+
+def _index_path(path):
+    return path[:-len('.json')] + '.idx'
+
+
+def _delete_index(path):
+    index_path = _index_path(path)
+    if xbmcvfs.exists(index_path):
+        xbmcvfs.delete(index_path)
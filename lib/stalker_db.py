@@ -0,0 +1,348 @@
+"""
+SQLite storage for the Stalker cache (setting "Cache-Speicher: SQLite").
+
+Same data as the JSON files of stalker_cache, in one database
+stalker_cache.db in the profile folder:
+
+  lists       (type, category_id, ts, count, fingerprint, page_items)
+              when a list was stored and what it holds; category_id '' = category list
+  categories  (type, pos, id, title, data)  one row per category, data = JSON of the portal entry
+  items       (type, id, added, title_norm, data)
+              one row per video/series of the portal, data = portal_items record;
+              index on added; title_norm is scanned by search()
+  list_items  (type, category_id, pos, item_id)
+              the videos of each category in portal order; the primary key
+              doubles as the category index, a further index on item_id
+
+Portals list the same film in several categories ("New", "Top", genre and
+language folders, "All"): it is stored once, keyed by its portal id (items
+without one by a hash of their data), and the categories only reference
+it.  An item is deleted with the last list that references it.
+
+Reading one category is one indexed range scan whose JSON rows are joined
+into a single array and parsed in one go.  Global operations (filters,
+cache info, search across categories) run as a single query instead of
+opening every category file.  Each list is written in a short transaction
+of its own: a refresh never holds the write lock while it waits for the
+portal, so the service and listings can write in between.
+
+StalkerCache is the public entry point; this module is only imported when
+the SQLite backend is selected.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+from .codec import dumps, loads
+from .portal_items import pack, unpack_list
+
+DB_FILE = 'stalker_cache.db'
+_SCHEMA_VERSION = 1
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS lists (type TEXT NOT NULL, category_id TEXT NOT NULL, ts REAL NOT NULL, '
+    'count INTEGER, fingerprint TEXT, page_items INTEGER, PRIMARY KEY (type, category_id)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS categories (type TEXT NOT NULL, pos INTEGER NOT NULL, id TEXT NOT NULL, '
+    'title TEXT, data TEXT NOT NULL, PRIMARY KEY (type, pos)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS items (type TEXT NOT NULL, id TEXT NOT NULL, added TEXT, title_norm TEXT, '
+    'data TEXT NOT NULL, PRIMARY KEY (type, id)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS list_items (type TEXT NOT NULL, category_id TEXT NOT NULL, pos INTEGER NOT NULL, '
+    'item_id TEXT NOT NULL, PRIMARY KEY (type, category_id, pos)) WITHOUT ROWID',
+    'CREATE INDEX IF NOT EXISTS list_items_item ON list_items (type, item_id)',
+    'CREATE INDEX IF NOT EXISTS items_added ON items (type, added)',
+)
+# Unchanged items (the same film written again by another category) are not rewritten
+_UPSERT_ITEM = ('INSERT INTO items (type, id, added, title_norm, data) VALUES (?, ?, ?, ?, ?) '
+                'ON CONFLICT (type, id) DO UPDATE SET added = excluded.added, title_norm = excluded.title_norm, '
+                'data = excluded.data WHERE items.data != excluded.data')
+_UPSERT_LIST_ITEM = ('INSERT INTO list_items (type, category_id, pos, item_id) VALUES (?, ?, ?, ?) '
+                     'ON CONFLICT (type, category_id, pos) DO UPDATE SET item_id = excluded.item_id '
+                     'WHERE list_items.item_id != excluded.item_id')
+_DELETE_ORPHAN = ('DELETE FROM items WHERE type = ? AND id = ? AND NOT EXISTS '
+                  '(SELECT 1 FROM list_items WHERE type = ? AND item_id = ?)')
+# Videos of one category in list order
+_SELECT_LIST = ('SELECT items.data FROM list_items JOIN items ON items.type = list_items.type '
+                'AND items.id = list_items.item_id WHERE list_items.type = ? AND list_items.category_id = ?')
+_UPSERT_CATEGORY = ('INSERT INTO categories (type, pos, id, title, data) VALUES (?, ?, ?, ?, ?) '
+                    'ON CONFLICT (type, pos) DO UPDATE SET id = excluded.id, title = excluded.title, '
+                    'data = excluded.data')
+_UPSERT_LIST = ('INSERT INTO lists (type, category_id, ts, count, fingerprint, page_items) VALUES (?, ?, ?, ?, ?, ?) '
+                'ON CONFLICT (type, category_id) DO UPDATE SET ts = excluded.ts, count = excluded.count, '
+                'fingerprint = excluded.fingerprint, page_items = excluded.page_items')
+
+_open = {}  # database path -> StalkerDb, kept for the lifetime of the interpreter
+_open_lock = threading.Lock()
+_generation = 0
+
+
+def get_db(cache_dir):
+    """The (shared) database of a cache folder"""
+    global _generation
+    path = os.path.join(cache_dir, DB_FILE)
+    with _open_lock:
+        db = _open.get(path)
+        if db is None:
+            _generation += 1
+            db = _open[path] = StalkerDb(path, _generation)
+        return db
+
+
+def close_db(cache_dir):
+    """Close the database of a cache folder if this process has it open (before the folder is deleted)"""
+    with _open_lock:
+        db = _open.pop(os.path.join(cache_dir, DB_FILE), None)
+    if db is not None:
+        db.close()
+
+
+def normalize_title(title):
+    """Lower case, single spaces: the form stored in items.title_norm"""
+    return ' '.join(str(title or '').casefold().split())
+
+
+def _fingerprint(rows, column):
+    """crc32 over the JSON of all rows (same rows, same fingerprint)"""
+    crc = 0
+    for row in rows:
+        crc = zlib.crc32(row[column].encode('utf-8'), crc)
+    return '{:08x}'.format(crc)
+
+
+def _json_array(rows):
+    """Parse rows of JSON objects as one array (one parse for the whole list)"""
+    return loads('[' + ','.join(row[0] for row in rows) + ']')
+
+
+def _item_key(video, data):
+    """Store key of an item: its portal id, a hash of its record for items without one"""
+    item_id = str(video.get('id') or '')
+    return item_id or '#' + hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def _items(rows):
+    """PortalItems of items rows (packed records)"""
+    return unpack_list(_json_array(rows))
+
+
+class StalkerDb:
+    """One SQLite connection per database, shared by all threads of the process"""
+
+    def __init__(self, path, generation):
+        self.path = path
+        self.generation = generation
+        self._lock = threading.RLock()
+        # Transactions are explicit (BEGIN/COMMIT), hence isolation_level=None
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._init_schema()
+
+    def _init_schema(self):
+        """Create the tables of a new database; one of another schema version is rebuilt"""
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] == _SCHEMA_VERSION:
+            return
+        with self._transaction():
+            # Only cached portal data: dropped and fetched again
+            tables = [row[0] for row in self._conn.execute(
+                "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+            for table in tables:
+                self._conn.execute('DROP TABLE {}'.format(table))
+            for statement in _SCHEMA:
+                self._conn.execute(statement)
+            self._conn.execute('PRAGMA user_version={}'.format(_SCHEMA_VERSION))
+
+    def close(self):
+        """Close the connection (close_db)"""
+        with self._lock:
+            self._conn.close()
+
+    def version(self):
+        """Changes whenever another connection (service, other process) has committed"""
+        with self._lock:
+            return self.generation, self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+    # ------------------------------------------------------------------
+    # Transactions
+    # ------------------------------------------------------------------
+
+    def _transaction(self):
+        return _Transaction(self)
+
+    # ------------------------------------------------------------------
+    # Lists
+    # ------------------------------------------------------------------
+
+    def list_ts(self, cat_type, cat_id=''):
+        """Store time of a category list ('') or video list, None if missing"""
+        with self._lock:
+            row = self._conn.execute('SELECT ts FROM lists WHERE type = ? AND category_id = ?',
+                                     (cat_type, str(cat_id))).fetchone()
+        return row[0] if row else None
+
+    def read_meta(self, cat_type, cat_id=''):
+        """{'ts', 'count', 'fingerprint', 'page_items'} of a stored list, None if missing"""
+        with self._lock:
+            row = self._conn.execute('SELECT ts, count, fingerprint, page_items FROM lists '
+                                     'WHERE type = ? AND category_id = ?', (cat_type, str(cat_id))).fetchone()
+        return {'ts': row[0], 'count': row[1], 'fingerprint': row[2], 'page_items': row[3]} if row else None
+
+    def read_categories(self, cat_type):
+        """(ts, categories, nbytes) or None"""
+        with self._lock:
+            ts = self.list_ts(cat_type)
+            if ts is None:
+                return None
+            rows = self._conn.execute('SELECT data FROM categories WHERE type = ? ORDER BY pos',
+                                      (cat_type,)).fetchall()
+        return ts, _json_array(rows), sum(len(row[0]) for row in rows)
+
+    def read_videos(self, cat_type, cat_id):
+        """(ts, videos, nbytes) or None"""
+        with self._lock:
+            ts = self.list_ts(cat_type, cat_id)
+            if ts is None:
+                return None
+            rows = self._conn.execute(_SELECT_LIST + ' ORDER BY list_items.pos', (cat_type, str(cat_id))).fetchall()
+        return ts, _items(rows), sum(len(row[0]) for row in rows)
+
+    def read_videos_range(self, cat_type, cat_id, start, stop):
+        """Videos start..stop-1 of one category (primary key range, no full read)"""
+        with self._lock:
+            rows = self._conn.execute(_SELECT_LIST + ' AND list_items.pos >= ? AND list_items.pos < ? '
+                                      'ORDER BY list_items.pos', (cat_type, str(cat_id), start, stop)).fetchall()
+        return _items(rows)
+
+    def count_videos(self, cat_type, cat_id):
+        """Number of stored videos of one category"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM list_items WHERE type = ? AND category_id = ?',
+                                      (cat_type, str(cat_id))).fetchone()[0]
+
+    def list_times(self, cat_type, cat_ids):
+        """{category_id: ts} of the stored video lists among cat_ids"""
+        wanted = {str(cat_id) for cat_id in cat_ids}
+        with self._lock:
+            rows = self._conn.execute("SELECT category_id, ts FROM lists WHERE type = ? AND category_id != ''",
+                                      (cat_type,)).fetchall()
+        return {cat_id: ts for cat_id, ts in rows if cat_id in wanted}
+
+    def search(self, cat_type, cat_ids, term):
+        """Videos of cat_ids whose title contains term (case-insensitive), category order, each video once.
+
+        A substring match (LIKE '%term%') cannot use a B-tree index: it scans
+        the short title_norm column of the items (some 100 ms for 100k items).
+        """
+        order = {str(cat_id): idx for idx, cat_id in enumerate(cat_ids)}
+        pattern = '%{}%'.format(normalize_title(term).replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_'))
+        with self._lock:
+            rows = self._conn.execute("SELECT list_items.category_id, list_items.pos, items.id, items.data "
+                                      "FROM items JOIN list_items ON list_items.type = items.type "
+                                      "AND list_items.item_id = items.id WHERE items.type = ? "
+                                      "AND items.title_norm LIKE ? ESCAPE '\\'", (cat_type, pattern)).fetchall()
+        rows = sorted((row for row in rows if row[0] in order), key=lambda row: (order[row[0]], row[1]))
+        seen = set()
+        unique = []
+        for row in rows:
+            if row[2] not in seen:
+                seen.add(row[2])
+                unique.append((row[3],))
+        return _items(unique)
+
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+
+    def write_categories(self, cat_type, categories):
+        """Replace the category list of cat_type; returns (ts, stored JSON size)"""
+        now = time.time()
+        rows = [(cat_type, pos, str(cat.get('id', '')), cat.get('title'), json.dumps(cat))
+                for pos, cat in enumerate(categories)]
+        with self._transaction():
+            self._conn.execute('DELETE FROM categories WHERE type = ? AND pos >= ?', (cat_type, len(rows)))
+            self._conn.executemany(_UPSERT_CATEGORY, rows)
+            self._conn.execute(_UPSERT_LIST, (cat_type, '', now, len(rows), _fingerprint(rows, 4), None))
+        return now, sum(len(row[4]) for row in rows)
+
+    def write_videos(self, cat_type, cat_id, videos, page_items=None):
+        """Replace the video list of one category; returns (ts, stored JSON size)"""
+        now = time.time()
+        cat_id = str(cat_id)
+        items = {}
+        refs = []
+        for pos, video in enumerate(videos):
+            data = dumps(pack(video), large=True).decode('utf-8')
+            key = _item_key(video, data)
+            items[key] = (cat_type, key, video.get('added'), normalize_title(video.get('name')), data)
+            refs.append((cat_type, cat_id, pos, key, data))
+        with self._transaction():
+            previous = {row[0] for row in self._conn.execute(
+                'SELECT item_id FROM list_items WHERE type = ? AND category_id = ?', (cat_type, cat_id))}
+            self._conn.execute('DELETE FROM list_items WHERE type = ? AND category_id = ? AND pos >= ?',
+                               (cat_type, cat_id, len(refs)))
+            self._conn.executemany(_UPSERT_LIST_ITEM, [ref[:4] for ref in refs])
+            self._conn.executemany(_UPSERT_ITEM, items.values())
+            # Items that left this list and are not listed anywhere else
+            self._conn.executemany(_DELETE_ORPHAN, [(cat_type, key, cat_type, key)
+                                                    for key in previous.difference(items)])
+            self._conn.execute(_UPSERT_LIST, (cat_type, cat_id, now, len(refs), _fingerprint(refs, 4),
+                                              int(page_items) if page_items else None))
+        return now, sum(len(ref[4]) for ref in refs)
+
+    def list_count(self):
+        """Number of stored lists (category lists and video lists)"""
+        with self._lock:
+            return self._conn.execute('SELECT COUNT(*) FROM lists').fetchone()[0]
+
+    def clear(self):
+        """Delete all cached lists (portal changed, cache cleared)"""
+        with self._transaction():
+            for table in ('lists', 'categories', 'list_items', 'items'):
+                self._conn.execute('DELETE FROM {}'.format(table))
+
+    # ------------------------------------------------------------------
+    # Statistics
+    # ------------------------------------------------------------------
+
+    def info(self):
+        """Counts, age and size for the cache info dialog"""
+        with self._lock:
+            categories = self._conn.execute('SELECT COUNT(*) FROM categories').fetchone()[0]
+            videos = self._conn.execute('SELECT COUNT(*) FROM items').fetchone()[0]
+            oldest, newest, lists = self._conn.execute('SELECT MIN(ts), MAX(ts), COUNT(*) FROM lists').fetchone()
+        size = 0
+        for suffix in ('', '-wal'):
+            try:
+                size += os.path.getsize(self.path + suffix)
+            except OSError:
+                pass
+        return {'lists': lists, 'categories': categories, 'videos': videos,
+                'oldest': oldest, 'newest': newest, 'bytes': size}
+
+
+class _Transaction:
+    """BEGIN/COMMIT around one write"""
+    __slots__ = ('db',)
+
+    def __init__(self, db):
+        self.db = db
+
+    def __enter__(self):
+        self.db._lock.acquire()  # pylint: disable=protected-access
+        try:
+            self.db._conn.execute('BEGIN IMMEDIATE')  # pylint: disable=protected-access
+        except BaseException:
+            self.db._lock.release()  # pylint: disable=protected-access
+            raise
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        try:
+            self.db._conn.execute('ROLLBACK' if exc_type else 'COMMIT')  # pylint: disable=protected-access
+        finally:
+            self.db._lock.release()  # pylint: disable=protected-access
+        return False
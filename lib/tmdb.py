@@ -5,14 +5,14 @@ Compatible with TMDb Helper addon (sets tmdb unique ID on ListItems).
 """
 from __future__ import absolute_import, division, unicode_literals
 
-import json
 import os
 import time
 
-import requests
-import xbmcvfs
-
+from . import codec, fileio
 from .loggers import Logger
+from .metrics import timed
+from .request_stats import traced_get
+from .utils import get_file_stamp
 
 TMDB_API_BASE = 'https://api.themoviedb.org/3'
 TMDB_IMAGE_BASE = 'https://image.tmdb.org/t/p/w500'
@@ -56,6 +56,7 @@ class TmdbClient:
         self.__cache_path = None
         self.__cache = {}
         self.__cache_loaded = False
+        self.__cache_stamp = None  # (mtime, size) of the cache file as loaded/written
         self._request_times = []   # timestamps of recent requests (rate limiter)
         self._consecutive_429 = 0  # counts 429 responses in a row
         self._aborted = False      # True after rate-limit abort – all calls become no-ops
@@ -68,6 +69,19 @@ class TmdbClient:
             self.__cache = self.__load_cache()
             self.__cache_loaded = True
 
+    def revalidate(self):
+        """Prepare a client kept from an earlier plugin call for the next one.
+
+        Clears the rate-limit abort of the last call and reloads the cache
+        if the file was rewritten or deleted by someone else since (other
+        interpreter, "clear TMDB cache").
+        """
+        self._aborted = False
+        self._consecutive_429 = 0
+        if self.__cache_loaded and get_file_stamp(self.__cache_path) != self.__cache_stamp:
+            Logger.debug('TMDB cache changed on disk, reloading')
+            self.__cache = self.__load_cache()
+
     # ------------------------------------------------------------------
     # Public API
     # ------------------------------------------------------------------
@@ -167,6 +181,7 @@ class TmdbClient:
     # Private HTTP with rate limiting and 429 guard
     # ------------------------------------------------------------------
 
+    @timed('tmdb')
     def __get(self, url, params, timeout=5):
         """Centralized HTTP GET.
 
@@ -183,11 +198,11 @@ class TmdbClient:
         if len(self._request_times) >= self._RATE_MAX:
             wait = self._RATE_WINDOW - (now - self._request_times[0]) + 0.1
             if wait > 0:
-                Logger.debug('TMDB rate throttle: waiting {:.1f}s'.format(wait))
+                Logger.debug('TMDB rate throttle: waiting {:.1f}s', wait)
                 time.sleep(wait)
 
         try:
-            response = requests.get(url, params=params, timeout=timeout)
+            response = traced_get('tmdb', url=url, params=params, timeout=timeout)
             self._request_times.append(time.time())
 
             if response.status_code == 200:
@@ -415,6 +430,7 @@ class TmdbClient:
         """Store data (or None for negative result) in memory only. Call flush() to persist."""
         self.__cache[key] = {'data': data, 'ts': time.time()}
 
+    @timed('cache')
     def __load_cache(self):
         """Load JSON cache from disk and prune expired entries.
 
@@ -423,12 +439,11 @@ class TmdbClient:
         (never expire) no pruning takes place.
         """
         cache = {}
+        self.__cache_stamp = get_file_stamp(self.__cache_path)
         try:
-            if xbmcvfs.exists(self.__cache_path):
-                with xbmcvfs.File(self.__cache_path, 'r') as fh:
-                    content = fh.read()
-                    if content:
-                        cache = json.loads(content)
+            content = fileio.read(self.__cache_path)
+            if content:
+                cache = codec.loads(content)
         except Exception as exc:
             Logger.warn('TMDB cache load failed: {}'.format(exc))
             return {}
@@ -442,14 +457,15 @@ class TmdbClient:
             for k in expired:
                 del cache[k]
             if expired:
-                Logger.debug('TMDB cache: {} abgelaufene Eintraege entfernt'.format(len(expired)))
+                Logger.debug('TMDB cache: {} abgelaufene Eintraege entfernt', len(expired))
 
         return cache
 
+    @timed('cache')
     def __persist_cache(self):
         """Write cache to disk"""
         try:
-            with xbmcvfs.File(self.__cache_path, 'w') as fh:
-                fh.write(json.dumps(self.__cache))
+            fileio.write(self.__cache_path, codec.encode(self.__cache))
+            self.__cache_stamp = get_file_stamp(self.__cache_path)
         except Exception as exc:
             Logger.warn('TMDB cache save failed: {}'.format(exc))
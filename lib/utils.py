@@ -1,12 +1,10 @@
 """Utility classes and methods"""
 from __future__ import absolute_import, division, unicode_literals
+import os
 import xbmc
 import xbmcgui
-import xbmcaddon
 from .loggers import Logger
 
-__addon__ = xbmcaddon.Addon()
-
 
 def ask_for_input(category):
     """Input dialog box"""
@@ -47,6 +45,20 @@ def get_int_value(dictionary, key):
     return 0
 
 
+def get_file_stamp(path):
+    """(mtime_ns, size) of a file, None if it does not exist.
+
+    Kodi keeps the interpreter between navigations, so parsed files can be
+    kept in memory; a changed stamp means another call or the service has
+    rewritten (or deleted) the file since.
+    """
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
 def get_next_info_and_send_signal(params, next_episode_url):
     """Send a signal to Kodi using JSON RPC"""
     next_info = get_next_info(params, next_episode_url)
@@ -71,7 +83,7 @@ def notify(sender, message, data):
     if result.get('result') != 'OK':
         Logger.warn('Failed to send notification: ' + result.get('error').get('message'))
         return False
-    Logger.debug('Notification sent to upnext')
+    Logger.debug('Notification {} sent', message)
     return True
 
 
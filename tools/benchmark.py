@@ -0,0 +1,629 @@
+"""
+Performance benchmark suite for the listing, cache and filter hot paths.
+
+Every scenario runs headless (tools/harness.py) against synthetic catalogs
+of 1k, 10k and 100k items.  Each (scenario, size) pair is measured in a
+fresh interpreter so the first call is a true cold start; further calls in
+the same process are the warm numbers.  Peak memory is taken in a separate
+tracemalloc run so it does not distort the timings.
+
+Scenarios:
+  main_menu             route '', series categories from the Stalker cache (the cold
+                        call fills it with one portal categories call)
+  vod_listing_cache     route vod_listing, all items from the Stalker cache
+  vod_listing_portal    route vod_listing, empty cache, pages from the mock portal
+  vod_listing_cache_paged  route vod_listing, page_size 2, a page from the middle of the cached list
+  series_listing_cache  route series_listing from the Stalker cache
+  stalker_cache_read    StalkerCache.get_videos of one category
+  stalker_cache_read_sqlite  the same with the SQLite backend (cache_backend=1)
+  tmdb_cache_load       TmdbClient cache load with one entry per item
+  filter_collect        StalkerAddon.__collect_filter_data over all categories
+  filter_collect_sqlite the same with the SQLite backend
+  startup               import lib.addon + G.init_globals in a fresh interpreter
+
+Usage:
+  python -m tools.benchmark                                # all scenarios, 1k/10k/100k
+  python -m tools.benchmark --sizes 1000 10000 --scenario vod_listing_cache
+  python -m tools.benchmark --output bench-results/today.json
+  python -m tools.benchmark --compare bench-results/old.json bench-results/new.json
+  python -m tools.benchmark --codecs --sizes 10000        # JSON / orjson / msgpack on the cache payloads
+
+  # performance budget: fail (exit 1) when an operation of the baseline regresses
+  python -m tools.benchmark --check tools/perf_baseline.json [--tolerance 0.3]
+  python -m tools.benchmark --check tools/perf_baseline.json --update-baseline
+
+Results are written as JSON (one record per scenario and size) so runs can
+be compared with --compare.  The baseline file lists the budgeted
+operations; timings and peak memory may grow by at most the tolerance (and
+a small absolute slack against timer noise), request and file read counts
+may not grow at all.  Timings are machine specific: refresh the baseline
+with --update-baseline when moving to another machine.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from tools.harness import ROOT_DIR, Harness
+from tools.mock_portal import CatalogConfig, MockPortal, SyntheticCatalog
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+RESULT_DIR = os.path.join(ROOT_DIR, 'bench-results')
+
+
+class BenchContext:
+    """Fresh fake Kodi home + mock portal for one scenario run"""
+
+    def __init__(self, size, vod_categories=1, max_page_items=1000, settings=None):
+        self.size = size
+        self.home = tempfile.mkdtemp(prefix='bench-home-')
+        self.catalog_config = CatalogConfig(vod_categories=vod_categories, vod_items=size,
+                                            series_categories=vod_categories, series_items=size,
+                                            max_page_items=max_page_items, description_len=200)
+        self.portal = MockPortal(self.catalog_config).start()
+        merged = {'server_address': self.portal.url, 'page_size': '9999'}
+        merged.update(settings or {})
+        self.harness = Harness(home=self.home, settings=merged)
+        self.catalog = SyntheticCatalog(self.catalog_config)
+
+    @property
+    def profile(self):
+        """Add-on profile directory"""
+        return self.harness.profile
+
+    def init_globals(self):
+        """Initialise lib.globals.G the way run() does, for direct function benchmarks"""
+        # pylint: disable=import-outside-toplevel
+        from lib import addon
+        from lib.globals import G
+        from lib.stalker_cache import set_backend
+        sys.argv = ['plugin://plugin.video.stalkervod.tmdb/', '1', '']
+        G.init_globals()
+        set_backend(G.addon_config.cache_backend)
+        addon._build_lang_tag_pattern()  # pylint: disable=protected-access
+        return G
+
+    def category_ids(self, cat_type):
+        """Portal category ids of the synthetic catalog"""
+        return [c['id'] for c in self.catalog.categories(cat_type) if c['id'] != '*']
+
+    def items(self, cat_type, cat_id):
+        """Synthetic portal items of one category"""
+        start, stop = self.catalog.category_range(cat_type, cat_id)
+        return [self.catalog.item(cat_type, idx, cat_id) for idx in range(start, stop)]
+
+    def fill_stalker_cache(self, cat_type):
+        """Write categories and all video lists to the Stalker cache"""
+        from lib.stalker_cache import StalkerCache  # pylint: disable=import-outside-toplevel
+        glob = self.init_globals()
+        cache = StalkerCache(glob.addon_config.cache_path, cache_days=glob.addon_config.stalker_cache_days)
+        cache.set_categories(cat_type, self.catalog.categories(cat_type))
+        for cat_id in self.category_ids(cat_type):
+            cache.set_videos(cat_type, cat_id, self.items(cat_type, cat_id))
+        return cache
+
+    def fill_tmdb_cache(self, cat_type):
+        """Write one TMDB cache entry per item (10% negative entries)"""
+        # pylint: disable=import-outside-toplevel,protected-access
+        from lib import addon
+        from lib.tmdb import TmdbClient
+        self.init_globals()
+        client = TmdbClient('bench', 'de-DE', 30)
+        client._TmdbClient__ensure_cache_path()
+        media = 'tv' if cat_type == 'series' else 'movie'
+        for cat_id in self.category_ids(cat_type):
+            for idx, video in enumerate(self.items(cat_type, cat_id)):
+                name = addon._clean_lang_tags(video['name'])
+                year = int(video['year'])
+                key = client._TmdbClient__make_key(name, year, media)
+                client._TmdbClient__to_cache(key, _tmdb_info(idx, name, year, media))
+        client.flush()
+
+    def close(self):
+        """Stop the portal and remove the fake home"""
+        self.harness.close()
+        self.portal.stop()
+        shutil.rmtree(self.home, ignore_errors=True)
+
+
+def _tmdb_info(idx, name, year, media):
+    """Synthetic TMDB cache entry (every 10th title has no match)"""
+    if idx % 10 == 9:
+        return None
+    return {'tmdb_id': str(idx), 'title': name, 'plot': 'Plot of ' + name, 'year': year,
+            'rating': 4.0 + (idx % 55) / 10.0, 'votes': idx, 'poster': 'https://img/p/{}.jpg'.format(idx),
+            'fanart': 'https://img/b/{}.jpg'.format(idx), 'genres': ['Drama', 'Action'][:1 + idx % 2],
+            'media_type': 'movie' if media == 'movie' else 'tvshow'}
+
+
+def _listing_url(action, cat_id, page=1):
+    return '?action={}&category=Bench&category_id={}&page={}&update_listing=False'.format(action, cat_id, page)
+
+
+def _invocation_calls(result):
+    calls = {'portal_requests': result.portal_calls, 'tmdb_requests': result.tmdb_calls,
+             'items': result.items}
+    for key in ('ListItem', 'InfoTagVideo.setTitle', 'ListItem.setArt', 'file.read', 'file.write',
+                'xbmcaddon.getSetting'):
+        calls[key] = result.setter_calls.get(key, 0)
+    if result.error:
+        raise RuntimeError(result.error)
+    return calls
+
+
+class Scenario:
+    """Base class: setup() once, then run() is timed (cold first, warm after)"""
+    name = None
+    sized = True
+    context_args = {}
+
+    def setup(self, ctx):
+        """Prepare data (not timed)"""
+
+    def run(self, ctx):
+        """Timed body; returns a dict of call counts ('elapsed_ms' overrides the measured time)"""
+        raise NotImplementedError
+
+
+class MainMenu(Scenario):
+    """Main menu render"""
+    name = 'main_menu'
+    sized = False
+
+    def run(self, ctx):
+        return _invocation_calls(ctx.harness.invoke(''))
+
+
+class VodListingCache(Scenario):
+    """vod_listing served from the Stalker cache"""
+    name = 'vod_listing_cache'
+
+    def setup(self, ctx):
+        ctx.fill_stalker_cache('vod')
+
+    def run(self, ctx):
+        return _invocation_calls(ctx.harness.invoke(_listing_url('vod_listing', ctx.category_ids('vod')[0])))
+
+
+class VodListingCachePaged(Scenario):
+    """vod_listing with page_size 2: one page read from the middle of the cached list"""
+    name = 'vod_listing_cache_paged'
+    context_args = {'settings': {'page_size': '2'}}
+
+    def setup(self, ctx):
+        ctx.fill_stalker_cache('vod')
+
+    def run(self, ctx):
+        page = max(1, ctx.size // 40)
+        return _invocation_calls(ctx.harness.invoke(_listing_url('vod_listing', ctx.category_ids('vod')[0], page)))
+
+
+class VodListingPortal(Scenario):
+    """vod_listing with an empty cache (every page from the portal)"""
+    name = 'vod_listing_portal'
+
+    def run(self, ctx):
+        return _invocation_calls(ctx.harness.invoke(_listing_url('vod_listing', ctx.category_ids('vod')[0])))
+
+
+class SeriesListingCache(Scenario):
+    """series_listing served from the Stalker cache"""
+    name = 'series_listing_cache'
+
+    def setup(self, ctx):
+        ctx.fill_stalker_cache('series')
+
+    def run(self, ctx):
+        return _invocation_calls(ctx.harness.invoke(_listing_url('series_listing', ctx.category_ids('series')[0])))
+
+
+class StalkerCacheRead(Scenario):
+    """StalkerCache.get_videos of one category"""
+    name = 'stalker_cache_read'
+
+    def setup(self, ctx):
+        ctx.fill_stalker_cache('vod')
+        ctx.init_globals()
+
+    def run(self, ctx):
+        # pylint: disable=import-outside-toplevel
+        from lib.globals import G
+        from lib.stalker_cache import StalkerCache
+        ctx.harness.reset_calls()
+        cache = StalkerCache(G.addon_config.cache_path, cache_days=G.addon_config.stalker_cache_days)
+        videos = cache.get_videos('vod', ctx.category_ids('vod')[0])
+        calls = ctx.harness.file_calls()
+        calls['items'] = len(videos or [])
+        return calls
+
+
+class StalkerCacheReadSqlite(StalkerCacheRead):
+    """StalkerCache.get_videos of one category from stalker_cache.db"""
+    name = 'stalker_cache_read_sqlite'
+    context_args = {'settings': {'cache_backend': '1'}}
+
+
+class TmdbCacheLoad(Scenario):
+    """TmdbClient cache load (first access of a new client)"""
+    name = 'tmdb_cache_load'
+
+    def setup(self, ctx):
+        ctx.fill_tmdb_cache('vod')
+
+    def run(self, ctx):
+        # pylint: disable=import-outside-toplevel,protected-access
+        from lib.tmdb import TmdbClient
+        ctx.init_globals()
+        ctx.harness.reset_calls()
+        client = TmdbClient('bench', 'de-DE', 30)
+        client._TmdbClient__ensure_cache_path()
+        calls = ctx.harness.file_calls()
+        calls['entries'] = len(client._TmdbClient__cache)
+        return calls
+
+
+class FilterCollect(Scenario):
+    """__collect_filter_data over all visible categories"""
+    name = 'filter_collect'
+    context_args = {'vod_categories': 20, 'settings': {'tmdb_enabled': 'true', 'tmdb_api_key': 'bench'}}
+
+    def setup(self, ctx):
+        ctx.fill_stalker_cache('vod')
+        ctx.fill_tmdb_cache('vod')
+
+    def run(self, ctx):
+        # pylint: disable=import-outside-toplevel,protected-access
+        from lib import addon
+        ctx.init_globals()
+        addon._tmdb_client_singleton = None
+        ctx.harness.reset_calls()
+        result = addon.StalkerAddon()._StalkerAddon__collect_filter_data('vod')
+        calls = ctx.harness.file_calls()
+        calls['matched'] = len(result[0])
+        return calls
+
+
+class FilterCollectSqlite(FilterCollect):
+    """__collect_filter_data with the video lists in stalker_cache.db"""
+    name = 'filter_collect_sqlite'
+    context_args = {'vod_categories': 20, 'settings': {'tmdb_enabled': 'true', 'tmdb_api_key': 'bench',
+                                                       'cache_backend': '1'}}
+
+
+class Startup(Scenario):
+    """Plugin import and G.init_globals, each run in a new interpreter (timed inside the child)"""
+    name = 'startup'
+    sized = False
+
+    def run(self, ctx):
+        proc = subprocess.run([sys.executable, '-m', 'tools.benchmark', '--startup-probe', ctx.home],
+                              cwd=ROOT_DIR, capture_output=True, text=True, check=True)
+        return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def startup_probe(home):
+    """Child side of the startup scenario: times the imports of a real invocation"""
+    from tools.harness import install_stubs  # pylint: disable=import-outside-toplevel
+    install_stubs().configure(home=home)
+    sys.argv = ['plugin://plugin.video.stalkervod.tmdb/', '1', '']
+    start = time.perf_counter()
+    from lib import addon  # pylint: disable=import-outside-toplevel
+    imported = time.perf_counter()
+    addon.G.init_globals()
+    done = time.perf_counter()
+    return {'elapsed_ms': (done - start) * 1000.0, 'import_ms': round((imported - start) * 1000.0, 2),
+            'init_ms': round((done - imported) * 1000.0, 2), 'modules': len(sys.modules)}
+
+
+SCENARIOS = {cls.name: cls for cls in (MainMenu, VodListingCache, VodListingCachePaged, VodListingPortal, SeriesListingCache,
+                                       StalkerCacheRead, StalkerCacheReadSqlite, TmdbCacheLoad, FilterCollect,
+                                       FilterCollectSqlite, Startup)}
+
+
+# ----------------------------------------------------------------------
+# Worker: runs one (scenario, size) in this process
+# ----------------------------------------------------------------------
+
+def run_worker(name, size, repeats, memory):
+    """Measure one scenario in the current (fresh) process; returns a result dict"""
+    scenario = SCENARIOS[name]()
+    ctx = BenchContext(size, **scenario.context_args)
+    try:
+        scenario.setup(ctx)
+        if memory:
+            tracemalloc.start()
+            scenario.run(ctx)
+            cold_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.reset_peak()
+            scenario.run(ctx)
+            warm_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            return {'cold_peak_kb': cold_peak // 1024, 'warm_peak_kb': warm_peak // 1024}
+        cold_ms, cold_calls = _timed(scenario, ctx)
+        warm = []
+        warm_calls = cold_calls
+        for _ in range(repeats):
+            elapsed, warm_calls = _timed(scenario, ctx)
+            warm.append(elapsed)
+        warm.sort()
+        return {'cold_ms': round(cold_ms, 2),
+                'warm_ms': round(warm[len(warm) // 2], 2) if warm else None,
+                'warm_min_ms': round(warm[0], 2) if warm else None,
+                'warm_max_ms': round(warm[-1], 2) if warm else None,
+                'cold_calls': cold_calls, 'warm_calls': warm_calls}
+    finally:
+        ctx.close()
+
+
+def _timed(scenario, ctx):
+    start = time.perf_counter()
+    calls = scenario.run(ctx)
+    elapsed = (time.perf_counter() - start) * 1000.0
+    return calls.pop('elapsed_ms', elapsed), calls
+
+
+def _spawn_worker(name, size, repeats, memory, timeout):
+    cmd = [sys.executable, '-m', 'tools.benchmark', '--worker', name, '--size', str(size),
+           '--repeats', str(repeats)]
+    if memory:
+        cmd.append('--memory')
+    proc = subprocess.run(cmd, cwd=ROOT_DIR, capture_output=True, text=True, timeout=timeout, check=False)
+    if proc.returncode != 0:
+        return {'error': (proc.stderr or proc.stdout).strip().splitlines()[-1:]}
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def measure(name, size, repeats=3, timeout=1800):
+    """Timing run + memory run for one scenario and size, each in a fresh interpreter"""
+    record = {'scenario': name, 'size': size}
+    record.update(_spawn_worker(name, size, repeats, False, timeout))
+    if 'error' not in record:
+        memory = _spawn_worker(name, size, 1, True, timeout)
+        record.update(memory)
+    return record
+
+
+# ----------------------------------------------------------------------
+# Codec comparison (lib/codec.py)
+# ----------------------------------------------------------------------
+
+def codec_payloads(size):
+    """The large cache payloads of a size item catalog: packed Stalker records and the TMDB cache"""
+    from lib import portal_items  # pylint: disable=import-outside-toplevel
+    catalog = SyntheticCatalog(CatalogConfig(vod_items=size, description_len=200))
+    cat_id = next(c['id'] for c in catalog.categories('vod') if c['id'] != '*')
+    items = [catalog.item('vod', idx, cat_id) for idx in range(size)]
+    records, _ = portal_items.pack_list(items)
+    tmdb_cache = {}
+    for idx, item in enumerate(items):
+        info = _tmdb_info(idx, item['name'], int(item['year']), 'movie')
+        tmdb_cache['movie:{}:{}'.format(item['name'].lower(), item['year'])] = {'data': info, 'ts': time.time()}
+    return {'stalker': records, 'tmdb': tmdb_cache}
+
+
+def _codec_candidates():
+    """(name, encode, decode) of the stdlib json module and the optional faster codecs"""
+    candidates = [('json', lambda obj: json.dumps(obj, separators=(',', ':')).encode('utf-8'), json.loads)]
+    try:
+        import orjson  # pylint: disable=import-outside-toplevel
+        candidates.append(('orjson', orjson.dumps, orjson.loads))
+    except ImportError:
+        pass
+    try:
+        import msgpack  # pylint: disable=import-outside-toplevel
+        candidates.append(('msgpack', lambda obj: msgpack.packb(obj, use_bin_type=True),
+                           lambda data: msgpack.unpackb(data, raw=False)))
+    except ImportError:
+        pass
+    return candidates
+
+
+def _best_ms(func, arg, repeats=3):
+    best = None
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = func(arg)
+        elapsed = (time.perf_counter() - start) * 1000.0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def codec_report(sizes, stream=sys.stdout):
+    """Size, encode and decode time of every available codec per payload (best of 3)"""
+    candidates = _codec_candidates()
+    stream.write('{:<8} {:>7} {:<8} {:>11} {:>10} {:>10}\n'.format('payload', 'size', 'codec', 'bytes',
+                                                                   'encode ms', 'decode ms'))
+    for size in sizes:
+        for payload, obj in codec_payloads(size).items():
+            for name, encode, decode in candidates:
+                encode_ms, data = _best_ms(encode, obj)
+                decode_ms, _ = _best_ms(decode, data)
+                stream.write('{:<8} {:>7} {:<8} {:>11} {:>10.1f} {:>10.1f}\n'.format(
+                    payload, size, name, len(data), encode_ms, decode_ms))
+    if len(candidates) < 3:
+        stream.write('(orjson / msgpack not installed: only the available codecs are listed)\n')
+
+
+def environment():
+    """Machine and revision info stored with every result file"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR, capture_output=True,
+                                  text=True, check=False).stdout.strip()
+    except OSError:
+        revision = ''
+    return {'python': platform.python_version(), 'platform': platform.platform(),
+            'machine': platform.machine(), 'revision': revision,
+            'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+
+def run_suite(scenarios, sizes, repeats, stream=sys.stdout):
+    """Run all requested scenarios; returns the result document"""
+    results = []
+    for name in scenarios:
+        for size in (sizes if SCENARIOS[name].sized else (0,)):
+            record = measure(name, size, repeats)
+            results.append(record)
+            stream.write(format_record(record) + '\n')
+            stream.flush()
+    return {'environment': environment(), 'results': results}
+
+
+def format_record(record):
+    """One line per result"""
+    if 'error' in record:
+        return '{:<22} {:>7}  ERROR {}'.format(record['scenario'], record['size'], record['error'])
+    return '{:<22} {:>7}  cold {:>10.1f} ms  warm {:>10.1f} ms  peak {:>9} KB'.format(
+        record['scenario'], record['size'], record['cold_ms'], record['warm_ms'] or 0.0,
+        record.get('cold_peak_kb', 0))
+
+
+def compare(old_doc, new_doc, stream=sys.stdout):
+    """Print per scenario/size deltas between two result files"""
+    old = {(r['scenario'], r['size']): r for r in old_doc['results'] if 'error' not in r}
+    stream.write('{:<22} {:>7}  {:>22}  {:>22}  {:>20}\n'.format('scenario', 'size', 'cold ms (old->new)',
+                                                                 'warm ms (old->new)', 'peak KB (old->new)'))
+    for rec in new_doc['results']:
+        prev = old.get((rec['scenario'], rec['size']))
+        if prev is None or 'error' in rec:
+            continue
+        stream.write('{:<22} {:>7}  {:>22}  {:>22}  {:>20}\n'.format(
+            rec['scenario'], rec['size'],
+            _delta(prev['cold_ms'], rec['cold_ms']), _delta(prev['warm_ms'], rec['warm_ms']),
+            _delta(prev.get('cold_peak_kb'), rec.get('cold_peak_kb'))))
+
+
+def _delta(old, new):
+    if not old or new is None:
+        return '{} -> {}'.format(old, new)
+    return '{:.0f} -> {:.0f} ({:+.0f}%)'.format(old, new, (new - old) * 100.0 / old)
+
+
+# ----------------------------------------------------------------------
+# Performance budget
+# ----------------------------------------------------------------------
+
+# Metrics compared against the baseline: timings/memory within tolerance,
+# counters must not grow.  The fastest warm run is the least noisy timing;
+# cold_ms is a single sample and only recorded.
+BUDGET_METRICS = ('warm_min_ms', 'cold_peak_kb')
+BUDGET_COUNTERS = ('portal_requests', 'tmdb_requests', 'file.read')
+ABSOLUTE_SLACK = {'warm_min_ms': 5.0, 'cold_peak_kb': 256}
+
+
+def check_budget(baseline, results, tolerance):
+    """Return a list of human readable budget violations (empty = pass)"""
+    current = {(r['scenario'], r['size']): r for r in results}
+    violations = []
+    for op in baseline['operations']:
+        key = (op['scenario'], op['size'])
+        rec = current.get(key)
+        label = '{} @ {}'.format(*key)
+        if rec is None or 'error' in rec:
+            violations.append('{}: no result ({})'.format(label, rec.get('error') if rec else 'not run'))
+            continue
+        for metric in BUDGET_METRICS:
+            allowed = op.get(metric)
+            if allowed is None or rec.get(metric) is None:
+                continue
+            limit = max(allowed * (1.0 + tolerance), allowed + ABSOLUTE_SLACK[metric])
+            if rec[metric] > limit:
+                violations.append('{}: {} {} > budget {:.1f} (baseline {})'.format(
+                    label, metric, rec[metric], limit, allowed))
+        for counter in BUDGET_COUNTERS:
+            allowed = op.get('calls', {}).get(counter)
+            value = (rec.get('warm_calls') or {}).get(counter)
+            if allowed is not None and value is not None and value > allowed:
+                violations.append('{}: {} {} > baseline {}'.format(label, counter, value, allowed))
+    return violations
+
+
+def baseline_from_results(results, tolerance):
+    """Build a baseline document from a run"""
+    operations = []
+    for rec in results:
+        if 'error' in rec:
+            continue
+        op = {'scenario': rec['scenario'], 'size': rec['size']}
+        op.update({metric: rec.get(metric) for metric in ('cold_ms', 'warm_ms') + BUDGET_METRICS})
+        calls = rec.get('warm_calls') or {}
+        op['calls'] = {counter: calls[counter] for counter in BUDGET_COUNTERS if counter in calls}
+        operations.append(op)
+    return {'tolerance': tolerance, 'environment': environment(), 'operations': operations}
+
+
+def run_check(path, tolerance, repeats, update):
+    """--check mode: run the baseline operations and compare"""
+    with open(path, encoding='utf-8') as fh:
+        baseline = json.load(fh)
+    tolerance = baseline.get('tolerance', 0.25) if tolerance is None else tolerance
+    results = []
+    for op in baseline['operations']:
+        record = measure(op['scenario'], op['size'], repeats)
+        results.append(record)
+        print(format_record(record))
+    if update:
+        with open(path, 'w', encoding='utf-8') as fh:
+            json.dump(baseline_from_results(results, tolerance), fh, indent=2)
+            fh.write('\n')
+        print('Baseline updated: {}'.format(path))
+        return 0
+    violations = check_budget(baseline, results, tolerance)
+    for violation in violations:
+        print('BUDGET EXCEEDED: ' + violation)
+    print('Performance budget {} (tolerance {:.0%})'.format('FAILED' if violations else 'ok', tolerance))
+    return 1 if violations else 0
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Benchmark listing, cache and filter hot paths')
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS), help='default: all')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES))
+    parser.add_argument('--repeats', type=int, help='warm runs per scenario (default: 3, 5 with --check)')
+    parser.add_argument('--output', help='result file (default: bench-results/<timestamp>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='compare two result files')
+    parser.add_argument('--check', metavar='BASELINE', help='run the baseline operations and enforce the budget')
+    parser.add_argument('--tolerance', type=float, help='allowed relative regression (default: from baseline)')
+    parser.add_argument('--update-baseline', action='store_true', help='with --check: rewrite the baseline')
+    parser.add_argument('--codecs', action='store_true', help='compare the cache codecs on --sizes and exit')
+    parser.add_argument('--worker', help=argparse.SUPPRESS)
+    parser.add_argument('--startup-probe', help=argparse.SUPPRESS)
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--memory', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.startup_probe:
+        print(json.dumps(startup_probe(args.startup_probe)))
+        return 0
+    if args.worker:
+        print(json.dumps(run_worker(args.worker, args.size, args.repeats or 0, args.memory)))
+        return 0
+    if args.check:
+        return run_check(args.check, args.tolerance, args.repeats or 5, args.update_baseline)
+    if args.codecs:
+        codec_report(args.sizes)
+        return 0
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as old, open(args.compare[1], encoding='utf-8') as new:
+            compare(json.load(old), json.load(new))
+        return 0
+
+    doc = run_suite(args.scenario or list(SCENARIOS), args.sizes, args.repeats or 3)
+    output = args.output or os.path.join(RESULT_DIR, time.strftime('%Y%m%d-%H%M%S') + '.json')
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as fh:
+        json.dump(doc, fh, indent=2)
+    print('Results written to {}'.format(output))
+    return 1 if any('error' in r for r in doc['results']) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
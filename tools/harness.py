@@ -0,0 +1,300 @@
+"""
+Headless CLI harness: drives ``StalkerAddon.router`` outside Kodi.
+
+The Kodi modules are replaced by the recording stubs in tools/kodi_stubs,
+so any plugin URL can be run (and profiled) on a plain Linux box.  Every
+invocation reports wall time, outbound portal/TMDB requests, directory
+item counts and the ListItem/InfoTagVideo setter calls it made.
+
+Examples:
+  # against a local mock portal with 10k VOD items, all items on one page
+  python -m tools.harness --mock-portal --vod-items 10000 --setting page_size=9999 \\
+      'plugin://plugin.video.stalkervod.tmdb/?action=vod_listing&category=X&category_id=1000&page=1&update_listing=False'
+
+  # warm process: run the same URL 5 times in one interpreter
+  python -m tools.harness --mock-portal --repeat 5 '?action=vod'
+
+  # CPU profile of one invocation (top 25 functions by cumulative time)
+  python -m tools.harness --mock-portal --cprofile 25 '?action=vod'
+
+Embedded use (benchmarks, trace replay):
+  harness = Harness(settings={'server_address': portal.url, ...})
+  result = harness.invoke('?action=vod')
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import time
+import traceback
+from urllib.parse import parse_qsl, urlsplit
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STUB_DIR = os.path.join(ROOT_DIR, 'tools', 'kodi_stubs')
+PLUGIN_BASE = 'plugin://plugin.video.stalkervod.tmdb/'
+
+# Settings every headless run starts from; a usable portal config is still required
+BASE_SETTINGS = {
+    'mac_address': '00:1A:79:00:00:01',
+    'serial_number': 'MOCKSERIAL',
+    'device_id': 'MOCKDEVICE',
+    'device_id_2': 'MOCKDEVICE2',
+    'signature': 'MOCKSIGNATURE',
+}
+
+
+def install_stubs():
+    """Put the Kodi stubs first on sys.path and return the shared stub state"""
+    if STUB_DIR not in sys.path:
+        sys.path.insert(0, STUB_DIR)
+    if ROOT_DIR not in sys.path:
+        sys.path.insert(1, ROOT_DIR)
+    import kodistate  # pylint: disable=import-outside-toplevel,import-error
+    return kodistate.STATE
+
+
+def split_plugin_url(url):
+    """Return the query string ('action=...') of a plugin URL in any accepted form"""
+    if url.startswith('plugin://'):
+        return urlsplit(url).query
+    return url[1:] if url.startswith('?') else url
+
+
+def route_name(query):
+    """Route name used in reports: the action parameter or 'main_menu'"""
+    return dict(parse_qsl(query)).get('action', 'main_menu')
+
+
+class RequestCounter:
+    """Counts outbound HTTP requests per host class by wrapping requests.Session.request"""
+
+    def __init__(self):
+        self.portal_hosts = set()
+        self.tmdb_hosts = {'api.themoviedb.org'}
+        self.counts = {'portal': 0, 'tmdb': 0, 'other': 0}
+        self.bytes = {'portal': 0, 'tmdb': 0, 'other': 0}
+        self._original = None
+
+    def install(self):
+        """Start counting"""
+        import requests  # pylint: disable=import-outside-toplevel
+        if self._original is not None:
+            return
+        original = requests.Session.request
+        counter = self
+
+        def counting_request(session, method, url, *args, **kwargs):
+            response = original(session, method, url, *args, **kwargs)
+            host = urlsplit(url).netloc
+            kind = 'portal' if host in counter.portal_hosts else 'tmdb' if host in counter.tmdb_hosts else 'other'
+            counter.counts[kind] += 1
+            counter.bytes[kind] += len(response.content or b'') if method.upper() != 'HEAD' else 0
+            return response
+        requests.Session.request = counting_request
+        self._original = original
+
+    def uninstall(self):
+        """Stop counting"""
+        if self._original is not None:
+            import requests  # pylint: disable=import-outside-toplevel
+            requests.Session.request = self._original
+            self._original = None
+
+    def snapshot(self):
+        """Copy of the counters"""
+        return dict(self.counts), dict(self.bytes)
+
+    def reset(self):
+        """Zero the counters"""
+        self.counts = {k: 0 for k in self.counts}
+        self.bytes = {k: 0 for k in self.bytes}
+
+
+@dataclasses.dataclass
+class InvocationResult:
+    """What one plugin invocation did"""
+    url: str
+    route: str
+    wall_ms: float
+    portal_calls: int = 0
+    tmdb_calls: int = 0
+    other_calls: int = 0
+    portal_bytes: int = 0
+    items: int = 0
+    folders: int = 0
+    ended: bool = False
+    resolved: str = None
+    dialogs: list = dataclasses.field(default_factory=list)
+    builtins: list = dataclasses.field(default_factory=list)
+    setter_calls: dict = dataclasses.field(default_factory=dict)
+    error: str = None
+
+    def summary(self):
+        """One line human readable summary"""
+        text = '{:<20} {:>9.1f} ms  portal={:<4} tmdb={:<4} items={:<6} folders={:<6}'.format(
+            self.route, self.wall_ms, self.portal_calls, self.tmdb_calls, self.items, self.folders)
+        if self.error:
+            text += '  ERROR: ' + self.error.strip().splitlines()[-1]
+        return text
+
+
+class Harness:
+    """Runs plugin invocations against the Kodi stubs"""
+
+    def __init__(self, home=None, settings=None, tmdb_base=None, log_level=None):
+        self.state = install_stubs()
+        merged = dict(BASE_SETTINGS)
+        merged.update(settings or {})
+        self.state.configure(home=home, settings=merged)
+        self.state.log_level = log_level
+        # Kodi only emits LOGDEBUG lines with debug logging enabled
+        self.state.debug_logging = log_level is not None and log_level <= 0
+        self.requests = RequestCounter()
+        portal = self.state.get_setting('server_address')
+        if portal:
+            self.requests.portal_hosts.add(urlsplit(portal).netloc)
+        if tmdb_base:
+            self.requests.tmdb_hosts.add(urlsplit(tmdb_base).netloc)
+        self.requests.install()
+        # lib/ may only be imported once the stubs are in place
+        from lib import addon, tmdb  # pylint: disable=import-outside-toplevel
+        if tmdb_base:
+            # lib.addon imported the name as well (connection pre-warm)
+            tmdb.TMDB_API_BASE = addon.TMDB_API_BASE = tmdb_base
+        self._addon = addon
+
+    def reset_calls(self):
+        """Start recording a fresh invocation (stub calls and native cache file access)"""
+        from lib import fileio  # pylint: disable=import-outside-toplevel
+        fileio.calls.update(read=0, write=0)
+        return self.state.reset_recorder()
+
+    def file_calls(self):
+        """Cache file reads/writes since reset_calls(), through xbmcvfs or native (lib.fileio)"""
+        from lib import fileio  # pylint: disable=import-outside-toplevel
+        calls = self.state.recorder.calls
+        return {'file.read': calls.get('xbmcvfs.File.read', 0) + fileio.calls['read'],
+                'file.write': calls.get('xbmcvfs.File.write', 0) + fileio.calls['write']}
+
+    @property
+    def profile(self):
+        """Add-on profile directory (token, caches)"""
+        return self.state.profile
+
+    def set_settings(self, **settings):
+        """Change settings between invocations (like the user would in Kodi)"""
+        for key, value in settings.items():
+            self.state.set_setting(key, value)
+
+    def invoke(self, url, handle=1):
+        """Run one plugin URL through lib.addon.run and record what happened"""
+        query = split_plugin_url(url)
+        argv = [PLUGIN_BASE, str(handle), '?' + query]
+        recorder = self.reset_calls()
+        self.requests.reset()
+        sys.argv = argv
+        error = None
+        start = time.perf_counter()
+        try:
+            self._addon.run(argv)
+        except Exception:  # pylint: disable=broad-except
+            error = traceback.format_exc()
+        wall_ms = (time.perf_counter() - start) * 1000.0
+        counts, nbytes = self.requests.snapshot()
+        setter_calls = dict(recorder.calls)
+        setter_calls.update(self.file_calls())
+        return InvocationResult(
+            url=url, route=route_name(query), wall_ms=wall_ms,
+            portal_calls=counts['portal'], tmdb_calls=counts['tmdb'], other_calls=counts['other'],
+            portal_bytes=nbytes['portal'],
+            items=len(recorder.directory_items),
+            folders=sum(1 for item in recorder.directory_items if item[2]),
+            ended=recorder.end_of_directory is not None,
+            resolved=recorder.resolved[1] if recorder.resolved else None,
+            dialogs=list(recorder.dialogs), builtins=list(recorder.builtins),
+            setter_calls=setter_calls, error=error)
+
+    def close(self):
+        """Restore requests"""
+        self.requests.uninstall()
+
+
+def parse_settings(pairs):
+    """['key=value', ...] -> dict"""
+    settings = {}
+    for pair in pairs or []:
+        key, _, value = pair.partition('=')
+        settings[key.strip()] = value
+    return settings
+
+
+def main(argv=None):
+    """Command line entry point"""
+    # pylint: disable=import-outside-toplevel
+    from tools.mock_portal import MockPortal, add_catalog_arguments, config_from_args
+    parser = argparse.ArgumentParser(description='Run plugin URLs headless against Kodi stubs')
+    parser.add_argument('urls', nargs='+', help="plugin URL, '?action=...' or 'action=...'; '' = main menu")
+    parser.add_argument('--setting', action='append', metavar='KEY=VALUE', help='add-on setting (repeatable)')
+    parser.add_argument('--home', help='fake Kodi home directory (default: fresh temp dir)')
+    parser.add_argument('--portal', help='portal server address (instead of --mock-portal)')
+    parser.add_argument('--mock-portal', action='store_true', help='start tools.mock_portal in-process')
+    parser.add_argument('--mock-tmdb', action='store_true', help='start tools.mock_tmdb and enable TMDB')
+    parser.add_argument('--repeat', type=int, default=1, help='run every URL N times in this process')
+    parser.add_argument('--cprofile', type=int, default=0, metavar='N', help='print top N functions per URL')
+    parser.add_argument('--log', choices=('debug', 'info', 'warning', 'error'), help='print add-on log lines')
+    parser.add_argument('--json', action='store_true', help='print results as JSON lines')
+    add_catalog_arguments(parser)
+    args = parser.parse_args(argv)
+
+    settings = parse_settings(args.setting)
+    portal = tmdb = None
+    if args.mock_portal:
+        portal = MockPortal(config_from_args(args)).start()
+        settings.setdefault('server_address', portal.url)
+    elif args.portal:
+        settings.setdefault('server_address', args.portal)
+    tmdb_base = None
+    if args.mock_tmdb:
+        from tools.mock_tmdb import MockTmdb
+        tmdb = MockTmdb().start()
+        tmdb_base = tmdb.api_base
+        settings.setdefault('tmdb_enabled', 'true')
+        settings.setdefault('tmdb_api_key', 'mock')
+
+    log_level = {'debug': 0, 'info': 1, 'warning': 2, 'error': 3}.get(args.log)
+    harness = Harness(home=args.home, settings=settings, tmdb_base=tmdb_base, log_level=log_level)
+    failed = False
+    try:
+        for url in args.urls:
+            for _ in range(args.repeat):
+                if args.cprofile:
+                    import cProfile
+                    import pstats
+                    profiler = cProfile.Profile()
+                    result = profiler.runcall(harness.invoke, url)
+                    pstats.Stats(profiler, stream=sys.stderr).sort_stats('cumulative').print_stats(args.cprofile)
+                else:
+                    result = harness.invoke(url)
+                failed = failed or result.error is not None
+                if args.json:
+                    print(json.dumps(dataclasses.asdict(result)))
+                else:
+                    print(result.summary())
+                    if result.error and args.log:
+                        sys.stderr.write(result.error)
+        if portal and not args.json:
+            print('mock portal: {}'.format(json.dumps(portal.stats()['requests'], sort_keys=True)))
+    finally:
+        harness.close()
+        if portal:
+            portal.stop()
+        if tmdb:
+            tmdb.stop()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,203 @@
+"""
+Import cost per route.
+
+Every plugin call in a fresh interpreter (first navigation, RunPlugin jobs,
+recycled invoker) pays for the modules it imports.  This tool primes a
+profile against the mock portal (token, Stalker cache), then runs each
+route once in its own ``python -X importtime`` process and reports:
+
+  addon ms    importing lib.addon (what every route pays)
+  route ms    modules imported lazily while the route ran
+  run ms      wall time of run() including those imports
+  network     whether requests (and with it urllib3, ssl, ...) was loaded
+  heaviest    the most expensive non-lib modules imported directly by lib/
+
+Only the Kodi stubs are loaded before measuring.  lib/ is byte-compiled
+first (Kodi keeps .pyc files of installed add-ons), so source compilation
+does not show up as import cost.  Numbers from a desktop CPU are roughly
+5-10x lower than on a low-end Android box.
+
+Usage:
+  python -m tools.import_cost
+  python -m tools.import_cost '?action=vod' '?action=tmdb_cache_info' --budget 20
+  python -m tools.import_cost --json
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import ast
+import compileall
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from tools.harness import PLUGIN_BASE, ROOT_DIR, STUB_DIR, Harness, route_name, split_plugin_url
+
+_MARK = '## import_cost '
+_IMPORT_RE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)\s*$')
+
+# Routes a user hits most, all answerable from the primed cache
+DEFAULT_URLS = (
+    '',
+    '?action=vod',
+    '?action=series',
+    '?action=vod_listing&category=Cost&category_id={vod}&page=1&update_listing=False',
+    '?action=series_listing&category=Cost&category_id={series}&page=1&update_listing=False',
+    '?action=stalker_cache_info',
+    '?action=perf_stats',
+)
+
+
+def parse_importtime(lines):
+    """-X importtime lines -> list of phases, each [(name, self_us, cumulative_us, children), ...] roots"""
+    phases = [[]]
+    pending = {}
+    for line in lines:
+        if line.startswith(_MARK):
+            phases.append([])
+            pending = {}
+            continue
+        match = _IMPORT_RE.match(line)
+        if not match:
+            continue
+        depth = len(match.group(3)) // 2
+        # importtime prints children before their parent
+        node = (match.group(4), int(match.group(1)), int(match.group(2)), pending.pop(depth + 1, []))
+        if depth == 0:
+            phases[-1].append(node)
+        else:
+            pending.setdefault(depth, []).append(node)
+    return phases
+
+
+def _walk(nodes, parent=None):
+    for node in nodes:
+        yield parent, node
+        for item in _walk(node[3], node[0]):
+            yield item
+
+
+def phase_summary(roots):
+    """Total ms, module count and the heaviest non-lib imports made by lib/ modules"""
+    total_us = sum(node[2] for node in roots)
+    count = 0
+    external = []
+    for parent, node in _walk(roots):
+        count += 1
+        own = node[0] == 'lib' or node[0].startswith('lib.')
+        if not own and (parent is None or parent == 'lib' or parent.startswith('lib.')):
+            external.append((node[2], node[0]))
+    external.sort(reverse=True)
+    return {'ms': round(total_us / 1000.0, 1), 'modules': count,
+            'heaviest': [{'module': name, 'ms': round(us / 1000.0, 1)} for us, name in external[:3]]}
+
+
+# Measured side: a bare interpreter that only loads the Kodi stubs, so stdlib
+# modules imported by lib/ (json, dataclasses ...) are counted as well
+_CHILD = """
+import sys, time
+sys.path[:0] = [{stubs!r}, {root!r}]
+import kodistate
+kodistate.STATE.configure(home={home!r})
+argv = [{base!r}, '1', {url!r}]
+sys.argv = argv
+sys.stderr.write({mark!r} + 'addon\\n')
+sys.stderr.flush()
+start = time.perf_counter()
+from lib import addon
+imported = time.perf_counter()
+sys.stderr.write({mark!r} + 'route\\n')
+sys.stderr.flush()
+addon.run(argv)
+done = time.perf_counter()
+print(repr({{'addon_wall_ms': round((imported - start) * 1000.0, 1), 'run_ms': round((done - imported) * 1000.0, 1),
+            'network': 'requests' in sys.modules}}))
+"""
+
+
+def measure(home, url):
+    """One fresh interpreter for one route"""
+    query = split_plugin_url(url)
+    code = _CHILD.format(stubs=STUB_DIR, root=ROOT_DIR, home=home, base=PLUGIN_BASE, url='?' + query, mark=_MARK)
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=ROOT_DIR, capture_output=True, text=True, check=False)
+    if proc.returncode != 0:
+        raise RuntimeError('{} failed:\n{}'.format(url, proc.stderr[-2000:]))
+    result = ast.literal_eval(proc.stdout.strip().splitlines()[-1])
+    phases = parse_importtime(proc.stderr.splitlines())
+    addon_phase = phase_summary(phases[1]) if len(phases) > 1 else phase_summary([])
+    route_phase = phase_summary(phases[2]) if len(phases) > 2 else phase_summary([])
+    result.update({'route': route_name(query), 'url': '?' + query,
+                   'addon_ms': addon_phase['ms'], 'addon_modules': addon_phase['modules'],
+                   'route_ms': route_phase['ms'], 'route_modules': route_phase['modules'],
+                   'heaviest': sorted(addon_phase['heaviest'] + route_phase['heaviest'],
+                                      key=lambda h: -h['ms'])[:3]})
+    result['import_ms'] = round(result['addon_ms'] + result['route_ms'], 1)
+    return result
+
+
+def prime(home, urls, settings):
+    """Fill the Stalker cache like the daily refresh does, then run every route once"""
+    harness = Harness(home=home, settings=settings)
+    try:
+        for url in ['?action=refresh_all&silent=1'] + list(urls):
+            harness.invoke(url)
+    finally:
+        harness.close()
+
+
+def format_report(rows):
+    """Human readable table"""
+    lines = ['{:<22} {:>9} {:>9} {:>9} {:>8}  {}'.format('route', 'addon ms', 'route ms', 'run ms', 'network',
+                                                          'heaviest')]
+    for row in rows:
+        lines.append('{:<22} {:>9.1f} {:>9.1f} {:>9.1f} {:>8}  {}'.format(
+            row['route'], row['addon_ms'], row['route_ms'], row['run_ms'], 'yes' if row['network'] else 'no',
+            ', '.join('{} {:.1f}'.format(h['module'], h['ms']) for h in row['heaviest'])))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Import cost of plugin routes in a fresh interpreter')
+    parser.add_argument('urls', nargs='*', help='plugin URLs (default: the common cached routes)')
+    parser.add_argument('--setting', action='append', metavar='KEY=VALUE', help='add-on setting (repeatable)')
+    parser.add_argument('--budget', type=float, help='fail if addon + route imports exceed this many ms')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    # pylint: disable=import-outside-toplevel
+    from tools.harness import parse_settings
+    from tools.mock_portal import CatalogConfig, MockPortal, SyntheticCatalog
+    catalog = SyntheticCatalog(CatalogConfig())
+    first = {t: next(c['id'] for c in catalog.categories(t) if c['id'] != '*') for t in ('vod', 'series')}
+    urls = [url.format(**first) for url in (args.urls or DEFAULT_URLS)]
+    # Routes that do reach the portal keep working while measuring
+    portal = MockPortal(CatalogConfig()).start()
+    settings = {'server_address': portal.url, 'page_size': '9999'}
+    settings.update(parse_settings(args.setting))
+    compileall.compile_dir(os.path.join(ROOT_DIR, 'lib'), quiet=1)
+    home = tempfile.mkdtemp(prefix='import-cost-')
+    try:
+        prime(home, urls, settings)
+        rows = [measure(home, url) for url in urls]
+    finally:
+        portal.stop()
+        shutil.rmtree(home, ignore_errors=True)
+    print(json.dumps(rows, indent=2) if args.json else format_report(rows))
+    if args.budget is not None:
+        over = [row for row in rows if row['import_ms'] > args.budget]
+        for row in over:
+            sys.stderr.write('{}: imports {:.1f} ms > budget {:.1f} ms\n'.format(row['route'], row['import_ms'],
+                                                                                  args.budget))
+        return 1 if over else 0
+    return 0
+
+
+if __name__ == '__main__':
+    os.chdir(ROOT_DIR)
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Shared state of the headless Kodi stubs.
+
+The stub modules (xbmc, xbmcgui, xbmcplugin, xbmcvfs, xbmcaddon) keep all
+their state here so the harness can configure the fake Kodi installation
+before lib/ is imported and read back what the add-on did afterwards.
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+ADDON_ID = 'plugin.video.stalkervod.tmdb'
+
+
+class Recorder:
+    """Records what the add-on asked Kodi to do during one invocation"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = Counter()        # 'ListItem.setArt' -> count, 'xbmcplugin.addDirectoryItems' -> count
+        self.directory_items = []     # (url, label, is_folder)
+        self.end_of_directory = None  # kwargs of the endOfDirectory call
+        self.resolved = None          # (succeeded, path) of setResolvedUrl
+        self.content = None
+        self.category = None
+        self.builtins = []            # xbmc.executebuiltin commands
+        self.dialogs = []             # (kind, heading) of every dialog shown
+        self.log_counts = Counter()   # level -> count
+
+    def count(self, name):
+        """Increment a call counter"""
+        self.calls[name] += 1
+
+
+class KodiState:
+    """Fake Kodi installation: paths, settings, dialog answers and recorder"""
+
+    def __init__(self):
+        self.home = tempfile.mkdtemp(prefix='kodi-home-')
+        self.addon_path = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.addon_name = 'Stalker VOD Client + TMDB'
+        self.addon_version = '0.0.0'
+        self.settings = {}
+        self.defaults = {}
+        self.debug_logging = False
+        self.log_level = None          # print log lines at or above this level (None = silent)
+        self.dialog_answers = {}       # kind -> list of queued answers (yesno, select, multiselect, input)
+        self.recorder = Recorder()
+        self.aborted = False
+
+    # ------------------------------------------------------------------
+    # Paths
+    # ------------------------------------------------------------------
+
+    @property
+    def userdata(self):
+        """special://profile/"""
+        return os.path.join(self.home, 'userdata')
+
+    @property
+    def profile(self):
+        """special://profile/addon_data/<addon id>/"""
+        return os.path.join(self.userdata, 'addon_data', ADDON_ID)
+
+    @property
+    def settings_file(self):
+        """Kodi's per-profile settings.xml for this add-on"""
+        return os.path.join(self.profile, 'settings.xml')
+
+    def translate_path(self, path):
+        """Map special:// paths to the fake home directory"""
+        mapping = (('special://profile/', self.userdata + os.sep),
+                   ('special://masterprofile/', self.userdata + os.sep),
+                   ('special://userdata/', self.userdata + os.sep),
+                   ('special://home/', self.home + os.sep),
+                   ('special://temp/', os.path.join(self.home, 'temp') + os.sep))
+        for prefix, target in mapping:
+            if path.startswith(prefix):
+                return target + path[len(prefix):].replace('/', os.sep)
+        return path
+
+    # ------------------------------------------------------------------
+    # Settings
+    # ------------------------------------------------------------------
+
+    def configure(self, home=None, settings=None):
+        """(Re)configure home directory and settings; writes settings.xml"""
+        if home:
+            self.home = home
+        os.makedirs(self.profile, exist_ok=True)
+        self.defaults = _read_default_settings(os.path.join(self.addon_path, 'resources', 'settings.xml'))
+        if os.path.exists(self.settings_file):
+            self.settings = _read_user_settings(self.settings_file)
+        if settings:
+            self.settings.update({k: str(v) for k, v in settings.items()})
+        self.save_settings()
+
+    def get_setting(self, key):
+        """Value as Kodi's getSetting returns it (user value, else default, else '')"""
+        if key in self.settings:
+            return self.settings[key]
+        return self.defaults.get(key, '')
+
+    def set_setting(self, key, value):
+        """Persist a setting like Kodi does"""
+        self.settings[key] = str(value)
+        self.save_settings()
+
+    def save_settings(self):
+        """Write settings.xml in Kodi's version 2 user settings format"""
+        root = ET.Element('settings', version='2')
+        for key in sorted(set(self.defaults) | set(self.settings)):
+            node = ET.SubElement(root, 'setting', id=key)
+            if key in self.settings:
+                node.text = self.settings[key]
+            else:
+                node.set('default', 'true')
+                node.text = self.defaults[key]
+        os.makedirs(self.profile, exist_ok=True)
+        ET.ElementTree(root).write(self.settings_file, encoding='utf-8', xml_declaration=False)
+
+    # ------------------------------------------------------------------
+    # Dialogs
+    # ------------------------------------------------------------------
+
+    def queue_answer(self, kind, value):
+        """Queue an answer for the next dialog of the given kind"""
+        self.dialog_answers.setdefault(kind, []).append(value)
+
+    def next_answer(self, kind, default):
+        """Pop the next queued answer or return the default"""
+        answers = self.dialog_answers.get(kind)
+        if answers:
+            return answers.pop(0)
+        return default
+
+    def reset_recorder(self):
+        """Start recording a fresh invocation"""
+        self.recorder = Recorder()
+        return self.recorder
+
+
+def _read_default_settings(path):
+    defaults = {}
+    if not os.path.exists(path):
+        return defaults
+    for setting in ET.parse(path).getroot().iter('setting'):
+        if setting.get('type') == 'action':
+            continue
+        default = setting.find('default')
+        defaults[setting.get('id')] = default.text or '' if default is not None else ''
+    return defaults
+
+
+def _read_user_settings(path):
+    values = {}
+    for setting in ET.parse(path).getroot().iter('setting'):
+        if setting.get('default') != 'true':
+            values[setting.get('id')] = setting.text or ''
+    return values
+
+
+STATE = KodiState()
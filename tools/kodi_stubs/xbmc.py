@@ -0,0 +1,106 @@
+"""Headless stub of Kodi's xbmc module"""
+from __future__ import absolute_import, division, unicode_literals
+
+import json
+import sys
+import time
+
+from kodistate import STATE
+
+LOGDEBUG = 0
+LOGINFO = 1
+LOGWARNING = 2
+LOGERROR = 3
+LOGFATAL = 4
+LOGNONE = 5
+
+_LEVEL_NAMES = {LOGDEBUG: 'DEBUG', LOGINFO: 'INFO', LOGWARNING: 'WARNING', LOGERROR: 'ERROR', LOGFATAL: 'FATAL'}
+
+
+def log(msg, level=LOGDEBUG):
+    """Count log lines per level; print them when the harness asks for it"""
+    STATE.recorder.log_counts[level] += 1
+    if STATE.log_level is not None and level >= STATE.log_level:
+        sys.stderr.write('{:>7}: {}\n'.format(_LEVEL_NAMES.get(level, level), msg))
+
+
+def executebuiltin(function, wait=False):  # pylint: disable=unused-argument
+    """Record builtins such as Container.Refresh or RunPlugin"""
+    STATE.recorder.count('xbmc.executebuiltin')
+    STATE.recorder.builtins.append(function)
+
+
+def executeJSONRPC(jsonrpccommand):  # pylint: disable=invalid-name
+    """Answer the few JSON-RPC calls the add-on makes"""
+    request = json.loads(jsonrpccommand)
+    STATE.recorder.count('xbmc.executeJSONRPC')
+    method = request.get('method')
+    if method == 'Settings.GetSettingValue':
+        setting = request.get('params', {}).get('setting')
+        value = STATE.debug_logging if setting == 'debug.showloginfo' else None
+        return json.dumps({'id': request.get('id'), 'jsonrpc': '2.0', 'result': {'value': value}})
+    return json.dumps({'id': request.get('id'), 'jsonrpc': '2.0', 'result': 'OK'})
+
+
+def getCondVisibility(condition):  # pylint: disable=invalid-name
+    """Only System.GetBool(debug.showloginfo) is meaningful headless"""
+    if condition == 'System.GetBool(debug.showloginfo)':
+        return STATE.debug_logging
+    return False
+
+
+def getInfoLabel(label):  # pylint: disable=invalid-name,unused-argument
+    """No GUI: every info label is empty"""
+    return ''
+
+
+def sleep(timemillis):
+    """Sleep like xbmc.sleep"""
+    time.sleep(timemillis / 1000.0)
+
+
+def translatePath(path):  # pylint: disable=invalid-name
+    """Deprecated location of xbmcvfs.translatePath"""
+    return STATE.translate_path(path)
+
+
+def getLanguage(format=2, region=False):  # pylint: disable=redefined-builtin,invalid-name,unused-argument
+    """Fixed GUI language"""
+    return 'en'
+
+
+class Actor:
+    """Cast member"""
+
+    def __init__(self, name='', role='', order=-1, thumbnail=''):
+        self.name = name
+        self.role = role
+        self.order = order
+        self.thumbnail = thumbnail
+
+
+class Monitor:
+    """Monitor that never receives an abort unless the harness sets one"""
+
+    def abortRequested(self):  # pylint: disable=invalid-name
+        """Abort flag from the harness"""
+        return STATE.aborted
+
+    def waitForAbort(self, timeout=0):  # pylint: disable=invalid-name
+        """Wait up to timeout seconds for an abort"""
+        deadline = time.time() + (timeout or 0)
+        while time.time() < deadline and not STATE.aborted:
+            time.sleep(0.05)
+        return STATE.aborted
+
+
+class Player:
+    """Player that never plays anything"""
+
+    def isPlaying(self):  # pylint: disable=invalid-name
+        """Nothing is playing headless"""
+        return False
+
+    def play(self, item='', listitem=None, windowed=False, startpos=-1):  # pylint: disable=unused-argument
+        """Record play requests"""
+        STATE.recorder.count('xbmc.Player.play')
@@ -0,0 +1,55 @@
+"""Headless stub of Kodi's xbmcaddon module"""
+from __future__ import absolute_import, division, unicode_literals
+
+from kodistate import ADDON_ID, STATE
+
+
+class Addon:
+    """Add-on backed by the harness settings"""
+
+    def __init__(self, id=None):  # pylint: disable=redefined-builtin
+        self._id = id or ADDON_ID
+        STATE.recorder.count('xbmcaddon.Addon')
+
+    def getAddonInfo(self, info):  # pylint: disable=invalid-name
+        """id, name, path, profile, version"""
+        return {'id': self._id, 'name': STATE.addon_name, 'path': STATE.addon_path,
+                'profile': 'special://profile/addon_data/{}/'.format(self._id),
+                'version': STATE.addon_version, 'icon': ''}.get(info, '')
+
+    def getSetting(self, id):  # pylint: disable=invalid-name,redefined-builtin
+        """Setting value as string"""
+        STATE.recorder.count('xbmcaddon.getSetting')
+        return STATE.get_setting(id)
+
+    def getSettingBool(self, id):  # pylint: disable=invalid-name,redefined-builtin
+        """Setting value as bool"""
+        return self.getSetting(id) == 'true'
+
+    def getSettingInt(self, id):  # pylint: disable=invalid-name,redefined-builtin
+        """Setting value as int"""
+        return int(self.getSetting(id) or 0)
+
+    def getSettingString(self, id):  # pylint: disable=invalid-name,redefined-builtin
+        """Setting value as string"""
+        return self.getSetting(id)
+
+    def setSetting(self, id, value):  # pylint: disable=invalid-name,redefined-builtin
+        """Persist a setting"""
+        STATE.recorder.count('xbmcaddon.setSetting')
+        STATE.set_setting(id, value)
+
+    def setSettingBool(self, id, value):  # pylint: disable=invalid-name,redefined-builtin
+        """Persist a bool setting"""
+        self.setSetting(id, 'true' if value else 'false')
+
+    def setSettingInt(self, id, value):  # pylint: disable=invalid-name,redefined-builtin
+        """Persist an int setting"""
+        self.setSetting(id, str(int(value)))
+
+    def getLocalizedString(self, id):  # pylint: disable=invalid-name,redefined-builtin
+        """No language files headless"""
+        return str(id)
+
+    def openSettings(self):  # pylint: disable=invalid-name
+        """No settings GUI headless"""
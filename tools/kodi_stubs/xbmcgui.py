@@ -0,0 +1,180 @@
+"""Headless stub of Kodi's xbmcgui module"""
+from __future__ import absolute_import, division, unicode_literals
+
+from kodistate import STATE
+
+INPUT_ALPHANUM = 0
+INPUT_NUMERIC = 1
+INPUT_DATE = 2
+INPUT_TIME = 3
+INPUT_IPADDRESS = 4
+INPUT_PASSWORD = 5
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+
+class InfoTagVideo:
+    """Video info tag: every setter is counted, values are kept"""
+
+    def __init__(self):
+        self.values = {}
+
+    def __getattr__(self, name):
+        if not name.startswith('set'):
+            raise AttributeError(name)
+        key = 'InfoTagVideo.' + name
+
+        def setter(*args, **kwargs):
+            STATE.recorder.count(key)
+            self.values[name[3:]] = args[0] if len(args) == 1 and not kwargs else (args, kwargs)
+        return setter
+
+    def getTitle(self):  # pylint: disable=invalid-name
+        """Title set by setTitle"""
+        return self.values.get('Title', '')
+
+
+class ListItem:
+    """List item that counts its setter calls"""
+
+    def __init__(self, label='', label2='', path='', offscreen=False):  # pylint: disable=unused-argument
+        STATE.recorder.count('ListItem')
+        self._label = label
+        self._label2 = label2
+        self._path = path
+        self.art = {}
+        self.properties = {}
+        self.context_menu = []
+        self._info_tag = None
+
+    def getLabel(self):  # pylint: disable=invalid-name
+        """Label"""
+        return self._label
+
+    def getLabel2(self):  # pylint: disable=invalid-name
+        """Second label"""
+        return self._label2
+
+    def setLabel(self, label):  # pylint: disable=invalid-name
+        """Set label"""
+        STATE.recorder.count('ListItem.setLabel')
+        self._label = label
+
+    def getPath(self):  # pylint: disable=invalid-name
+        """Path"""
+        return self._path
+
+    def setPath(self, path):  # pylint: disable=invalid-name
+        """Set path"""
+        STATE.recorder.count('ListItem.setPath')
+        self._path = path
+
+    def setArt(self, values):  # pylint: disable=invalid-name
+        """Set artwork"""
+        STATE.recorder.count('ListItem.setArt')
+        self.art.update(values)
+
+    def setProperty(self, key, value):  # pylint: disable=invalid-name
+        """Set a property"""
+        STATE.recorder.count('ListItem.setProperty')
+        self.properties[key] = value
+
+    def setProperties(self, values):  # pylint: disable=invalid-name
+        """Set several properties"""
+        STATE.recorder.count('ListItem.setProperties')
+        self.properties.update(values)
+
+    def getProperty(self, key):  # pylint: disable=invalid-name
+        """Get a property"""
+        return self.properties.get(key, '')
+
+    def addContextMenuItems(self, items, replaceItems=False):  # pylint: disable=invalid-name,unused-argument
+        """Add context menu entries"""
+        STATE.recorder.count('ListItem.addContextMenuItems')
+        self.context_menu.extend(items)
+
+    def setInfo(self, type, infoLabels):  # pylint: disable=invalid-name,redefined-builtin,unused-argument
+        """Legacy info labels"""
+        STATE.recorder.count('ListItem.setInfo')
+
+    def setIsFolder(self, is_folder):  # pylint: disable=invalid-name,unused-argument
+        """Folder flag"""
+        STATE.recorder.count('ListItem.setIsFolder')
+
+    def getVideoInfoTag(self):  # pylint: disable=invalid-name
+        """Info tag (one per item)"""
+        STATE.recorder.count('ListItem.getVideoInfoTag')
+        if self._info_tag is None:
+            self._info_tag = InfoTagVideo()
+        return self._info_tag
+
+
+class Dialog:
+    """Modal dialogs answered from the harness queue"""
+
+    @staticmethod
+    def _record(kind, heading):
+        STATE.recorder.count('Dialog.' + kind)
+        STATE.recorder.dialogs.append((kind, heading))
+
+    def ok(self, heading, message=''):  # pylint: disable=unused-argument
+        """OK dialog"""
+        self._record('ok', heading)
+        return True
+
+    def yesno(self, heading, message='', nolabel='', yeslabel='', autoclose=0, defaultbutton=0):  # pylint: disable=unused-argument,too-many-arguments
+        """Yes/No dialog (default answer: yes)"""
+        self._record('yesno', heading)
+        return STATE.next_answer('yesno', True)
+
+    def select(self, heading, list, autoclose=0, preselect=-1, useDetails=False):  # pylint: disable=redefined-builtin,unused-argument,too-many-arguments,invalid-name
+        """Select dialog (default answer: first entry)"""
+        self._record('select', heading)
+        return STATE.next_answer('select', 0 if list else -1)
+
+    def multiselect(self, heading, options, autoclose=0, preselect=None, useDetails=False):  # pylint: disable=unused-argument,too-many-arguments,invalid-name
+        """Multiselect dialog (default answer: cancelled)"""
+        self._record('multiselect', heading)
+        return STATE.next_answer('multiselect', None)
+
+    def input(self, heading, defaultt='', type=INPUT_ALPHANUM, option=0, autoclose=0):  # pylint: disable=redefined-builtin,unused-argument,too-many-arguments
+        """Keyboard dialog (default answer: empty)"""
+        self._record('input', heading)
+        return STATE.next_answer('input', '')
+
+    def notification(self, heading, message, icon='', time=0, sound=True):  # pylint: disable=unused-argument,too-many-arguments,redefined-outer-name
+        """Toast notification"""
+        self._record('notification', heading)
+
+    def textviewer(self, heading, text, usemono=False):  # pylint: disable=unused-argument
+        """Text viewer dialog"""
+        self._record('textviewer', heading)
+
+
+class DialogProgress:
+    """Foreground progress dialog that is never cancelled"""
+
+    def create(self, heading, message=''):  # pylint: disable=unused-argument
+        """Open the dialog"""
+        STATE.recorder.count('DialogProgress.create')
+
+    def update(self, percent, message=''):  # pylint: disable=unused-argument
+        """Update the dialog"""
+        STATE.recorder.count('DialogProgress.update')
+
+    def iscanceled(self):
+        """Never cancelled headless"""
+        return False
+
+    def close(self):
+        """Close the dialog"""
+        STATE.recorder.count('DialogProgress.close')
+
+
+class DialogProgressBG(DialogProgress):
+    """Background progress dialog"""
+
+    def isFinished(self):  # pylint: disable=invalid-name
+        """Never finished early"""
+        return False
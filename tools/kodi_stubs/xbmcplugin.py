@@ -0,0 +1,62 @@
+"""Headless stub of Kodi's xbmcplugin module"""
+from __future__ import absolute_import, division, unicode_literals
+
+from kodistate import STATE
+
+SORT_METHOD_NONE = 0
+SORT_METHOD_LABEL = 1
+SORT_METHOD_LABEL_IGNORE_THE = 2
+SORT_METHOD_DATE = 3
+SORT_METHOD_TITLE = 10
+SORT_METHOD_VIDEO_YEAR = 18
+SORT_METHOD_DATEADDED = 21
+SORT_METHOD_UNSORTED = 40
+
+
+def _record_item(url, listitem, is_folder):
+    STATE.recorder.directory_items.append((url, listitem.getLabel() if listitem is not None else '', is_folder))
+
+
+def addDirectoryItem(handle, url, listitem, isFolder=False, totalItems=0):  # pylint: disable=invalid-name,unused-argument
+    """Record a single directory item"""
+    STATE.recorder.count('xbmcplugin.addDirectoryItem')
+    _record_item(url, listitem, isFolder)
+    return True
+
+
+def addDirectoryItems(handle, items, totalItems=0):  # pylint: disable=invalid-name,unused-argument
+    """Record a batch of directory items"""
+    STATE.recorder.count('xbmcplugin.addDirectoryItems')
+    for url, listitem, is_folder in items:
+        _record_item(url, listitem, is_folder)
+    return True
+
+
+def endOfDirectory(handle, succeeded=True, updateListing=False, cacheToDisc=True):  # pylint: disable=invalid-name
+    """Record the end of a listing"""
+    STATE.recorder.count('xbmcplugin.endOfDirectory')
+    STATE.recorder.end_of_directory = {'handle': handle, 'succeeded': succeeded,
+                                       'updateListing': updateListing, 'cacheToDisc': cacheToDisc}
+
+
+def setResolvedUrl(handle, succeeded, listitem):  # pylint: disable=invalid-name,unused-argument
+    """Record a resolved playback URL"""
+    STATE.recorder.count('xbmcplugin.setResolvedUrl')
+    STATE.recorder.resolved = (succeeded, listitem.getPath() if listitem is not None else '')
+
+
+def setContent(handle, content):  # pylint: disable=invalid-name,unused-argument
+    """Record the container content type"""
+    STATE.recorder.count('xbmcplugin.setContent')
+    STATE.recorder.content = content
+
+
+def setPluginCategory(handle, category):  # pylint: disable=invalid-name,unused-argument
+    """Record the container category"""
+    STATE.recorder.count('xbmcplugin.setPluginCategory')
+    STATE.recorder.category = category
+
+
+def addSortMethod(handle, sortMethod, labelMask='', label2Mask=''):  # pylint: disable=invalid-name,unused-argument
+    """Record a sort method"""
+    STATE.recorder.count('xbmcplugin.addSortMethod')
@@ -0,0 +1,158 @@
+"""Headless stub of Kodi's xbmcvfs module (local filesystem only)"""
+from __future__ import absolute_import, division, unicode_literals
+
+import os
+import shutil
+
+from kodistate import STATE
+
+
+def translatePath(path):  # pylint: disable=invalid-name
+    """Map special:// paths into the harness home directory"""
+    return STATE.translate_path(path)
+
+
+def exists(path):
+    """True if the file or directory exists"""
+    STATE.recorder.count('xbmcvfs.exists')
+    return os.path.exists(translatePath(path))
+
+
+def mkdirs(path):
+    """Create a directory tree"""
+    os.makedirs(translatePath(path), exist_ok=True)
+    return True
+
+
+def mkdir(path):
+    """Create a directory"""
+    return mkdirs(path)
+
+
+def delete(path):
+    """Delete a file; False if it does not exist"""
+    try:
+        os.remove(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rmdir(path, force=False):
+    """Remove a directory"""
+    try:
+        if force:
+            shutil.rmtree(translatePath(path))
+        else:
+            os.rmdir(translatePath(path))
+        return True
+    except OSError:
+        return False
+
+
+def rename(file, newFileName):  # pylint: disable=redefined-builtin,invalid-name
+    """Rename (replaces an existing target like Kodi on local storage)"""
+    try:
+        os.replace(translatePath(file), translatePath(newFileName))
+        return True
+    except OSError:
+        return False
+
+
+def copy(strSource, strDestination):  # pylint: disable=invalid-name
+    """Copy a file"""
+    try:
+        shutil.copyfile(translatePath(strSource), translatePath(strDestination))
+        return True
+    except OSError:
+        return False
+
+
+def listdir(path):
+    """Return (dirs, files)"""
+    path = translatePath(path)
+    dirs, files = [], []
+    for name in sorted(os.listdir(path)):
+        (dirs if os.path.isdir(os.path.join(path, name)) else files).append(name)
+    return dirs, files
+
+
+class Stat:
+    """os.stat wrapper with Kodi's method names"""
+
+    def __init__(self, path):
+        self._stat = os.stat(translatePath(path))
+
+    def st_size(self):
+        """Size in bytes"""
+        return self._stat.st_size
+
+    def st_mtime(self):
+        """Modification time (whole seconds, as Kodi reports it)"""
+        return int(self._stat.st_mtime)
+
+    def st_ctime(self):
+        """Change time"""
+        return int(self._stat.st_ctime)
+
+
+class File:
+    """Kodi file object: read() returns str, readBytes() returns bytearray"""
+
+    def __init__(self, filepath, mode=None):
+        self._mode = mode or 'r'
+        STATE.recorder.count('xbmcvfs.File.' + ('write' if 'w' in self._mode else 'read'))
+        path = translatePath(filepath)
+        if 'w' in self._mode:
+            self._fh = open(path, 'wb')  # pylint: disable=consider-using-with
+        else:
+            try:
+                self._fh = open(path, 'rb')  # pylint: disable=consider-using-with
+            except OSError:
+                self._fh = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, numBytes=0):  # pylint: disable=invalid-name
+        """Read text (Kodi returns '' for missing files)"""
+        return self.readBytes(numBytes).decode('utf-8', errors='replace')
+
+    def readBytes(self, numBytes=0):  # pylint: disable=invalid-name
+        """Read raw bytes"""
+        if self._fh is None:
+            return bytearray()
+        data = self._fh.read(numBytes) if numBytes else self._fh.read()
+        return bytearray(data)
+
+    def write(self, buffer):
+        """Write str or bytes; returns True on success"""
+        if isinstance(buffer, str):
+            buffer = buffer.encode('utf-8')
+        self._fh.write(buffer)
+        return True
+
+    def seek(self, seekBytes, iWhence=0):  # pylint: disable=invalid-name
+        """Seek; returns the new position"""
+        if self._fh is None:
+            return -1
+        return self._fh.seek(seekBytes, iWhence)
+
+    def tell(self):
+        """Current position"""
+        return self._fh.tell() if self._fh is not None else -1
+
+    def size(self):
+        """File size in bytes"""
+        if self._fh is None:
+            return 0
+        return os.fstat(self._fh.fileno()).st_size
+
+    def close(self):
+        """Close the handle"""
+        if self._fh is not None:
+            self._fh.close()
+            self._fh = None
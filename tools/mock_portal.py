@@ -0,0 +1,508 @@
+"""
+Local mock Stalker portal for load and scaling tests.
+
+Speaks the subset of the ``load.php`` protocol used by lib/api.py and
+lib/auth.py:
+
+  stb       handshake, get_profile
+  watchdog  get_events
+  vod       get_categories, get_ordered_list, create_link, set_fav, del_fav
+  series    get_categories, get_ordered_list (incl. seasons via movie_id)
+  itv       get_genres, get_ordered_list, create_link,
+            get_all_fav_channels, set_fav
+
+The catalog is synthetic and deterministic: items are generated on demand
+from their index, so a 100k item catalog costs no memory until a page of
+it is requested.  Latency, HTTP errors and "Authorization failed" replies
+can be injected to exercise the retry paths in Api and Auth.
+
+Usage:
+  python -m tools.mock_portal --port 8088 --vod-items 100000
+
+Then set the portal address in the add-on (or the headless harness) to
+``http://127.0.0.1:8088/c/``.
+
+Embedded use (e.g. from the benchmark suite):
+  portal = MockPortal(CatalogConfig(vod_items=10000)).start()
+  ... portal.url ...
+  portal.stop()
+
+Two extra endpoints expose server-side counters:
+  GET /_stats   per-action request counts as JSON
+  GET /_reset   reset counters and favorites
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import dataclasses
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+_WORDS = ('Night', 'Storm', 'River', 'Shadow', 'Empire', 'Last', 'Silent', 'Broken', 'Golden', 'Dark',
+          'City', 'Road', 'Winter', 'Fire', 'Lost', 'Secret', 'Blue', 'Iron', 'Wild', 'Hidden')
+_LANG_TAGS = ('DE', 'EN', 'FR', 'MULTI')
+_COUNTRIES = ('Germany', 'USA', 'France', 'United Kingdom', 'Italy', 'Spain')
+_DIRECTORS = tuple('Director {}'.format(n) for n in range(50))
+_ACTORS = tuple('Actor {}'.format(n) for n in range(200))
+
+
+@dataclasses.dataclass
+class CatalogConfig:
+    """Synthetic catalog shape and fault injection settings"""
+    vod_categories: int = 20
+    vod_items: int = 1000
+    series_categories: int = 10
+    series_items: int = 200
+    seasons_per_series: int = 3
+    episodes_per_season: int = 10
+    tv_genres: int = 5
+    channels: int = 100
+    max_page_items: int = 14
+    description_len: int = 400   # characters per description (portal payload weight)
+    seed: int = 1
+    latency_ms: int = 0          # fixed latency added to every request
+    jitter_ms: int = 0           # random extra latency 0..jitter_ms
+    error_rate: float = 0.0      # probability of an HTTP 500 reply
+    auth_fail_rate: float = 0.0  # probability of an "Authorization failed" reply
+    token_ttl: int = 0           # seconds until an issued token is rejected (0 = never)
+    max_concurrency: int = 0     # concurrent requests above this get HTTP 503 (0 = unlimited)
+
+
+class SyntheticCatalog:
+    """Deterministic catalog: every item is derived from (type, index)."""
+
+    def __init__(self, config):
+        self.config = config
+        self.favorites = {'vod': set(), 'series': set(), 'itv': set()}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Categories
+    # ------------------------------------------------------------------
+
+    def categories(self, cat_type):
+        """Category list in portal format (first entry is the '*' pseudo category)"""
+        count = self.config.vod_categories if cat_type == 'vod' else self.config.series_categories
+        prefix = 'VOD' if cat_type == 'vod' else 'SERIES'
+        cats = [{'id': '*', 'title': 'All', 'alias': '*'}]
+        for idx in range(count):
+            tag = _LANG_TAGS[idx % len(_LANG_TAGS)]
+            cats.append({'id': str(self._cat_id(cat_type, idx)),
+                         'title': '{} - {} {}'.format(tag, prefix, idx + 1),
+                         'alias': '{}_{}'.format(prefix.lower(), idx + 1),
+                         'censored': 0})
+        return cats
+
+    def genres(self):
+        """TV genre list in portal format"""
+        genres = [{'id': '*', 'title': 'All', 'alias': 'All'}]
+        for idx in range(self.config.tv_genres):
+            genres.append({'id': str(idx + 1), 'title': 'genre {}'.format(idx + 1),
+                           'number': str(idx + 1), 'censored': '0', 'alias': 'genre_{}'.format(idx + 1)})
+        return genres
+
+    @staticmethod
+    def _cat_id(cat_type, idx):
+        return (1000 if cat_type == 'vod' else 5000) + idx
+
+    def _cat_count(self, cat_type):
+        return self.config.vod_categories if cat_type == 'vod' else self.config.series_categories
+
+    def _item_count(self, cat_type):
+        return self.config.vod_items if cat_type == 'vod' else self.config.series_items
+
+    def category_range(self, cat_type, cat_id):
+        """Return the (start, stop) item index range of a category"""
+        cat_count = self._cat_count(cat_type)
+        total = self._item_count(cat_type)
+        if cat_id in (None, '', '*'):
+            return 0, total
+        try:
+            idx = int(cat_id) - self._cat_id(cat_type, 0)
+        except ValueError:
+            return 0, 0
+        if idx < 0 or idx >= cat_count:
+            return 0, 0
+        per_cat, rest = divmod(total, cat_count)
+        start = idx * per_cat + min(idx, rest)
+        return start, start + per_cat + (1 if idx < rest else 0)
+
+    # ------------------------------------------------------------------
+    # Items
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _title(index):
+        first = _WORDS[index % len(_WORDS)]
+        second = _WORDS[(index // len(_WORDS)) % len(_WORDS)]
+        return '{} {} {}'.format(first, second, index)
+
+    def item_id(self, cat_type, index):
+        """Portal id of the item at a global index"""
+        return str((100000 if cat_type == 'vod' else 500000) + index)
+
+    def item(self, cat_type, index, cat_id):
+        """Full portal dict for one VOD/series item"""
+        rnd = random.Random(self.config.seed * 1000003 + index * 7 + (1 if cat_type == 'series' else 0))
+        item_id = self.item_id(cat_type, index)
+        title = self._title(index)
+        tag = _LANG_TAGS[index % len(_LANG_TAGS)]
+        if index % 3 == 0:
+            title = '{} ({})'.format(title, tag)
+        year = 1970 + (index * 7) % 55
+        description = ('Synthetic plot {} '.format(index) * (self.config.description_len // 18 + 1))
+        description = description[:self.config.description_len]
+        if cat_type == 'series':
+            series = []
+        else:
+            series = list(range(1, 9)) if index % 50 == 0 else []
+        screenshot = ('/stalker_portal/screenshots/{}/{}.jpg'.format(index % 997, index)
+                      if index % 4 else 'http://img.example.invalid/{}.jpg'.format(index))
+        return {
+            'id': item_id, 'owner': '', 'name': title, 'old_name': '', 'o_name': title, 'fname': '',
+            'description': description, 'pic': '', 'cost': '0', 'time': str(80 + index % 60), 'file': '',
+            'path': title.replace(' ', '_'), 'protocol': 'custom',
+            'rtsp_url': 'http://video.example.invalid/{}.mp4'.format(item_id), 'censored': '0',
+            'hd': 0 if index % 17 == 0 else 1, 'series': series, 'volume_correction': '0',
+            'category_id': str(cat_id), 'genre_id': '0', 'genre_id_1': '0', 'genre_id_2': '0',
+            'genre_id_3': '0', 'genre_id_4': '0', 'cat_genre_id_1': '0', 'cat_genre_id_2': '0',
+            'cat_genre_id_3': '0', 'cat_genre_id_4': '0',
+            'director': _DIRECTORS[rnd.randrange(len(_DIRECTORS))],
+            'actors': ', '.join(rnd.sample(_ACTORS, 4)), 'year': str(year), 'accessed': '1', 'status': '1',
+            'disable_for_hd_devices': '0', 'added': '2024-{:02d}-{:02d} 12:00:00'.format(1 + index % 12, 1 + index % 28),
+            'admin_id': None, 'count': str(rnd.randrange(20000)), 'rate': None, 'last_rate_update': None,
+            'last_played': '2024-06-01 20:00:00', 'for_sd_stb': '0', 'kinopoisk_id': '',
+            'rating_kinopoisk': '{:.5f}'.format(rnd.uniform(4, 9)), 'rating_count_kinopoisk': '0',
+            'rating_imdb': '{:.5f}'.format(rnd.uniform(4, 9)), 'rating_count_imdb': '0',
+            'rating_last_update': '2024-01-01 00:00:00', 'age': '', 'rating_mpaa': '', 'high_quality': '0',
+            'comments': '', 'low_quality': 0, 'country': _COUNTRIES[index % len(_COUNTRIES)],
+            'is_series': '1' if cat_type == 'series' else '0', 'year_end': '0', 'autocomplete_provider': None,
+            'screenshots': str(index), 'sd': 0, 'lock': 0,
+            'fav': 1 if item_id in self.favorites[cat_type] else 0, 'for_rent': 0, 'position': 0,
+            'screenshot_uri': screenshot, 'genres_str': '',
+            'cmd': 'ffmpeg http://video.example.invalid/{}.mp4'.format(item_id),
+        }
+
+    def seasons(self, movie_id):
+        """Season list for a series (get_ordered_list with movie_id)"""
+        data = []
+        for season_no in range(1, self.config.seasons_per_series + 1):
+            data.append({'id': '{}:{}'.format(movie_id, season_no), 'name': 'Season {}'.format(season_no),
+                         'series': list(range(1, self.config.episodes_per_season + 1)),
+                         'description': 'Season {} of {}'.format(season_no, movie_id),
+                         'actors': ', '.join(_ACTORS[:3]), 'screenshot_uri': ''})
+        return {'total_items': str(len(data)), 'max_page_items': len(data), 'selected_item': 0,
+                'cur_page': 0, 'data': data}
+
+    def channel(self, index):
+        """Portal dict for one TV channel"""
+        ch_id = str(10000 + index)
+        return {'id': ch_id, 'name': 'Channel {}'.format(index + 1), 'number': str(index + 1),
+                'cmd': 'ffrt http://tv.example.invalid/ch/{}'.format(ch_id),
+                'tv_genre_id': str(1 + index % max(self.config.tv_genres, 1)),
+                'use_http_tmp_link': '1' if index % 2 else '0', 'use_load_balancing': 0,
+                'logo': '', 'fav': 1 if ch_id in self.favorites['itv'] else 0}
+
+    def ordered_list(self, cat_type, params):
+        """get_ordered_list with pagination, search and favorites"""
+        page = max(int(params.get('p', '1') or '1'), 1)
+        page_size = self.config.max_page_items
+        if cat_type == 'itv':
+            indexes = self._channel_indexes(params)
+            build = lambda idx: self.channel(idx)  # noqa: E731
+        else:
+            start, stop = self.category_range(cat_type, params.get('category'))
+            indexes = range(start, stop)
+            if params.get('fav') == '1':
+                indexes = [i for i in indexes if self.item_id(cat_type, i) in self.favorites[cat_type]]
+            search = params.get('search', '').strip().lower()
+            if search:
+                indexes = [i for i in indexes if search in self._title(i).lower()]
+            cat_id = params.get('category') or '*'
+            build = lambda idx: self.item(cat_type, idx, cat_id)  # noqa: E731
+        total = len(indexes)
+        page_indexes = indexes[(page - 1) * page_size:page * page_size]
+        return {'total_items': str(total), 'max_page_items': page_size, 'selected_item': 0,
+                'cur_page': page - 1, 'data': [build(i) for i in page_indexes]}
+
+    def _channel_indexes(self, params):
+        genre = params.get('genre', '*')
+        indexes = range(self.config.channels)
+        if genre not in ('', '*', None):
+            indexes = [i for i in indexes if str(1 + i % max(self.config.tv_genres, 1)) == genre]
+        if params.get('fav') == '1':
+            indexes = [i for i in indexes if str(10000 + i) in self.favorites['itv']]
+        search = params.get('search', '').strip().lower()
+        if search:
+            indexes = [i for i in indexes if search in 'channel {}'.format(i + 1)]
+        return indexes
+
+    def set_fav(self, cat_type, video_id, add):
+        """Add or remove a favorite"""
+        with self._lock:
+            if add:
+                self.favorites[cat_type].add(str(video_id))
+            else:
+                self.favorites[cat_type].discard(str(video_id))
+
+    def set_tv_favs(self, fav_ch):
+        """Replace the TV favorites list (itv set_fav sends the full list)"""
+        with self._lock:
+            self.favorites['itv'] = {ch for ch in fav_ch.split(',') if ch}
+
+
+class _PortalState:
+    """Server-wide state shared by all handler threads"""
+
+    def __init__(self, config):
+        self.config = config
+        self.catalog = SyntheticCatalog(config)
+        self.tokens = {}  # token -> issue timestamp
+        self.stats = {}
+        self.active = 0
+        self.peak_active = 0
+        self.rnd = random.Random(config.seed)
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        """Increment a request counter"""
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def enter(self):
+        """Track a request start; returns False when over the concurrency limit"""
+        with self.lock:
+            self.active += 1
+            self.peak_active = max(self.peak_active, self.active)
+            limit = self.config.max_concurrency
+            return not limit or self.active <= limit
+
+    def leave(self):
+        """Track a request end"""
+        with self.lock:
+            self.active -= 1
+
+    def chance(self, rate):
+        """Thread-safe random draw"""
+        if rate <= 0:
+            return False
+        with self.lock:
+            return self.rnd.random() < rate
+
+    def snapshot(self):
+        """Counters as a JSON-serialisable dict"""
+        with self.lock:
+            return {'requests': dict(self.stats), 'total': sum(self.stats.values()),
+                    'peak_concurrency': self.peak_active, 'tokens_issued': len(self.tokens)}
+
+    def reset(self):
+        """Reset counters and favorites"""
+        with self.lock:
+            self.stats = {}
+            self.peak_active = 0
+            self.catalog.favorites = {'vod': set(), 'series': set(), 'itv': set()}
+
+
+class _PortalHandler(BaseHTTPRequestHandler):
+    """HTTP handler for load.php / portal.php"""
+
+    protocol_version = 'HTTP/1.1'
+    state = None  # set per server class in MockPortal
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Silence the default per-request stderr logging"""
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Answer HEAD requests (connection pre-warming) without a body"""
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Dispatch a portal request"""
+        split = urlsplit(self.path)
+        if split.path == '/_stats':
+            self._send_json(self.state.snapshot())
+            return
+        if split.path == '/_reset':
+            self.state.reset()
+            self._send_json({'reset': True})
+            return
+        if not (split.path.endswith('/load.php') or split.path.endswith('/portal.php')):
+            self._send(404, b'not found', 'text/plain')
+            return
+
+        params = dict(parse_qsl(split.query))
+        key = '{}.{}'.format(params.get('type', '?'), params.get('action', '?'))
+        self.state.count(key)
+        within_limit = self.state.enter()
+        try:
+            self._inject_latency()
+            if not within_limit:
+                self._send(503, b'too many connections', 'text/plain')
+                return
+            if self.state.chance(self.state.config.error_rate):
+                self._send(500, b'internal error', 'text/plain')
+                return
+            if params.get('action') != 'handshake':
+                if not self._token_valid() or self.state.chance(self.state.config.auth_fail_rate):
+                    self._send(200, b'Authorization failed.', 'text/html')
+                    return
+            self._send_json({'js': self._dispatch(params)})
+        finally:
+            self.state.leave()
+
+    def _inject_latency(self):
+        cfg = self.state.config
+        delay = cfg.latency_ms
+        if cfg.jitter_ms:
+            with self.state.lock:
+                delay += self.state.rnd.randint(0, cfg.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+    def _token_valid(self):
+        auth = self.headers.get('Authorization', '')
+        token = auth[7:] if auth.startswith('Bearer ') else ''
+        with self.state.lock:
+            issued = self.state.tokens.get(token)
+        if issued is None:
+            return False
+        ttl = self.state.config.token_ttl
+        return not ttl or time.time() - issued < ttl
+
+    def _dispatch(self, params):
+        # pylint: disable=too-many-return-statements
+        catalog = self.state.catalog
+        _type = params.get('type')
+        action = params.get('action')
+        if _type == 'stb' and action == 'handshake':
+            token = uuid.uuid4().hex.upper()
+            with self.state.lock:
+                self.state.tokens[token] = time.time()
+            return {'token': token}
+        if _type == 'stb' and action == 'get_profile':
+            return {'id': '1', 'name': 'mock', 'status': 0}
+        if _type == 'watchdog':
+            return {'data': {'msgs': 0}}
+        if _type in ('vod', 'series') and action == 'get_categories':
+            return catalog.categories(_type)
+        if _type == 'itv' and action == 'get_genres':
+            return catalog.genres()
+        if _type == 'series' and action == 'get_ordered_list' and params.get('movie_id'):
+            return catalog.seasons(params['movie_id'])
+        if action == 'get_ordered_list':
+            return catalog.ordered_list(_type, params)
+        if action == 'create_link':
+            cmd = params.get('cmd', '')
+            cmd = cmd[cmd.find(' ') + 1:] if ' ' in cmd else cmd
+            return {'id': '1', 'cmd': 'ffmpeg {}?series={}'.format(cmd, params.get('series', '0'))}
+        if _type == 'itv' and action == 'get_all_fav_channels':
+            return {'data': [{'id': ch} for ch in sorted(catalog.favorites['itv'])]}
+        if _type == 'itv' and action == 'set_fav':
+            catalog.set_tv_favs(params.get('fav_ch', ''))
+            return True
+        if action in ('set_fav', 'del_fav'):
+            catalog.set_fav(_type, params.get('video_id'), action == 'set_fav')
+            return True
+        return False
+
+    def _send_json(self, obj):
+        self._send(200, json.dumps(obj).encode('utf-8'), 'application/json')
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockPortal:
+    """Threaded mock portal server that can run in the background"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or CatalogConfig()
+        self.state = _PortalState(self.config)
+        handler = type('BoundPortalHandler', (_PortalHandler,), {'state': self.state})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Server address in the form the add-on settings expect"""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/c/'.format(host, port)
+
+    @property
+    def catalog(self):
+        """The synthetic catalog served by this portal"""
+        return self.state.catalog
+
+    def stats(self):
+        """Server-side request counters"""
+        return self.state.snapshot()
+
+    def reset_stats(self):
+        """Reset server-side counters"""
+        self.state.reset()
+
+    def start(self):
+        """Serve in a daemon thread; returns self"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-portal', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in the current thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def config_from_args(args):
+    """Build a CatalogConfig from parsed command line arguments"""
+    values = {}
+    for field in dataclasses.fields(CatalogConfig):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = value
+    return CatalogConfig(**values)
+
+
+def add_catalog_arguments(parser):
+    """Register one --option per CatalogConfig field"""
+    for field in dataclasses.fields(CatalogConfig):
+        parser.add_argument('--' + field.name.replace('_', '-'), dest=field.name, type=type(field.default),
+                            default=None, help='default: {}'.format(field.default))
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Mock Stalker portal for load and scaling tests')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8088)
+    add_catalog_arguments(parser)
+    args = parser.parse_args(argv)
+    portal = MockPortal(config_from_args(args), args.host, args.port)
+    print('Mock portal listening on {} ({} VOD / {} series items)'.format(
+        portal.url, portal.config.vod_items, portal.config.series_items))
+    try:
+        portal.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        portal.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,374 @@
+"""
+Local mock TMDB API v3 with rate-limit emulation.
+
+Serves the endpoints used by lib/tmdb.py:
+
+  /3/search/movie            ?query=&year=
+  /3/search/tv               ?query=&first_air_date_year=
+  /3/tv/{id}
+  /3/tv/{id}/season/{n}
+  /3/genre/movie/list
+  /3/genre/tv/list
+
+Results come from a deterministic synthetic corpus: the same query always
+yields the same TMDB id, poster, rating and genres, and a configurable
+share of queries has no match (to exercise the negative cache).
+
+TMDB's published limit of 40 requests per 10 seconds is enforced per
+api_key with a sliding window.  Requests above the limit get HTTP 429 with
+a ``Retry-After`` header, which drives the throttle and the
+``_MAX_CONSECUTIVE_429`` abort path of ``TmdbClient``.
+
+Usage:
+  python -m tools.mock_tmdb --port 8089 --rate-limit 40 --rate-window 10
+
+Point the client at it by replacing the API base, e.g. from a harness:
+  lib.tmdb.TMDB_API_BASE = lib.addon.TMDB_API_BASE = tmdb.api_base
+
+Extra endpoints:
+  GET /_stats   per-endpoint request and 429 counts as JSON
+  GET /_reset   reset counters and rate-limit windows
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import dataclasses
+import json
+import math
+import random
+import re
+import threading
+import time
+import zlib
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+MOVIE_GENRES = {28: 'Action', 12: 'Adventure', 16: 'Animation', 35: 'Comedy', 80: 'Crime',
+                99: 'Documentary', 18: 'Drama', 10751: 'Family', 14: 'Fantasy', 36: 'History',
+                27: 'Horror', 10402: 'Music', 9648: 'Mystery', 10749: 'Romance',
+                878: 'Science Fiction', 53: 'Thriller', 10752: 'War', 37: 'Western'}
+TV_GENRES = {10759: 'Action & Adventure', 16: 'Animation', 35: 'Comedy', 80: 'Crime',
+             99: 'Documentary', 18: 'Drama', 10751: 'Family', 10762: 'Kids', 9648: 'Mystery',
+             10763: 'News', 10764: 'Reality', 10765: 'Sci-Fi & Fantasy', 10766: 'Soap',
+             10767: 'Talk', 10768: 'War & Politics', 37: 'Western'}
+
+_TV_RE = re.compile(r'^/3/tv/(\d+)$')
+_SEASON_RE = re.compile(r'^/3/tv/(\d+)/season/(\d+)$')
+
+
+@dataclasses.dataclass
+class CorpusConfig:
+    """Corpus shape, rate limit and fault injection settings"""
+    rate_limit: int = 40         # requests allowed per window and api_key (0 = unlimited)
+    rate_window: float = 10.0    # sliding window length in seconds
+    retry_after: int = 0         # fixed Retry-After value; 0 = seconds until the window frees up
+    miss_rate: float = 0.1       # share of queries without a search result
+    latency_ms: int = 0
+    jitter_ms: int = 0
+    error_rate: float = 0.0      # probability of an HTTP 500 reply
+    seasons: int = 3
+    episodes: int = 10
+    seed: int = 1
+
+
+class SyntheticTmdb:
+    """Deterministic TMDB corpus derived from a hash of the query"""
+
+    def __init__(self, config):
+        self.config = config
+
+    def _rng(self, *parts):
+        key = '|'.join(str(p) for p in parts).lower()
+        return random.Random(zlib.crc32(key.encode('utf-8')) ^ self.config.seed)
+
+    def _is_miss(self, rnd):
+        return rnd.random() < self.config.miss_rate
+
+    def search(self, media_type, query, year):
+        """search/movie and search/tv"""
+        rnd = self._rng(media_type, query, year or '')
+        if not query or self._is_miss(rnd):
+            return {'page': 1, 'results': [], 'total_pages': 0, 'total_results': 0}
+        tmdb_id = 1000 + zlib.crc32('{}:{}'.format(media_type, query.lower()).encode('utf-8')) % 900000
+        release_year = int(year) if year and str(year).isdigit() else rnd.randint(1960, 2025)
+        date = '{}-{:02d}-{:02d}'.format(release_year, rnd.randint(1, 12), rnd.randint(1, 28))
+        genres = MOVIE_GENRES if media_type == 'movie' else TV_GENRES
+        result = {
+            'id': tmdb_id,
+            'overview': 'Synthetic overview for {}.'.format(query),
+            'poster_path': '/p{}.jpg'.format(tmdb_id) if rnd.random() > 0.05 else None,
+            'backdrop_path': '/b{}.jpg'.format(tmdb_id) if rnd.random() > 0.2 else None,
+            'vote_average': round(rnd.uniform(3.0, 9.5), 1),
+            'vote_count': rnd.randint(0, 20000),
+            'genre_ids': rnd.sample(sorted(genres), rnd.randint(1, 3)),
+            'popularity': round(rnd.uniform(1, 500), 3),
+        }
+        if media_type == 'movie':
+            result.update({'title': query, 'original_title': query, 'release_date': date})
+        else:
+            result.update({'name': query, 'original_name': query, 'first_air_date': date})
+        return {'page': 1, 'results': [result], 'total_pages': 1, 'total_results': 1}
+
+    def tv_details(self, tmdb_id):
+        """tv/{id}"""
+        rnd = self._rng('tv', tmdb_id)
+        seasons = [{'season_number': n, 'name': 'Season {}'.format(n), 'overview': 'Season {} overview'.format(n),
+                    'poster_path': '/s{}_{}.jpg'.format(tmdb_id, n), 'episode_count': self.config.episodes}
+                   for n in range(1, self.config.seasons + 1)]
+        return {'id': tmdb_id, 'name': 'Show {}'.format(tmdb_id), 'overview': 'Show overview',
+                'number_of_seasons': self.config.seasons, 'vote_average': round(rnd.uniform(3, 9.5), 1),
+                'seasons': seasons}
+
+    def season_details(self, tmdb_id, season_no):
+        """tv/{id}/season/{n}"""
+        rnd = self._rng('season', tmdb_id, season_no)
+        episodes = [{'episode_number': n, 'name': 'Episode {} title'.format(n), 'overview': 'Episode overview',
+                     'still_path': '/e{}_{}_{}.jpg'.format(tmdb_id, season_no, n),
+                     'vote_average': round(rnd.uniform(3, 9.5), 1), 'vote_count': rnd.randint(0, 500)}
+                    for n in range(1, self.config.episodes + 1)]
+        return {'id': tmdb_id * 100 + season_no, 'season_number': season_no, 'name': 'Season {}'.format(season_no),
+                'overview': 'Season overview', 'poster_path': '/s{}_{}.jpg'.format(tmdb_id, season_no),
+                'episodes': episodes}
+
+    @staticmethod
+    def genres(media_type):
+        """genre/{movie,tv}/list"""
+        genres = MOVIE_GENRES if media_type == 'movie' else TV_GENRES
+        return {'genres': [{'id': gid, 'name': name} for gid, name in sorted(genres.items())]}
+
+
+class SlidingWindowLimiter:
+    """Per-key sliding window limiter (TMDB: 40 requests / 10 seconds)"""
+
+    def __init__(self, limit, window):
+        self.limit = limit
+        self.window = window
+        self._hits = {}
+        self._lock = threading.Lock()
+
+    def check(self, key, now=None):
+        """Register a hit. Returns 0 if allowed, else seconds until a slot frees up."""
+        if not self.limit:
+            return 0
+        now = time.time() if now is None else now
+        with self._lock:
+            hits = self._hits.setdefault(key, deque())
+            while hits and now - hits[0] >= self.window:
+                hits.popleft()
+            if len(hits) >= self.limit:
+                return max(self.window - (now - hits[0]), 0.001)
+            hits.append(now)
+            return 0
+
+    def reset(self):
+        """Forget all windows"""
+        with self._lock:
+            self._hits = {}
+
+
+class _TmdbState:
+    """Server-wide state shared by all handler threads"""
+
+    def __init__(self, config):
+        self.config = config
+        self.corpus = SyntheticTmdb(config)
+        self.limiter = SlidingWindowLimiter(config.rate_limit, config.rate_window)
+        self.stats = {}
+        self.throttled = 0
+        self.rnd = random.Random(config.seed)
+        self.lock = threading.Lock()
+
+    def count(self, key):
+        """Increment a request counter"""
+        with self.lock:
+            self.stats[key] = self.stats.get(key, 0) + 1
+
+    def snapshot(self):
+        """Counters as a JSON-serialisable dict"""
+        with self.lock:
+            return {'requests': dict(self.stats), 'total': sum(self.stats.values()), 'throttled': self.throttled}
+
+    def reset(self):
+        """Reset counters and windows"""
+        with self.lock:
+            self.stats = {}
+            self.throttled = 0
+        self.limiter.reset()
+
+
+class _TmdbHandler(BaseHTTPRequestHandler):
+    """HTTP handler for the /3/ API"""
+
+    protocol_version = 'HTTP/1.1'
+    state = None  # set per server class in MockTmdb
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Silence the default per-request stderr logging"""
+
+    def do_HEAD(self):  # pylint: disable=invalid-name
+        """Answer HEAD requests (connection pre-warming) without a body"""
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):  # pylint: disable=invalid-name
+        """Dispatch an API request"""
+        split = urlsplit(self.path)
+        if split.path == '/_stats':
+            self._send_json(200, self.state.snapshot())
+            return
+        if split.path == '/_reset':
+            self.state.reset()
+            self._send_json(200, {'reset': True})
+            return
+        params = dict(parse_qsl(split.query))
+        endpoint = self._endpoint_name(split.path)
+        self.state.count(endpoint)
+        if not params.get('api_key'):
+            self._send_json(401, {'status_code': 7, 'status_message': 'Invalid API key'})
+            return
+
+        wait = self.state.limiter.check(params['api_key'])
+        if wait:
+            with self.state.lock:
+                self.state.throttled += 1
+            retry_after = self.state.config.retry_after or int(math.ceil(wait))
+            self._send_json(429, {'status_code': 25, 'status_message': 'Your request count is over the allowed limit.'},
+                            {'Retry-After': str(retry_after)})
+            return
+
+        self._inject_latency()
+        with self.state.lock:
+            failed = self.state.config.error_rate and self.state.rnd.random() < self.state.config.error_rate
+        if failed:
+            self._send_json(500, {'status_code': 11, 'status_message': 'Internal error'})
+            return
+        body = self._dispatch(split.path, params)
+        if body is None:
+            self._send_json(404, {'status_code': 34, 'status_message': 'The resource could not be found.'})
+        else:
+            self._send_json(200, body)
+
+    @staticmethod
+    def _endpoint_name(path):
+        if _SEASON_RE.match(path):
+            return 'tv/{id}/season/{n}'
+        if _TV_RE.match(path):
+            return 'tv/{id}'
+        return path[3:] if path.startswith('/3/') else path
+
+    def _inject_latency(self):
+        cfg = self.state.config
+        delay = cfg.latency_ms
+        if cfg.jitter_ms:
+            with self.state.lock:
+                delay += self.state.rnd.randint(0, cfg.jitter_ms)
+        if delay:
+            time.sleep(delay / 1000.0)
+
+    def _dispatch(self, path, params):
+        corpus = self.state.corpus
+        if path == '/3/search/movie':
+            return corpus.search('movie', params.get('query', ''), params.get('year'))
+        if path == '/3/search/tv':
+            return corpus.search('tv', params.get('query', ''), params.get('first_air_date_year'))
+        if path in ('/3/genre/movie/list', '/3/genre/tv/list'):
+            return corpus.genres(path.split('/')[3])
+        match = _SEASON_RE.match(path)
+        if match:
+            return corpus.season_details(int(match.group(1)), int(match.group(2)))
+        match = _TV_RE.match(path)
+        if match:
+            return corpus.tv_details(int(match.group(1)))
+        return None
+
+    def _send_json(self, status, obj, headers=None):
+        body = json.dumps(obj).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json;charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MockTmdb:
+    """Threaded mock TMDB server that can run in the background"""
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or CorpusConfig()
+        self.state = _TmdbState(self.config)
+        handler = type('BoundTmdbHandler', (_TmdbHandler,), {'state': self.state})
+        self._server = ThreadingHTTPServer((host, port), handler)
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def api_base(self):
+        """Replacement for lib.tmdb.TMDB_API_BASE"""
+        host, port = self._server.server_address[:2]
+        return 'http://{}:{}/3'.format(host, port)
+
+    def stats(self):
+        """Server-side request counters"""
+        return self.state.snapshot()
+
+    def reset_stats(self):
+        """Reset counters and rate-limit windows"""
+        self.state.reset()
+
+    def start(self):
+        """Serve in a daemon thread; returns self"""
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-tmdb', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """Serve in the current thread until interrupted"""
+        self._server.serve_forever()
+
+    def stop(self):
+        """Shut the server down"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def config_from_args(args):
+    """Build a CorpusConfig from parsed command line arguments"""
+    values = {}
+    for field in dataclasses.fields(CorpusConfig):
+        value = getattr(args, field.name, None)
+        if value is not None:
+            values[field.name] = value
+    return CorpusConfig(**values)
+
+
+def add_tmdb_arguments(parser, prefix=''):
+    """Register one --option per CorpusConfig field"""
+    for field in dataclasses.fields(CorpusConfig):
+        parser.add_argument('--' + prefix + field.name.replace('_', '-'), dest=field.name,
+                            type=type(field.default), default=None, help='default: {}'.format(field.default))
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Mock TMDB API with rate-limit emulation')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8089)
+    add_tmdb_arguments(parser)
+    args = parser.parse_args(argv)
+    tmdb = MockTmdb(config_from_args(args), args.host, args.port)
+    print('Mock TMDB listening on {} ({} requests / {}s)'.format(
+        tmdb.api_base, tmdb.config.rate_limit, tmdb.config.rate_window))
+    try:
+        tmdb.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        tmdb.stop()
+
+
+if __name__ == '__main__':
+    main()
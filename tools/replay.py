@@ -0,0 +1,250 @@
+"""
+Navigation trace replay load generator.
+
+Replays recorded plugin URL sequences (main menu -> category -> next page ->
+series -> season -> play ...) headless against the mock portal, with one
+worker process per simulated household, and reports per-route latency
+percentiles, portal request counts and cache hit ratios.
+
+Trace sources:
+  * nav_trace.jsonl from the add-on profile folder - written when the hidden
+    expert setting "Record navigation trace" (nav_trace) is on; one line
+    {"ts": ..., "url": "?action=...", "ms": ...} per plugin call
+  * kodi.log (debug log) - plugin calls are taken from the
+    "CPluginDirectory::StartScript - calling plugin ...('plugin://...','<handle>','?...')"
+    and "RunPlugin(plugin://...)" lines
+
+Category ids of the recorded portal are mapped onto the mock catalog in
+first-seen order, so traces from any real portal can be replayed.
+
+Usage:
+  python -m tools.replay nav_trace.jsonl --workers 4 --loops 3
+  python -m tools.replay kodi.log --workers 8 --think --speed 10 --setting page_size=9999
+  python -m tools.replay nav_trace.jsonl --json > replay.json
+"""
+from __future__ import absolute_import, division, unicode_literals
+
+import argparse
+import calendar
+import json
+import multiprocessing
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from urllib.parse import parse_qsl, urlencode
+
+from tools.harness import Harness, parse_settings, route_name, split_plugin_url
+from tools.mock_portal import CatalogConfig, MockPortal, SyntheticCatalog, add_catalog_arguments, config_from_args
+
+_KODI_TS = r'(?P<ts>(?:\d{4}-\d\d-\d\d )?\d\d:\d\d:\d\d(?:\.\d+)?)'
+_PLUGIN_CALL_RE = re.compile(_KODI_TS + r".*?calling plugin .*?\('plugin://plugin\.video\.stalkervod\.tmdb/'"
+                                        r",\s*'-?\d+',\s*'(?P<query>[^']*)'")
+_RUN_PLUGIN_RE = re.compile(_KODI_TS + r".*?RunPlugin\(\"?plugin://plugin\.video\.stalkervod\.tmdb/(?P<query>\?[^)\"]*)")
+
+# Routes whose category_id refers to the given catalog type
+_ROUTE_CAT_TYPE = {'vod_listing': 'vod', 'vod_search': 'vod', 'series_listing': 'series',
+                   'series_search': 'series', 'tv_listing': 'tv', 'tv_search': 'tv'}
+# Routes that may be answered from the add-on's own caches without the portal
+_CACHEABLE_ROUTES = {'main_menu', 'vod', 'series', 'tv', 'vod_listing', 'series_listing', 'vod_filter',
+                     'series_filter', 'season_listing', 'sub_folder'}
+
+
+# ----------------------------------------------------------------------
+# Trace loading
+# ----------------------------------------------------------------------
+
+def _parse_kodi_ts(text):
+    """Kodi log timestamp -> epoch seconds (date-less logs count from 0)"""
+    if ' ' in text:
+        day, clock = text.split(' ', 1)
+        base = calendar.timegm(time.strptime(day, '%Y-%m-%d'))
+    else:
+        clock, base = text, 0
+    hours, minutes, seconds = clock.split(':')
+    return base + int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def load_trace(path):
+    """Return [{'ts': float, 'url': '?action=...', 'ms': float|None}, ...] from a trace or kodi.log"""
+    steps = []
+    with open(path, encoding='utf-8', errors='replace') as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                steps.append({'ts': float(entry.get('ts', 0)), 'url': '?' + split_plugin_url(entry['url']),
+                              'ms': entry.get('ms')})
+                continue
+            match = _PLUGIN_CALL_RE.search(line) or _RUN_PLUGIN_RE.search(line)
+            if match:
+                steps.append({'ts': _parse_kodi_ts(match.group('ts')), 'url': '?' + split_plugin_url(match.group('query')),
+                              'ms': None})
+    return steps
+
+
+class IdMapper:
+    """Maps category ids of a real portal onto the synthetic catalog (first-seen order)"""
+
+    def __init__(self, catalog):
+        self.__targets = {cat_type: [c['id'] for c in catalog.categories(cat_type) if c['id'] != '*']
+                          for cat_type in ('vod', 'series')}
+        self.__targets['tv'] = [g['id'] for g in catalog.genres() if g['id'] != '*']
+        self.__mapping = {}
+
+    def map_url(self, url):
+        """Rewrite category_id of one plugin URL"""
+        params = dict(parse_qsl(split_plugin_url(url), keep_blank_values=True))
+        cat_type = _ROUTE_CAT_TYPE.get(params.get('action'))
+        cat_id = params.get('category_id')
+        if cat_type and cat_id and cat_id != '*' and self.__targets[cat_type]:
+            key = (cat_type, cat_id)
+            if key not in self.__mapping:
+                targets = self.__targets[cat_type]
+                used = sum(1 for k in self.__mapping if k[0] == cat_type)
+                self.__mapping[key] = targets[used % len(targets)]
+            params['category_id'] = self.__mapping[key]
+        return '?' + urlencode(params)
+
+
+# ----------------------------------------------------------------------
+# Replay
+# ----------------------------------------------------------------------
+
+def _household(job):
+    """Worker process: replay the trace `loops` times in its own Kodi home"""
+    worker_id, steps, settings, loops, think, speed = job
+    home = tempfile.mkdtemp(prefix='replay-{}-'.format(worker_id))
+    harness = Harness(home=home, settings=settings)
+    samples = []
+    try:
+        for _ in range(loops):
+            previous_ts = None
+            for step in steps:
+                if think and previous_ts is not None:
+                    time.sleep(max(0.0, min(step['ts'] - previous_ts, 60.0)) / speed)
+                previous_ts = step['ts']
+                result = harness.invoke(step['url'])
+                samples.append((result.route, result.wall_ms, result.portal_calls, result.tmdb_calls,
+                                result.error.strip().splitlines()[-1] if result.error else None))
+    finally:
+        harness.close()
+        shutil.rmtree(home, ignore_errors=True)
+    return samples
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[rank]
+
+
+def summarize(samples, recorded):
+    """Per-route statistics"""
+    by_route = defaultdict(list)
+    for sample in samples:
+        by_route[sample[0]].append(sample)
+    report = {}
+    for route, rows in sorted(by_route.items()):
+        times = sorted(r[1] for r in rows)
+        portal = [r[2] for r in rows]
+        report[route] = {
+            'calls': len(rows),
+            'p50_ms': round(percentile(times, 50), 1), 'p90_ms': round(percentile(times, 90), 1),
+            'p99_ms': round(percentile(times, 99), 1), 'max_ms': round(times[-1], 1),
+            'portal_requests': sum(portal), 'portal_per_call': round(sum(portal) / len(rows), 2),
+            'tmdb_requests': sum(r[3] for r in rows),
+            'cache_hit_ratio': round(sum(1 for p in portal if p == 0) / len(rows), 3)
+            if route in _CACHEABLE_ROUTES else None,
+            'errors': sum(1 for r in rows if r[4]),
+        }
+        if recorded.get(route):
+            report[route]['recorded_p50_ms'] = round(percentile(sorted(recorded[route]), 50), 1)
+    return report
+
+
+def replay(steps, settings, workers=1, loops=1, think=False, speed=1.0, catalog_config=None):
+    """Replay a trace with `workers` households against a fresh mock portal"""
+    catalog_config = catalog_config or CatalogConfig()
+    portal = MockPortal(catalog_config).start()
+    mapper = IdMapper(SyntheticCatalog(catalog_config))
+    mapped = [dict(step, url=mapper.map_url(step['url'])) for step in steps]
+    merged = dict(settings)
+    merged['server_address'] = portal.url
+    jobs = [(i, mapped, merged, loops, think, speed) for i in range(workers)]
+    start = time.perf_counter()
+    try:
+        if workers == 1:
+            results = [_household(jobs[0])]
+        else:
+            with multiprocessing.get_context('spawn').Pool(workers) as pool:
+                results = pool.map(_household, jobs)
+        wall_s = time.perf_counter() - start
+        portal_stats = portal.stats()
+    finally:
+        portal.stop()
+    samples = [sample for result in results for sample in result]
+    recorded = defaultdict(list)
+    for step in steps:
+        if step.get('ms') is not None:
+            recorded[route_name(split_plugin_url(step['url']))].append(step['ms'])
+    errors = sorted({s[4] for s in samples if s[4]})
+    return {'workers': workers, 'loops': loops, 'steps': len(steps), 'invocations': len(samples),
+            'wall_s': round(wall_s, 2), 'routes': summarize(samples, recorded),
+            'portal': portal_stats, 'errors': errors[:20]}
+
+
+def format_report(report):
+    """Human readable table"""
+    lines = ['{} households x {} loops, {} steps, {} invocations in {:.1f} s'.format(
+        report['workers'], report['loops'], report['steps'], report['invocations'], report['wall_s']),
+        '{:<20} {:>6} {:>9} {:>9} {:>9} {:>9} {:>8} {:>7} {:>6} {:>11}'.format(
+            'route', 'calls', 'p50 ms', 'p90 ms', 'p99 ms', 'max ms', 'portal', 'hit %', 'err', 'recorded p50')]
+    for route, row in report['routes'].items():
+        hit = '-' if row['cache_hit_ratio'] is None else '{:.0f}'.format(row['cache_hit_ratio'] * 100)
+        lines.append('{:<20} {:>6} {:>9.1f} {:>9.1f} {:>9.1f} {:>9.1f} {:>8} {:>7} {:>6} {:>11}'.format(
+            route, row['calls'], row['p50_ms'], row['p90_ms'], row['p99_ms'], row['max_ms'],
+            row['portal_requests'], hit, row['errors'], row.get('recorded_p50_ms', '-')))
+    lines.append('portal: {}'.format(json.dumps(report['portal'].get('requests', {}), sort_keys=True)))
+    for error in report['errors']:
+        lines.append('error: ' + error)
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    """Command line entry point"""
+    parser = argparse.ArgumentParser(description='Replay recorded plugin navigation against the mock portal')
+    parser.add_argument('trace', nargs='+', help='nav_trace.jsonl or kodi.log (several files are concatenated)')
+    parser.add_argument('--workers', type=int, default=1, help='parallel households (processes)')
+    parser.add_argument('--loops', type=int, default=1, help='times every household replays the trace')
+    parser.add_argument('--think', action='store_true', help='keep the recorded pauses between calls')
+    parser.add_argument('--speed', type=float, default=1.0, help='divide recorded pauses by this factor')
+    parser.add_argument('--route', action='append', help='only replay these routes')
+    parser.add_argument('--setting', action='append', metavar='KEY=VALUE', help='add-on setting (repeatable)')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    add_catalog_arguments(parser)
+    args = parser.parse_args(argv)
+
+    steps = [step for path in args.trace for step in load_trace(path)]
+    if args.route:
+        steps = [s for s in steps if route_name(split_plugin_url(s['url'])) in args.route]
+    if not steps:
+        sys.stderr.write('No plugin calls found in {}\n'.format(', '.join(args.trace)))
+        return 1
+    report = replay(steps, parse_settings(args.setting), workers=max(1, args.workers), loops=max(1, args.loops),
+                    think=args.think, speed=max(args.speed, 0.001), catalog_config=config_from_args(args))
+    print(json.dumps(report, indent=2) if args.json else format_report(report))
+    return 1 if report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())